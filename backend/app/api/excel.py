@@ -2,13 +2,15 @@
 Excel文件处理相关的API路由
 """
 from fastapi import APIRouter, UploadFile
+from app.core.middleware import UploadRoute
 from app.schemas.excel import ExcelColumnResponse
 from app.services.excel_service import ExcelService
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-router = APIRouter()
+# 上传文件超过 UPLOAD_SPOOL_BYTES 时写入临时文件，解析时直接读取文件对象
+router = APIRouter(route_class=UploadRoute)
 
 
 @router.post("/columns", response_model=ExcelColumnResponse)
@@ -24,14 +26,13 @@ async def get_excel_columns(file: UploadFile) -> ExcelColumnResponse:
     """
     logger.info("读取文件列名: %s", file.filename)
 
-    # 读取文件内容
-    content = await file.read()
-
-    # 获取列名
-    columns = await ExcelService.read_columns(content, file.filename)
+    # 获取列名和预览行（直接读取上传时写入的临时文件，不整体读入内存）
+    columns, preview, encoding = await ExcelService.read_preview(file.file, file.filename)
 
     return ExcelColumnResponse(
         success=True,
         message="成功读取文件列名",
-        data=columns
+        data=columns,
+        preview=preview,
+        encoding=encoding
     )
@@ -1,16 +1,34 @@
 """
 二维码生成相关的API路由
 """
+import asyncio
+import itertools
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple
-from fastapi import APIRouter
-from app.schemas.qrcode import QRCodeRequest, QRCodeResponse, QRCodeData
+from urllib.parse import quote
+from typing import Any, AsyncIterator, Dict, Iterable, List, Literal, Optional, Sequence, Tuple
+from fastapi import APIRouter, Form, Request, Response, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask, BackgroundTasks
+from app.core.config import settings
+from app.core.exceptions import QRCodeException, ErrorCode
+from app.core.middleware import UploadRoute
+from app.schemas.qrcode import (
+    QRCodeRequest, QRCodeResponse, QRCodeData, QRCodeStreamEvent, RenderCacheStatsResponse,
+    AdmissionStatsResponse, JobData, JobResponse
+)
+from app.services.admission import AdmissionTicket, admission
+from app.services.excel_service import ExcelService
+from app.services.file_service import FileService
+from app.services.job_service import JobService
 from app.services.qrcode_service import QRCodeService
+from app.services.render_cache import render_cache
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-router = APIRouter()
+# 上传文件超过 UPLOAD_SPOOL_BYTES 时写入临时文件，解析时直接读取文件对象
+router = APIRouter(route_class=UploadRoute)
 
 
 def parse_content_label(content: str) -> Tuple[str, Optional[str]]:
@@ -54,40 +72,585 @@ def parse_content_label(content: str) -> Tuple[str, Optional[str]]:
     return qr_content, label if label else None
 
 
+def build_items(request: QRCodeRequest) -> List[Tuple[str, Optional[str], str]]:
+    """
+    解析请求中的所有内容和标签，同时保存原始文本
+
+    Args:
+        request: 二维码请求
+
+    Returns:
+        List[Tuple[str, Optional[str], str]]: [(content, label, original_text), ...]
+    """
+    return [(content, label, original)
+            for original in request.contents
+            for content, label in [parse_content_label(original)]]
+
+
+def check_request_limits(request: QRCodeRequest, max_items: int, max_bytes: int) -> None:
+    """
+    检查请求的二维码数量和内容字节数
+
+    Args:
+        request: 二维码请求
+        max_items: 最大数量
+        max_bytes: 最大字节数
+
+    Raises:
+        QRCodeException: 超过限制时抛出（413）
+    """
+    admission.check_limits(
+        len(request.contents),
+        sum(len(content.encode()) for content in request.contents),
+        max_items,
+        max_bytes
+    )
+
+
+def use_inline(request: QRCodeRequest) -> bool:
+    """
+    判断响应是否内联base64数据
+
+    Args:
+        request: 二维码请求
+
+    Returns:
+        bool: inline 模式或 auto 模式下数量不超过 RESPONSE_INLINE_MAX_ITEMS 时为 True
+    """
+    if request.response_mode == "auto":
+        return len(request.contents) <= settings.RESPONSE_INLINE_MAX_ITEMS
+    return request.response_mode == "inline"
+
+
+def build_qrcode_data(
+    http_request: Request,
+    file_path: Path,
+    base64_img: Optional[str],
+    file_type: str,
+    content: str,
+    duplicate_of: Optional[int] = None
+) -> QRCodeData:
+    """
+    构建二维码数据，附带文件下载地址
+
+    Args:
+        http_request: 原始HTTP请求
+        file_path: 文件路径
+        base64_img: base64编码的数据（url模式下为 None）
+        file_type: 文件类型
+        content: 二维码内容
+        duplicate_of: 重复行首次出现的序号，不为 None 时不携带base64数据
+
+    Returns:
+        QRCodeData: 二维码数据
+    """
+    return QRCodeData(
+        qrcode_text=content,
+        file_path=str(file_path),
+        base64_image=base64_img if duplicate_of is None else None,
+        url=http_request.app.url_path_for("download_file", filename=Path(file_path).name),
+        file_type=file_type,
+        duplicate_of=duplicate_of
+    )
+
+
+def find_duplicate(first_rows: Dict[Path, int], index: int, file_path: Path) -> Optional[int]:
+    """
+    查找与当前行共用同一文件的首行
+
+    批次内重复的行共用同一文件，只有首次出现的行携带base64数据，其余行引用该行的序号
+
+    Args:
+        first_rows: 文件路径 -> 首次出现的行序号，由调用方在整个批次中共用
+        index: 当前行的序号
+        file_path: 当前行的文件路径
+
+    Returns:
+        Optional[int]: 首次出现的行序号，当前行即为首次出现时返回 None
+    """
+    first = first_rows.setdefault(file_path, index)
+    return None if first == index else first
+
+
+def build_response_data(
+    http_request: Request,
+    results: Sequence[Tuple[Path, Optional[str], str, str]]
+) -> Dict[str, QRCodeData]:
+    """
+    构建批量生成的响应数据
+
+    每个输入行对应一项，key为该行在请求中的序号；批次内重复的行共用同一文件，各自保留一项，
+    base64数据只在首次出现的一项中返回，其余项以 duplicate_of 引用该项。导出文件的key为文件名
+
+    Args:
+        http_request: 原始HTTP请求
+        results: 批量生成结果 [(文件路径, base64编码的数据, 文件类型, 原始文本), ...]
+
+    Returns:
+        Dict[str, QRCodeData]: 响应数据
+    """
+    data: Dict[str, QRCodeData] = {}
+    first_rows: Dict[Path, int] = {}
+    index = 0
+    for file_path, base64_img, file_type, content in results:
+        if file_type == "image":
+            data[str(index)] = build_qrcode_data(
+                http_request, file_path, base64_img, file_type, content,
+                find_duplicate(first_rows, index, file_path)
+            )
+            index += 1
+        else:
+            data[Path(file_path).name] = build_qrcode_data(http_request, file_path, base64_img, file_type, content)
+    return data
+
+
 @router.post("/generate", response_model=QRCodeResponse)
-async def generate_qrcodes(request: QRCodeRequest) -> QRCodeResponse:
+async def generate_qrcodes(request: QRCodeRequest, http_request: Request) -> QRCodeResponse:
     """
     生成二维码
 
     Args:
         request: 包含二维码内容的请求，支持单个或多个
+        http_request: 原始HTTP请求
 
     Returns:
         QRCodeResponse: 包含生成的二维码数据
     """
     logger.info("生成二维码，数量: %d", len(request.contents))
-
-    # 解析所有内容和标签，同时保存原始文本
-    items = [(content, label, original)
-             for original in request.contents
-             for content, label in [parse_content_label(original)]]
+    check_request_limits(request, settings.REQUEST_MAX_ITEMS, settings.REQUEST_MAX_BYTES)
 
     # 生成二维码
-    results = await QRCodeService.generate_batch(items)
-
-    # 构建数据字典
-    qr_dict = {
-        Path(file_path).name: QRCodeData(
-            qrcode_text=content,
-            file_path=str(file_path),
-            base64_image=base64_img,
-            file_type=file_type
+    ticket = await admission.acquire(len(request.contents))
+    try:
+        results = await QRCodeService.generate_batch(
+            build_items(request),
+            request.output_format,
+            request.mask_pattern,
+            use_inline(request),
+            request.exports
         )
-        for file_path, base64_img, file_type, content in results
-    }
+    finally:
+        ticket.release()
+
+    return QRCodeResponse(
+        success=True,
+        message=f"成功生成 {sum(1 for result in results if result[2] == 'image')} 个二维码",
+        data=build_response_data(http_request, results)
+    )
+
+
+def stream_batch(
+    items: Iterable[Tuple[str, Optional[str], str]],
+    http_request: Request,
+    output_format: str = "png",
+    mask_pattern: Optional[int] = None,
+    inline: bool = True,
+    exports: Sequence[str] = ("pdf",),
+    background: Optional[BackgroundTask] = None,
+    ticket: Optional[AdmissionTicket] = None
+) -> StreamingResponse:
+    """
+    以事件流返回批量生成结果
+
+    每生成一个二维码即输出一个事件，PDF和ZIP作为最后的文件事件输出。
+    默认输出 NDJSON（每行一个 QRCodeStreamEvent），
+    请求头 Accept 为 text/event-stream 时输出 SSE。
+
+    Args:
+        items: 内容、标签和原始文本的元组列表或迭代器
+        http_request: 原始HTTP请求
+        output_format: 输出格式
+        mask_pattern: 整个批次使用的掩码
+        inline: 是否内联base64数据
+        exports: 导出格式列表
+        background: 事件流结束后执行的任务
+        ticket: 批次占用的准入预算，事件流结束或中断时归还
+
+    Returns:
+        StreamingResponse: 二维码事件流
+    """
+    use_sse = "text/event-stream" in http_request.headers.get("accept", "")
+
+    def format_event(event: QRCodeStreamEvent) -> str:
+        payload = event.model_dump_json(exclude_none=True)
+        return f"data: {payload}\n\n" if use_sse else f"{payload}\n"
+
+    async def event_stream() -> AsyncIterator[str]:
+        count = 0
+        first_rows: Dict[Path, int] = {}
+        try:
+            async for file_path, base64_img, file_type, content in QRCodeService.iter_batch(
+                items,
+                output_format,
+                mask_pattern,
+                inline,
+                exports
+            ):
+                duplicate_of = find_duplicate(first_rows, count, file_path) if file_type == "image" else None
+                yield format_event(QRCodeStreamEvent(
+                    event=file_type,
+                    index=count if file_type == "image" else None,
+                    filename=Path(file_path).name,
+                    data=build_qrcode_data(http_request, file_path, base64_img, file_type, content, duplicate_of)
+                ))
+                if file_type == "image":
+                    count += 1
+        except QRCodeException as e:
+            # 响应头已发送，错误以事件形式告知客户端
+            yield format_event(QRCodeStreamEvent(event="error", message=e.detail["message"]))
+            return
+        finally:
+            if ticket is not None:
+                ticket.release()
+        yield format_event(QRCodeStreamEvent(event="done", message=f"成功生成 {count} 个二维码"))
+
+    # 客户端在响应开始前断开时事件流不会执行，由后台任务归还预算
+    tasks = BackgroundTasks()
+    if ticket is not None:
+        tasks.add_task(ticket.release)
+    if background is not None:
+        tasks.add_task(background)
+
+    media_type = "text/event-stream" if use_sse else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type, background=tasks)
+
+
+@router.post("/generate/stream", response_class=StreamingResponse)
+async def generate_qrcodes_stream(request: QRCodeRequest, http_request: Request) -> StreamingResponse:
+    """
+    流式生成二维码
 
+    每生成一个二维码即输出一个事件，PDF和ZIP作为最后的文件事件输出。
+    默认输出 NDJSON（每行一个 QRCodeStreamEvent），
+    请求头 Accept 为 text/event-stream 时输出 SSE。
+
+    Args:
+        request: 包含二维码内容的请求，支持单个或多个
+        http_request: 原始HTTP请求
+
+    Returns:
+        StreamingResponse: 二维码事件流
+    """
+    logger.info("流式生成二维码，数量: %d", len(request.contents))
+    check_request_limits(request, settings.REQUEST_MAX_ITEMS, settings.REQUEST_MAX_BYTES)
+    return stream_batch(
+        build_items(request),
+        http_request,
+        request.output_format,
+        request.mask_pattern,
+        use_inline(request),
+        request.exports,
+        ticket=await admission.acquire(len(request.contents))
+    )
+
+
+@router.post("/generate/excel", response_model=QRCodeResponse)
+async def generate_qrcodes_from_excel(
+    http_request: Request,
+    file: UploadFile,
+    content_column: str = Form(..., description="二维码内容所在的列名"),
+    label_column: Optional[str] = Form(None, description="标签所在的列名"),
+    output_format: Literal["png", "svg"] = Form("png", description="输出格式"),
+    mask_pattern: Optional[int] = Form(None, ge=0, le=7, description="整个批次使用的掩码(0-7)"),
+    exports: List[Literal["pdf", "zip"]] = Form(["pdf"], description="批量导出格式"),
+    response_mode: Literal["inline", "url"] = Form("url", description="响应方式"),
+    stream: bool = Form(False, description="是否以事件流返回结果")
+) -> Response:
+    """
+    根据上传的Excel/CSV文件生成二维码
+
+    服务端按列逐行读取内容和标签，分块送入渲染流程，不需要先把整个表格转换为请求数据。
+    内容为空的行被跳过。stream 为 true 时返回与 /generate/stream 相同的事件流，
+    否则返回 QRCodeResponse
+
+    Args:
+        http_request: 原始HTTP请求
+        file: 上传的Excel/CSV文件
+        content_column: 内容列名
+        label_column: 标签列名（可选）
+        output_format: 输出格式
+        mask_pattern: 整个批次使用的掩码
+        exports: 导出格式列表
+        response_mode: 响应方式，行数事先未知，默认只返回文件地址
+        stream: 是否以事件流返回结果
+
+    Returns:
+        Response: QRCodeResponse 或事件流
+    """
+    logger.info("根据文件生成二维码: %s, 内容列: %s, 标签列: %s", file.filename, content_column, label_column)
+
+    # 事件流在处理函数返回后才读取文件，此时 UploadFile 已关闭，需要先转存
+    source = await FileService.spool_upload(file) if stream else file.file
+    try:
+        items = admission.limit_items(
+            ExcelService.iter_items(source, file.filename, content_column, label_column),
+            settings.REQUEST_MAX_ITEMS,
+            settings.REQUEST_MAX_BYTES
+        )
+
+        # 先读取第一行，使文件类型和列名错误在开始生成前返回
+        loop = asyncio.get_running_loop()
+        first = await loop.run_in_executor(None, next, items, None)
+        if first is None:
+            raise QRCodeException(ErrorCode.INVALID_CONTENT, "文件中没有可生成二维码的内容")
+        items = itertools.chain([first], items)
+        # 行数事先未知，按满窗口申请预算
+        ticket = await admission.acquire()
+    except BaseException:
+        if stream:
+            source.close()
+        raise
+
+    inline = response_mode == "inline"
+    if stream:
+        return stream_batch(
+            items, http_request, output_format, mask_pattern, inline, exports,
+            background=BackgroundTask(source.close),
+            ticket=ticket
+        )
+
+    try:
+        results = await QRCodeService.generate_batch(items, output_format, mask_pattern, inline, exports)
+    finally:
+        ticket.release()
     return QRCodeResponse(
         success=True,
-        message=f"成功生成 {len(results) - 1} 个二维码",
-        data=qr_dict
+        message=f"成功生成 {sum(1 for result in results if result[2] == 'image')} 个二维码",
+        data=build_response_data(http_request, results)
+    )
+
+
+@router.get("/cache/stats", response_model=RenderCacheStatsResponse)
+async def get_render_cache_stats() -> RenderCacheStatsResponse:
+    """
+    获取渲染缓存统计信息
+
+    Returns:
+        RenderCacheStatsResponse: 缓存命中、未命中、淘汰次数及容量统计
+    """
+    return RenderCacheStatsResponse(
+        success=True,
+        message="成功获取渲染缓存统计",
+        data=render_cache.stats()
     )
+
+
+@router.get("/admission/stats", response_model=AdmissionStatsResponse)
+async def get_admission_stats() -> AdmissionStatsResponse:
+    """
+    获取准入控制统计信息（当前进程）
+
+    Returns:
+        AdmissionStatsResponse: 获准、排队、拒绝次数及当前队列和预算占用
+    """
+    return AdmissionStatsResponse(
+        success=True,
+        message="成功获取准入控制统计",
+        data=admission.stats()
+    )
+
+
+def file_response(filename: str, http_request: Request) -> Response:
+    """
+    构建输出文件的下载响应
+
+    输出文件名唯一且内容不变，响应带强ETag和长期缓存头；
+    支持 If-None-Match 条件请求（304）和 Range 分段请求（206）。
+    FILE_SENDFILE_MODE 为 x-accel / x-sendfile 时只返回响应头，由反向代理以 sendfile 发送文件
+
+    Args:
+        filename: 输出文件名
+        http_request: 原始HTTP请求
+
+    Returns:
+        Response: 文件响应
+
+    Raises:
+        QRCodeException: 文件不存在或已过期时抛出
+    """
+    file_path, stat_result = FileService.resolve_output_file(filename)
+    etag = FileService.make_etag(filename, stat_result)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.FILE_CACHE_MAX_AGE}, immutable",
+    }
+
+    if_none_match = http_request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=headers)
+
+    if settings.FILE_SENDFILE_MODE != "app":
+        return sendfile_response(file_path, filename, headers)
+
+    return FileResponse(
+        file_path,
+        media_type=FileService.MEDIA_TYPES[file_path.suffix.lower()],
+        headers=headers,
+        filename=filename,
+        stat_result=stat_result,
+        content_disposition_type="inline"
+    )
+
+
+def sendfile_response(file_path: Path, filename: str, headers: Dict[str, str]) -> Response:
+    """
+    构建由反向代理发送文件的响应
+
+    x-accel 模式返回 X-Accel-Redirect（内部 location 路径），x-sendfile 模式返回 X-Sendfile（文件绝对路径），
+    路径经过URL编码（标签中可能有中文）；Range 请求由反向代理处理
+
+    Args:
+        file_path: 文件路径
+        filename: 文件名
+        headers: 缓存相关的响应头
+
+    Returns:
+        Response: 不含响应体的文件响应
+    """
+    quoted = quote(filename)
+    if quoted != filename:
+        headers["Content-Disposition"] = f"inline; filename*=utf-8''{quoted}"
+    else:
+        headers["Content-Disposition"] = f'inline; filename="{filename}"'
+
+    if settings.FILE_SENDFILE_MODE == "x-accel":
+        relative = file_path.relative_to(settings.OUTPUT_DIR).as_posix()
+        headers["X-Accel-Redirect"] = settings.FILE_ACCEL_PREFIX.rstrip("/") + "/" + quote(relative)
+    else:
+        headers["X-Sendfile"] = quote(file_path.resolve().as_posix())
+    return Response(media_type=FileService.MEDIA_TYPES[file_path.suffix.lower()], headers=headers)
+
+
+@router.get("/files/{filename}", name="download_file", response_class=FileResponse)
+async def download_file(filename: str, http_request: Request) -> Response:
+    """
+    下载生成的文件
+
+    Args:
+        filename: 文件名（响应数据中的 key 或 url 的最后一段）
+        http_request: 原始HTTP请求
+
+    Returns:
+        Response: 文件响应
+    """
+    return file_response(filename, http_request)
+
+
+def build_job_data(http_request: Request, job: Dict[str, Any]) -> JobData:
+    """
+    构建批量任务数据，导出文件附带下载地址
+
+    Args:
+        http_request: 原始HTTP请求
+        job: JobService 返回的任务信息
+
+    Returns:
+        JobData: 批量任务数据
+    """
+    return JobData(
+        job_id=job["id"],
+        status=job["status"],
+        total=job["total"],
+        done=job["done"],
+        progress=round(job["done"] / job["total"], 4) if job["total"] else 1.0,
+        eta_seconds=job["eta"],
+        created_at=datetime.fromtimestamp(job["created_at"]),
+        finished_at=datetime.fromtimestamp(job["finished_at"]) if job["finished_at"] else None,
+        error=job["error"],
+        files={
+            export: str(http_request.app.url_path_for("download_job_file", job_id=job["id"], export=export))
+            for export in job["files"]
+        }
+    )
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(request: QRCodeRequest, http_request: Request) -> JobResponse:
+    """
+    提交批量生成任务
+
+    立即返回任务ID，二维码在后台生成，结果以 exports 指定的PDF/ZIP文件提供下载。
+    response_mode 对任务无效
+
+    Args:
+        request: 包含二维码内容的请求，exports 不能为空
+        http_request: 原始HTTP请求
+
+    Returns:
+        JobResponse: 排队中的任务
+    """
+    check_request_limits(request, settings.JOB_MAX_ITEMS, settings.JOB_MAX_BYTES)
+    job_id = await JobService.submit(
+        build_items(request),
+        request.output_format,
+        request.mask_pattern,
+        request.exports
+    )
+    return JobResponse(
+        success=True,
+        message="任务已提交",
+        data=build_job_data(http_request, await JobService.get(job_id))
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, http_request: Request) -> JobResponse:
+    """
+    查询批量任务进度
+
+    Args:
+        job_id: 任务ID
+        http_request: 原始HTTP请求
+
+    Returns:
+        JobResponse: 任务状态、进度、预计剩余时间，完成后附带导出文件下载地址
+    """
+    return JobResponse(
+        success=True,
+        message="成功获取任务状态",
+        data=build_job_data(http_request, await JobService.get(job_id))
+    )
+
+
+@router.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str, http_request: Request) -> JobResponse:
+    """
+    取消批量任务
+
+    排队中的任务不再执行，运行中的任务在当前分块完成后停止，未写完的导出文件被删除
+
+    Args:
+        job_id: 任务ID
+        http_request: 原始HTTP请求
+
+    Returns:
+        JobResponse: 取消后的任务
+    """
+    return JobResponse(
+        success=True,
+        message="任务已取消",
+        data=build_job_data(http_request, await JobService.cancel(job_id))
+    )
+
+
+@router.get("/jobs/{job_id}/files/{export}", name="download_job_file", response_class=FileResponse)
+async def download_job_file(job_id: str, export: Literal["pdf", "zip"], http_request: Request) -> Response:
+    """
+    下载已完成任务的导出文件
+
+    Args:
+        job_id: 任务ID
+        export: 导出格式（pdf / zip）
+        http_request: 原始HTTP请求
+
+    Returns:
+        Response: 文件响应
+    """
+    job = await JobService.get(job_id)
+    if job["status"] != "completed":
+        raise QRCodeException(ErrorCode.INVALID_CONTENT, f"任务尚未完成: {job['status']}", status_code=409)
+    if export not in job["files"]:
+        raise QRCodeException(ErrorCode.FILE_NOT_FOUND, f"任务没有导出 {export} 文件", status_code=404)
+    return file_response(job["files"][export], http_request)
@@ -8,6 +8,7 @@
 
 from functools import lru_cache
 from pathlib import Path
+from typing import List, Literal
 from pydantic_settings import BaseSettings
 
 
@@ -22,18 +23,98 @@ class Settings(BaseSettings):
     # 服务配置
     APP_PORT: int = 8000
     APP_HOST: str = "0.0.0.0"
+    APP_WORKERS: int = 1  # 服务进程数（serve.py 启动），0 表示使用 CPU 核心数
+    SHUTDOWN_TIMEOUT: int = 60  # 停止服务时等待进行中的请求和批量任务的最长时间（秒）
 
     # 二维码配置
     QR_SIZE: int = 300
     QR_BORDER: int = 4
     LABEL_HEIGHT: int = 30
+    QR_ENCODER: Literal["numpy", "qrcode"] = "numpy"  # numpy: 内置数组编码器; qrcode: 使用qrcode库编码
+    PNG_LABEL_BITS: Literal[1, 2, 4, 8] = 4  # 带标签PNG的灰度位深（1为纯黑白，2/4为调色板，8为灰度）
+    PNG_COMPRESS_LEVEL: int = 6  # PNG压缩级别（0-9，越大文件越小、编码越慢）
+
+    # 标签字体配置（按顺序尝试，均不可用时使用默认字体）
+    # Linux 可安装 fonts-wqy-zenhei，并用 fc-list :lang=zh 查看字体路径
+    LABEL_FONT_PATHS: List[str] = [
+        "simhei.ttf",
+        "msyh.ttc",
+        "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+        "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+        "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",
+        "/System/Library/Fonts/PingFang.ttc",
+    ]
+    LABEL_CACHE_SIZE: int = 256  # 每个渲染进程的标签图片缓存条数（每条约 QR_SIZE × LABEL_HEIGHT 字节）
+
+    # 渲染引擎配置
+    RENDER_WORKERS: int = 0  # 每个服务进程的渲染进程数，0 表示 CPU 核心数除以服务进程数
+    RENDER_CHUNK_SIZE: int = 50  # 每个分块包含的二维码数量
+    RENDER_INLINE_THRESHOLD: int = 10  # 不超过该数量时在当前进程的线程池中渲染
+    BATCH_DEDUP_MAX_ENTRIES: int = 10000  # 批次内去重记录的最大条数，0 表示不去重
+
+    # 渲染缓存配置
+    RENDER_CACHE_ENABLED: bool = True
+    RENDER_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024  # 每个进程的内存缓存容量，默认64MB
+    RENDER_CACHE_DISK_BYTES: int = 1024 * 1024 * 1024  # 磁盘缓存容量（所有服务进程共用），默认1GB
 
     # 临时目录配置（仅用于存储生成的二维码）
     TEMP_DIR: Path = Path("temp")
     OUTPUT_DIR: Path = TEMP_DIR / "outputs"
+    RENDER_CACHE_DIR: Path = TEMP_DIR / "cache"
 
     # 临时文件配置
     TEMP_FILE_EXPIRE: int = 3600  # 1小时后过期
+    ARTIFACT_DB_PATH: Path = TEMP_DIR / "artifacts.db"  # 输出文件过期索引（SQLite）
+    OUTPUT_MAX_BYTES: int = 5 * 1024 * 1024 * 1024  # 输出目录容量，超出时提前删除最早过期的文件，0 表示不限制
+    CLEANUP_INTERVAL: int = 300  # 过期文件清理间隔（秒）
+    CLEANUP_BATCH_SIZE: int = 500  # 每批删除的文件数
+    LEADER_LOCK_PATH: Path = TEMP_DIR / "leader.lock"  # 主进程选举锁文件，定时任务只在持有锁的进程中执行
+
+    # 上传配置
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024  # 上传请求体最大字节数，超过时返回413
+    UPLOAD_SPOOL_BYTES: int = 1024 * 1024  # 上传文件在内存中缓存的最大字节数，超过后写入临时文件
+
+    # Excel配置
+    EXCEL_PREVIEW_ROWS: int = 10  # 读取列名时返回的预览行数
+    CSV_ENCODING_SAMPLE_BYTES: int = 64 * 1024  # 检测CSV编码时读取的文件开头字节数
+    EXCEL_READ_CHUNK_ROWS: int = 1000  # 按列生成二维码时CSV每次解析的行数
+
+    # 响应配置
+    RESPONSE_INLINE_MAX_ITEMS: int = 20  # auto 模式下不超过该数量时内联base64，否则返回文件URL
+    FILE_CACHE_MAX_AGE: int = 365 * 24 * 3600  # 文件下载的缓存时间（文件名唯一且内容不变）
+    # 文件下载的发送方式: app 由应用读取文件发送; x-accel 由 nginx 发送（X-Accel-Redirect）;
+    # x-sendfile 由 Apache/lighttpd 发送（X-Sendfile），后两种方式由反向代理以 sendfile 零拷贝发送
+    FILE_SENDFILE_MODE: Literal["app", "x-accel", "x-sendfile"] = "app"
+    FILE_ACCEL_PREFIX: str = "/protected-outputs/"  # x-accel 模式下 nginx internal location 的路径，指向 OUTPUT_DIR
+
+    # 准入控制配置（按进程统计）
+    REQUEST_MAX_ITEMS: int = 10000  # 单个生成请求的最大二维码数量，超过时返回413
+    REQUEST_MAX_BYTES: int = 4 * 1024 * 1024  # 单个生成请求的内容总字节数
+    ADMISSION_MAX_INFLIGHT_ITEMS: int = 0  # 所有请求共享的在途渲染项预算，0 表示渲染窗口的2倍
+    ADMISSION_QUEUE_SIZE: int = 32  # 等待预算的请求数，队列已满时返回429
+    ADMISSION_QUEUE_TIMEOUT: float = 10.0  # 最长排队时间（秒），超时返回429
+    ADMISSION_RETRY_AFTER: int = 5  # 429响应的 Retry-After（秒）
+    ADMISSION_FAST_LANE_ITEMS: int = 1  # 不超过该数量的请求不占用预算、不排队
+    ADMISSION_BACKGROUND_SHARE: float = 0.5  # 批量任务最多占用的预算比例，其余预算留给在线请求
+
+    # 监控配置
+    METRICS_ENABLED: bool = True  # 是否统计处理耗时并提供 /metrics
+    METRICS_DIR: Path = TEMP_DIR / "metrics"  # 多进程指标文件目录（环境变量 PROMETHEUS_MULTIPROC_DIR 优先）
+
+    # 性能分析配置（默认关闭，开启后只分析带有允许令牌的请求）
+    PROFILE_ENABLED: bool = False
+    PROFILE_HEADER: str = "X-Profile-Token"  # 携带令牌的请求头
+    PROFILE_TOKENS: List[str] = []  # 允许开启分析的令牌
+    PROFILE_DIR: Path = TEMP_DIR / "profiles"  # 分析结果目录（.prof 文件不会自动清理）
+
+    # 批量任务配置
+    JOB_DB_PATH: Path = TEMP_DIR / "jobs.db"  # 任务数据库路径（SQLite）
+    JOB_WORKERS: int = 2  # 同时处理的任务数
+    JOB_MAX_ITEMS: int = 100000  # 单个任务的最大二维码数量
+    JOB_MAX_BYTES: int = 32 * 1024 * 1024  # 单个任务的内容总字节数
+    JOB_POLL_INTERVAL: float = 1.0  # 空闲时查询排队任务的间隔（秒），用于取得其他进程提交的任务
+    JOB_HEARTBEAT_INTERVAL: float = 10.0  # 运行中任务的心跳间隔（秒）
+    JOB_HEARTBEAT_TIMEOUT: float = 60.0  # 心跳超过该时间未更新的任务视为所属进程已退出，重新排队
 
     class Config:
         """配置类配置"""
@@ -42,6 +123,7 @@ class Settings(BaseSettings):
     def create_temp_dirs(self) -> None:
         """创建临时目录"""
         self.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        self.RENDER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 
 @lru_cache()
@@ -13,6 +13,11 @@ class ErrorCode(Enum):
     INVALID_CONTENT = (1001, "无效的二维码内容")
     PDF_GENERATION_FAILED = (1002, "PDF生成失败")
     INVALID_FILE_TYPE = (1003, "不支持的文件类型")
+    FILE_NOT_FOUND = (1004, "文件不存在或已过期")
+    FILE_TOO_LARGE = (1005, "上传文件过大")
+    JOB_NOT_FOUND = (1006, "任务不存在")
+    REQUEST_TOO_LARGE = (1007, "请求内容过多")
+    SERVER_BUSY = (1008, "服务繁忙，请稍后重试")
 
 
 class QRCodeException(HTTPException):
@@ -22,7 +27,8 @@ class QRCodeException(HTTPException):
         self,
         error_code: ErrorCode,
         detail: Optional[Any] = None,
-        headers: Optional[Dict[str, str]] = None
+        headers: Optional[Dict[str, str]] = None,
+        status_code: int = 400
     ) -> None:
         """
         初始化异常
@@ -31,8 +37,8 @@ class QRCodeException(HTTPException):
             error_code: 错误码枚举
             detail: 详细错误信息
             headers: 响应头
+            status_code: HTTP状态码
         """
-        status_code = 400
         if not detail:
             detail = error_code.value[1]
 
@@ -0,0 +1,219 @@
+"""
+监控指标模块
+
+以 Prometheus 格式统计各处理阶段的耗时和请求级别的计数：
+- qrcode_stage_seconds: 编码、栅格化、标签、PNG编码、写文件、PDF、ZIP、base64 各阶段耗时
+- qrcode_batch_items: 每个请求（批次）生成的二维码数量
+- qrcode_output_bytes_total: 写出的图片和导出文件字节数
+- qrcode_render_cache_total: 渲染缓存命中/未命中次数
+- qrcode_batch_duplicates_total: 批次内重复、复用已生成结果的二维码数量
+- qrcode_admission_queue_depth / qrcode_admission_inflight_items: 等待准入的在线请求数和占用的在途渲染项预算
+- qrcode_admission_rejections_total: 准入控制拒绝的请求数
+- http_request_duration_seconds / http_response_bytes_total: 按路由统计的请求耗时和响应字节数
+
+渲染在进程池中执行，服务也可能以多个工作进程运行，指标使用 prometheus_client 的多进程模式，
+各进程写入 METRICS_DIR 下的文件，/metrics 汇总所有进程的数据。
+已退出进程（重启的服务进程、重建的渲染进程池）的计数器和直方图合并到归档文件后删除，
+文件数量不随进程重启增加
+"""
+import glob
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, List
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.core.config import settings
+
+# 多进程模式需要在导入 prometheus_client 之前设置目录
+if settings.METRICS_ENABLED:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", str(settings.METRICS_DIR.resolve()))
+    settings.METRICS_DIR.mkdir(parents=True, exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.mmap_dict import MmapedDict  # noqa: E402
+
+# 处理阶段
+STAGES = ("encode", "rasterize", "label", "png_encode", "svg_render", "file_write", "pdf", "zip", "base64")
+
+STAGE_SECONDS = Histogram(
+    "qrcode_stage_seconds",
+    "二维码处理各阶段耗时",
+    ["stage"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+BATCH_ITEMS = Histogram(
+    "qrcode_batch_items",
+    "每个请求生成的二维码数量",
+    ["output_format"],
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+)
+OUTPUT_BYTES = Counter(
+    "qrcode_output_bytes",
+    "写出的文件字节数",
+    ["kind"]
+)
+RENDER_CACHE = Counter(
+    "qrcode_render_cache",
+    "渲染缓存查询次数",
+    ["result"]
+)
+BATCH_DUPLICATES = Counter(
+    "qrcode_batch_duplicates",
+    "批次内重复、复用已生成结果的二维码数量"
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "qrcode_admission_queue_depth",
+    "等待准入的在线请求数",
+    multiprocess_mode="livesum"
+)
+ADMISSION_INFLIGHT = Gauge(
+    "qrcode_admission_inflight_items",
+    "已占用的在途渲染项预算",
+    multiprocess_mode="livesum"
+)
+ADMISSION_REJECTIONS = Counter(
+    "qrcode_admission_rejections",
+    "准入控制拒绝的请求数",
+    ["reason"]
+)
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP请求耗时（流式响应包括发送时间）",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+HTTP_RESPONSE_BYTES = Counter(
+    "http_response_bytes",
+    "HTTP响应体字节数",
+    ["method", "route"]
+)
+
+# 预先绑定标签，减少热路径上的查找
+_STAGE_CHILDREN = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    统计代码块的耗时，未启用监控时不计时
+
+    Args:
+        stage: 阶段名称（STAGES 之一）
+    """
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _STAGE_CHILDREN[stage].observe(time.perf_counter() - start)
+
+
+def _process_alive(pid: int) -> bool:
+    """检查进程是否存在（没有权限发送信号的进程视为存在）"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _archive_files(directory: str, typ: str, paths: List[str]) -> None:
+    """
+    将已退出进程的计数器或直方图文件累加到归档文件（typ_archive.db）后删除
+
+    Args:
+        directory: 指标目录
+        typ: 文件类型（counter / histogram）
+        paths: 已退出进程的指标文件
+    """
+    if not paths:
+        return
+    archive = MmapedDict(os.path.join(directory, f"{typ}_archive.db"))
+    try:
+        for path in paths:
+            try:
+                values = MmapedDict.read_all_values_from_file(path)
+            except FileNotFoundError:
+                continue
+            for key, value, timestamp, _ in values:
+                total, _ = archive.read_value(key)
+                archive.write_value(key, total + value, timestamp)
+            os.remove(path)
+    finally:
+        archive.close()
+
+
+def mark_dead_processes() -> None:
+    """
+    处理已退出进程的指标文件
+
+    服务进程启动时和渲染进程池关闭或重建后调用：
+    - 清除实时仪表（livesum 等模式的 Gauge），退出进程的在途、排队数量不再计入汇总
+    - 计数器和直方图累加到归档文件后删除，汇总值不会因进程重启而减少，/metrics 读取的文件数量也不会持续增加
+
+    多个服务进程通过目录中的文件锁依次处理，同一文件不会被重复累加。仅在 POSIX 系统上检查进程是否存在
+    """
+    if not settings.METRICS_ENABLED or fcntl is None:
+        return
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    with open(os.path.join(directory, "archive.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        dead = {}
+        for path in glob.glob(os.path.join(directory, "*_*.db")):
+            # 文件名格式为 类型_进程号.db 或 gauge_模式_进程号.db
+            pid = os.path.basename(path)[:-3].rsplit("_", 1)[-1]
+            if pid.isdigit() and int(pid) != os.getpid() and not _process_alive(int(pid)):
+                dead.setdefault(int(pid), []).append(path)
+
+        for pid, paths in dead.items():
+            multiprocess.mark_process_dead(pid, directory)
+            for typ in ("counter", "histogram"):
+                _archive_files(directory, typ, [path for path in paths if os.path.basename(path).startswith(f"{typ}_")])
+
+
+def clear_process_files() -> None:
+    """
+    删除其他进程留下的全部指标文件
+
+    单进程运行时（run.py 开发模式，包括代码修改后的自动重启）在启动时调用：此时没有其他服务进程，
+    也没有启动脚本清空目录，此前的服务进程和渲染进程留下的文件会一直被 /metrics 汇总。
+    当前进程已打开的文件保留
+    """
+    if not settings.METRICS_ENABLED:
+        return
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    suffix = f"_{os.getpid()}.db"
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        if not path.endswith(suffix):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def render_metrics() -> bytes:
+    """
+    汇总所有进程的指标
+
+    Returns:
+        bytes: Prometheus 文本格式的指标数据
+    """
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    try:
+        return generate_latest(registry)
+    except FileNotFoundError:
+        # 文件在读取目录和读取文件之间被归档，重新读取一次
+        return generate_latest(registry)
+
@@ -0,0 +1,290 @@
+"""
+中间件模块
+
+定义应用程序的ASGI中间件，以及接收上传文件的路由使用的请求类
+"""
+import cProfile
+import hmac
+import json
+import re
+import time
+from datetime import datetime
+from typing import Any, Callable, Coroutine, List, Optional, Union
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from starlette.datastructures import FormData
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ulid import ULID
+
+from app.core.config import settings
+from app.core.exceptions import ErrorCode
+from app.core.metrics import HTTP_DURATION, HTTP_RESPONSE_BYTES
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SpoolingMultiPartParser(MultiPartParser):
+    """上传文件超过 UPLOAD_SPOOL_BYTES 时写入临时文件的表单解析器（不修改 Starlette 的默认值）"""
+
+    max_file_size = settings.UPLOAD_SPOOL_BYTES
+
+
+class UploadRequest(Request):
+    """以 SpoolingMultiPartParser 解析 multipart/form-data 表单的请求"""
+
+    async def _get_form(
+        self,
+        *,
+        max_files: Union[int, float] = 1000,
+        max_fields: Union[int, float] = 1000
+    ) -> FormData:
+        if self._form is None and self.headers.get("content-type", "").startswith("multipart/form-data"):
+            parser = SpoolingMultiPartParser(self.headers, self.stream(), max_files=max_files, max_fields=max_fields)
+            try:
+                self._form = await parser.parse()
+            except MultiPartException as exc:
+                raise HTTPException(status_code=400, detail=exc.message)
+        return await super()._get_form(max_files=max_files, max_fields=max_fields)
+
+
+class UploadRoute(APIRoute):
+    """处理函数收到 UploadRequest 的路由类，用于接收上传文件的路由"""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def upload_handler(request: Request) -> Response:
+            return await handler(UploadRequest(request.scope, request.receive))
+
+        return upload_handler
+
+
+class _UploadTooLarge(Exception):
+    """请求体超过上传大小限制"""
+
+
+class UploadLimitMiddleware:
+    """
+    上传大小限制中间件
+
+    multipart/form-data 请求的 Content-Length 超过 UPLOAD_MAX_BYTES 时直接返回 413，不读取请求体；
+    未提供 Content-Length（分块传输）时在读取过程中累计大小，超过限制即中止
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int) -> None:
+        """
+        初始化中间件
+
+        Args:
+            app: ASGI应用
+            max_bytes: 请求体最大字节数
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._send_too_large(send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+        replied = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _UploadTooLarge()
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started, replied
+            if exceeded and not response_started:
+                # 请求体解析被中止后应用会返回解析错误，替换为 413
+                if not replied:
+                    replied = True
+                    await self._send_too_large(send)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _UploadTooLarge:
+            if response_started:
+                raise
+            if not replied:
+                await self._send_too_large(send)
+
+    async def _send_too_large(self, send: Send) -> None:
+        """返回 413 响应，格式与 QRCodeException 一致"""
+        code, message = ErrorCode.FILE_TOO_LARGE.value
+        if self.max_bytes >= 1024 * 1024:
+            limit = f"{self.max_bytes // (1024 * 1024)}MB"
+        else:
+            limit = f"{self.max_bytes // 1024}KB"
+        body = json.dumps(
+            {"detail": {"code": code, "message": f"{message}, 最大 {limit}"}},
+            ensure_ascii=False
+        ).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class MetricsMiddleware:
+    """按路由模板统计请求耗时和响应字节数的中间件"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        """
+        初始化中间件
+
+        Args:
+            app: ASGI应用
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        sent = 0
+
+        async def counting_send(message: Message) -> None:
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            # 使用路由模板而不是实际路径，避免文件名等路径参数产生大量标签
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            HTTP_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - start)
+            HTTP_RESPONSE_BYTES.labels(method, route).inc(sent)
+
+
+class ProfileMiddleware:
+    """
+    按请求开启的性能分析中间件
+
+    请求头 PROFILE_HEADER 的值在 PROFILE_TOKENS 中时，用 cProfile 记录该请求（包括流式响应的发送过程），
+    结果以 pstats 格式写入 PROFILE_DIR/时间_请求ID.prof，可用 snakeviz、flameprof 等工具查看或转换为火焰图。
+    请求ID取自 X-Request-ID 请求头，没有时自动生成，并通过 X-Profile-Id 响应头返回。
+
+    cProfile 只记录事件循环线程，线程池和渲染进程中的耗时表现为等待时间；
+    同一时间只分析一个请求，其他带令牌的请求正常处理，响应头 X-Profile-Id 为 busy。
+    cProfile 无法区分协程，分析期间同一进程中并发处理的其他请求和后台任务在事件循环上的耗时也会计入结果，
+    日志中记录分析期间的并发请求数，需要单独的结果时应在没有其他流量的进程上分析
+    """
+
+    # 请求ID只保留适合用作文件名的字符
+    _REQUEST_ID_PATTERN = re.compile(r"[^0-9A-Za-z_-]")
+
+    def __init__(self, app: ASGIApp, header: str, tokens: List[str]) -> None:
+        """
+        初始化中间件
+
+        Args:
+            app: ASGI应用
+            header: 携带令牌的请求头名称
+            tokens: 允许开启分析的令牌列表
+        """
+        self.app = app
+        self.header = header.lower().encode("latin-1")
+        self.tokens = [token.encode("utf-8") for token in tokens if token]
+        self._active = False
+        self._inflight = 0  # 当前进程处理中的请求数
+        self._overlapped = 0  # 分析期间并发处理的其他请求数
+
+    def _authorized(self, token: Optional[bytes]) -> bool:
+        """令牌是否在允许列表中（逐个以恒定时间比较）"""
+        if not token:
+            return False
+        return any(hmac.compare_digest(token, allowed) for allowed in self.tokens)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        self._inflight += 1
+        if self._active:
+            self._overlapped += 1
+        try:
+            await self._handle(scope, receive, send)
+        finally:
+            self._inflight -= 1
+
+    async def _handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """处理一个HTTP请求，带有允许令牌时记录性能分析"""
+        headers = dict(scope["headers"])
+        if not self._authorized(headers.get(self.header)):
+            await self.app(scope, receive, send)
+            return
+
+        raw_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        request_id = self._REQUEST_ID_PATTERN.sub("", raw_id)[:64] or str(ULID())
+        profiling = not self._active
+        profile_id = request_id if profiling else "busy"
+
+        async def tagged_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        if not profiling:
+            await self.app(scope, receive, tagged_send)
+            return
+
+        self._active = True
+        self._overlapped = self._inflight - 1
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, tagged_send)
+        finally:
+            profiler.disable()
+            self._active = False
+            elapsed = time.perf_counter() - start
+            settings.PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            profile_path = settings.PROFILE_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{request_id}.prof"
+            profiler.dump_stats(profile_path)
+            logger.info(
+                "已记录请求性能分析: %s %s, 耗时: %.3f秒, 期间并发请求数: %d, 文件: %s",
+                scope["method"], scope["path"], elapsed, self._overlapped, profile_path
+            )
@@ -1,13 +1,23 @@
 """
 主应用程序模块
 """
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api import api_router
 from app.utils.scheduler import setup_scheduler
+from app.services.file_service import FileService
+from app.services.job_service import JobService
+from app.services.render_engine import RenderEngine
 from app.core.config import settings
+from app.core.metrics import clear_process_files, mark_dead_processes, render_metrics
+# prometheus_client 须在 app.core.metrics 设置多进程目录之后导入
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.core.middleware import MetricsMiddleware, ProfileMiddleware, UploadLimitMiddleware
+from app.utils.font import get_label_font
+from app.utils.leader import leader
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -18,10 +28,24 @@ async def lifespan(_application: FastAPI):
     """应用生命周期管理"""
     # 启动时执行
     logger.info("启动应用")
+    if settings.APP_WORKERS == 1:
+        # 单进程运行（包括 run.py 开发模式的自动重启）时没有启动脚本清空指标目录
+        clear_process_files()
+    else:
+        mark_dead_processes()
+    # 预先解析标签字体，渲染进程启动时继承已加载的字体
+    get_label_font(settings.LABEL_HEIGHT // 2)
+    # 打开输出文件过期索引，首次启动时登记输出目录中已有的文件
+    await asyncio.get_running_loop().run_in_executor(None, FileService.get_index)
+    # 多进程部署时定时任务只在主进程中执行
     setup_scheduler()
+    await JobService.start()
     yield
-    # 关闭时执行
+    # 关闭时执行（服务器已等待进行中的请求完成）
     logger.info("关闭应用")
+    await JobService.stop(settings.SHUTDOWN_TIMEOUT)
+    RenderEngine.shutdown()
+    leader.release()
 
 
 app = FastAPI(
@@ -34,6 +58,13 @@ app = FastAPI(
 # 注册主路由
 app.include_router(api_router)
 
+# 注册上传大小限制中间件
+app.add_middleware(UploadLimitMiddleware, max_bytes=settings.UPLOAD_MAX_BYTES)
+
+# 注册性能分析中间件（关闭时不加入中间件栈）
+if settings.PROFILE_ENABLED:
+    app.add_middleware(ProfileMiddleware, header=settings.PROFILE_HEADER, tokens=settings.PROFILE_TOKENS)
+
 # 注册CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -42,3 +73,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+if settings.METRICS_ENABLED:
+    # 注册监控中间件（最外层，统计包括其他中间件在内的耗时）
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics() -> Response:
+        """以 Prometheus 文本格式输出所有进程的监控指标"""
+        return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
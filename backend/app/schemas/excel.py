@@ -1,7 +1,7 @@
 """
 Excel文件处理相关的数据模型
 """
-from typing import List, Optional
+from typing import Any, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -10,3 +10,5 @@ class ExcelColumnResponse(BaseModel):
     success: bool = Field(..., description="是否成功")
     message: str = Field(..., description="响应消息")
     data: Optional[List[str]] = Field(None, description="列名列表")
+    preview: Optional[List[List[Any]]] = Field(None, description="预览行列表, 每行的值与列名一一对应")
+    encoding: Optional[str] = Field(None, description="检测到的CSV文件编码, 非CSV文件为空")
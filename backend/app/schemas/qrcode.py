@@ -2,7 +2,8 @@
 二维码相关的数据模型
 """
 
-from typing import List, Optional, Dict
+from datetime import datetime
+from typing import List, Optional, Dict, Literal
 from pydantic import BaseModel, Field, field_validator
 
 
@@ -18,6 +19,24 @@ class QRCodeRequest(BaseModel):
             "123,456,"  # 内容包含逗号，无标签
         ]
     )
+    output_format: Literal["png", "svg"] = Field(
+        "png",
+        description="输出格式: png位图 / svg矢量（批量PDF同样以矢量方式生成）"
+    )
+    mask_pattern: Optional[int] = Field(
+        None,
+        ge=0,
+        le=7,
+        description="整个批次使用的掩码(0-7), 不指定时逐项选择最佳掩码; 等长编号类批次指定后可跳过掩码评估"
+    )
+    response_mode: Literal["auto", "inline", "url"] = Field(
+        "auto",
+        description="响应方式: inline内联base64 / url只返回文件下载地址 / auto按数量自动选择"
+    )
+    exports: List[Literal["pdf", "zip"]] = Field(
+        ["pdf"],
+        description="批量导出格式: pdf所有二维码合并为一个PDF / zip所有图片打包为ZIP, 可同时指定或留空"
+    )
 
     @classmethod
     @field_validator('contents')
@@ -32,12 +51,61 @@ class QRCodeData(BaseModel):
     """二维码数据模型"""
     qrcode_text: str = Field(..., description="二维码内容")
     file_path: str = Field(..., description="文件路径")
-    base64_image: str = Field(..., description="Base64编码的图片数据")
-    file_type: str = Field(..., description="文件类型: image/pdf")
+    base64_image: Optional[str] = Field(None, description="Base64编码的图片数据, url模式下为空")
+    url: Optional[str] = Field(None, description="文件下载地址")
+    file_type: str = Field(..., description="文件类型: image/pdf/zip")
+    duplicate_of: Optional[int] = Field(
+        None,
+        description="批次内重复的行共用首次出现的行的文件, 值为该行的序号; 此时 base64_image 为空, 从该行读取"
+    )
 
 
 class QRCodeResponse(BaseModel):
     """二维码生成响应模型"""
     success: bool = Field(..., description="是否成功")
     message: str = Field(..., description="响应消息")
-    data: Optional[Dict[str, QRCodeData]] = Field(None, description="响应数据, key为文件名")
+    data: Optional[Dict[str, QRCodeData]] = Field(None, description="响应数据, 二维码的key为输入行的序号, 导出文件的key为文件名")
+
+
+class QRCodeStreamEvent(BaseModel):
+    """二维码流式生成事件模型"""
+    event: Literal["image", "pdf", "zip", "done", "error"] = Field(..., description="事件类型")
+    index: Optional[int] = Field(None, description="二维码在请求中的序号")
+    filename: Optional[str] = Field(None, description="文件名")
+    data: Optional[QRCodeData] = Field(None, description="二维码数据")
+    message: Optional[str] = Field(None, description="事件消息")
+
+
+class RenderCacheStatsResponse(BaseModel):
+    """渲染缓存统计响应模型"""
+    success: bool = Field(..., description="是否成功")
+    message: str = Field(..., description="响应消息")
+    data: Optional[Dict[str, int]] = Field(None, description="缓存命中、未命中、淘汰次数及容量统计")
+
+
+class AdmissionStatsResponse(BaseModel):
+    """准入控制统计响应模型"""
+    success: bool = Field(..., description="是否成功")
+    message: str = Field(..., description="响应消息")
+    data: Optional[Dict[str, int]] = Field(None, description="获准、排队、拒绝次数及当前队列和预算占用")
+
+
+class JobData(BaseModel):
+    """批量任务数据模型"""
+    job_id: str = Field(..., description="任务ID")
+    status: Literal["queued", "running", "completed", "failed", "cancelled"] = Field(..., description="任务状态")
+    total: int = Field(..., description="二维码总数")
+    done: int = Field(..., description="已完成的数量")
+    progress: float = Field(..., description="完成比例(0-1)")
+    eta_seconds: Optional[float] = Field(None, description="预计剩余秒数, 仅运行中的任务有值")
+    created_at: datetime = Field(..., description="提交时间")
+    finished_at: Optional[datetime] = Field(None, description="结束时间")
+    error: Optional[str] = Field(None, description="失败原因")
+    files: Dict[str, str] = Field({}, description="导出文件下载地址, key为导出格式(pdf/zip)")
+
+
+class JobResponse(BaseModel):
+    """批量任务响应模型"""
+    success: bool = Field(..., description="是否成功")
+    message: str = Field(..., description="响应消息")
+    data: Optional[JobData] = Field(None, description="任务数据")
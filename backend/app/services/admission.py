@@ -0,0 +1,320 @@
+"""
+准入控制
+
+限制单个请求的规模，并在所有请求之间共享在途渲染项预算：
+- 单个请求的二维码数量和内容字节数超过限制时返回 413
+- 每个批次按其同时在途的渲染项数量（最多为渲染窗口大小）占用全局预算，生成结束后归还
+- 预算不足时请求进入有界的先进先出等待队列，队列已满或等待超时时立即返回 429 和 Retry-After
+- 不超过 ADMISSION_FAST_LANE_ITEMS 个二维码的请求不占用预算、不排队，避免被大批量请求阻塞
+- 后台任务最多占用 ADMISSION_BACKGROUND_SHARE 比例的预算，在单独的队列中等待，
+  有在线请求排队时不获准，其余预算始终留给在线请求
+
+预算和队列按进程统计，多进程部署时每个进程各自限制
+"""
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import QRCodeException, ErrorCode
+from app.core.metrics import ADMISSION_INFLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS
+from app.services.render_engine import RenderEngine
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AdmissionTicket:
+    """已获准的请求占用的预算，release 可重复调用"""
+
+    def __init__(self, controller: "AdmissionController", weight: int, background: bool = False) -> None:
+        """
+        初始化
+
+        Args:
+            controller: 所属的准入控制器
+            weight: 占用的渲染项数量，快速通道为 0
+            background: 是否为后台任务
+        """
+        self._controller = controller
+        self.weight = weight
+        self.background = background
+        self._released = False
+
+    def release(self) -> None:
+        """归还占用的预算"""
+        if self._released:
+            return
+        self._released = True
+        if self.weight:
+            self._controller._release(self.weight, self.background)
+
+
+class AdmissionController:
+    """在途渲染项预算和有界等待队列"""
+
+    def __init__(
+        self,
+        budget: int,
+        queue_size: int,
+        queue_timeout: float,
+        fast_lane_items: int,
+        background_share: float = 0.5
+    ) -> None:
+        """
+        初始化准入控制器
+
+        Args:
+            budget: 全局在途渲染项预算，0 表示按渲染窗口自动计算
+            queue_size: 等待队列长度
+            queue_timeout: 最长排队时间（秒）
+            fast_lane_items: 不超过该数量的请求走快速通道
+            background_share: 后台任务最多占用的预算比例
+        """
+        self.budget = budget
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.fast_lane_items = fast_lane_items
+        self.background_share = background_share
+
+        self._in_use = 0
+        self._background_in_use = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        self._background_waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        self._stats = {
+            "admitted": 0,
+            "fast_lane": 0,
+            "queued": 0,
+            "background_queued": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "rejected_too_large": 0,
+        }
+
+    @staticmethod
+    def window_items() -> int:
+        """单个批次同时在途的最大渲染项数量（与 iter_batch 的分块窗口一致）"""
+        return RenderEngine.get_worker_count() * 2 * settings.RENDER_CHUNK_SIZE
+
+    def get_budget(self) -> int:
+        """获取全局预算，未配置时可同时运行两个满窗口的批次"""
+        return self.budget or self.window_items() * 2
+
+    def get_background_budget(self) -> int:
+        """获取后台任务可占用的预算（至少为1）"""
+        return max(1, int(self.get_budget() * self.background_share))
+
+    def check_limits(self, count: int, size: int, max_items: int, max_bytes: int) -> None:
+        """
+        检查请求规模
+
+        Args:
+            count: 二维码数量
+            size: 内容总字节数
+            max_items: 最大数量
+            max_bytes: 最大字节数
+
+        Raises:
+            QRCodeException: 超过限制时抛出（413）
+        """
+        if count > max_items:
+            self._reject("too_large")
+            raise QRCodeException(
+                ErrorCode.REQUEST_TOO_LARGE,
+                f"单个请求最多 {max_items} 个二维码，当前 {count} 个",
+                status_code=413
+            )
+        if size > max_bytes:
+            self._reject("too_large")
+            raise QRCodeException(
+                ErrorCode.REQUEST_TOO_LARGE,
+                f"单个请求的内容不能超过 {max_bytes} 字节",
+                status_code=413
+            )
+
+    def limit_items(
+        self,
+        items: Iterable[Tuple[str, Optional[str], str]],
+        max_items: int,
+        max_bytes: int
+    ) -> Iterator[Tuple[str, Optional[str], str]]:
+        """
+        逐项检查请求规模，用于数量事先未知的请求（如上传的表格）
+
+        Args:
+            items: 内容、标签和原始文本的迭代器
+            max_items: 最大数量
+            max_bytes: 最大字节数
+
+        Yields:
+            Tuple[str, Optional[str], str]: 原样产出的项
+
+        Raises:
+            QRCodeException: 超过限制时抛出（413）
+        """
+        count = 0
+        size = 0
+        for item in items:
+            count += 1
+            size += len(item[0].encode()) + len((item[1] or "").encode())
+            self.check_limits(count, size, max_items, max_bytes)
+            yield item
+
+    async def acquire(self, count: Optional[int] = None, background: bool = False) -> AdmissionTicket:
+        """
+        为一个批次申请在途渲染项预算
+
+        Args:
+            count: 批次的二维码数量，未知时为 None（按满窗口申请）
+            background: 是否为后台任务，后台任务在单独的队列中等待，不受队列长度和排队时间限制
+
+        Returns:
+            AdmissionTicket: 获准的预算，生成结束后调用 release 归还
+
+        Raises:
+            QRCodeException: 队列已满或排队超时时抛出（429，附带 Retry-After）
+        """
+        if background:
+            return await self._acquire_background()
+
+        if count is not None and count <= self.fast_lane_items:
+            self._stats["fast_lane"] += 1
+            return AdmissionTicket(self, 0)
+
+        budget = self.get_budget()
+        weight = min(count if count is not None else budget, self.window_items(), budget)
+        if not self._waiters and self._in_use + weight <= budget:
+            self._grant(weight)
+            return AdmissionTicket(self, weight)
+
+        if len(self._waiters) >= self.queue_size:
+            self._reject("queue_full")
+            raise self._busy("服务繁忙，等待队列已满，请稍后重试")
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (weight, future)
+        self._waiters.append(waiter)
+        self._stats["queued"] += 1
+        ADMISSION_QUEUE_DEPTH.inc()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # 超时或取消的同时已获准，归还预算
+                self._release(weight)
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+                ADMISSION_QUEUE_DEPTH.dec()
+                # 队首离开后，后面较小的请求或后台任务可能已经可以获准
+                self._wake()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject("timeout")
+            raise self._busy("服务繁忙，排队超时，请稍后重试") from None
+        return AdmissionTicket(self, weight)
+
+    async def _acquire_background(self) -> AdmissionTicket:
+        """
+        为后台任务申请预算，一直等待到获准
+
+        Returns:
+            AdmissionTicket: 获准的预算
+        """
+        weight = min(self.window_items(), self.get_background_budget())
+        if not self._background_waiters and self._background_fits(weight):
+            self._grant(weight, background=True)
+            return AdmissionTicket(self, weight, background=True)
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (weight, future)
+        self._background_waiters.append(waiter)
+        self._stats["background_queued"] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(weight, background=True)
+            elif waiter in self._background_waiters:
+                self._background_waiters.remove(waiter)
+                self._wake()
+            raise
+        return AdmissionTicket(self, weight, background=True)
+
+    def _background_fits(self, weight: int) -> bool:
+        """后台任务能否获准：没有在线请求排队，且总预算和后台预算都足够"""
+        return (
+            not self._waiters
+            and self._in_use + weight <= self.get_budget()
+            and self._background_in_use + weight <= self.get_background_budget()
+        )
+
+    def _grant(self, weight: int, background: bool = False) -> None:
+        """占用预算"""
+        self._in_use += weight
+        if background:
+            self._background_in_use += weight
+        self._stats["admitted"] += 1
+        ADMISSION_INFLIGHT.inc(weight)
+
+    def _release(self, weight: int, background: bool = False) -> None:
+        """归还预算并唤醒排队的请求"""
+        self._in_use -= weight
+        if background:
+            self._background_in_use -= weight
+        ADMISSION_INFLIGHT.dec(weight)
+        self._wake()
+
+    def _wake(self) -> None:
+        """按先进先出顺序唤醒预算足够的排队请求，在线请求优先于后台任务"""
+        budget = self.get_budget()
+        while self._waiters and self._in_use + self._waiters[0][0] <= budget:
+            weight, future = self._waiters.popleft()
+            ADMISSION_QUEUE_DEPTH.dec()
+            if future.done():
+                continue  # 已超时或取消，尚未移出队列
+            self._grant(weight)
+            future.set_result(None)
+        while self._background_waiters and self._background_fits(self._background_waiters[0][0]):
+            weight, future = self._background_waiters.popleft()
+            if future.done():
+                continue  # 已取消，尚未移出队列
+            self._grant(weight, background=True)
+            future.set_result(None)
+
+    def _reject(self, reason: str) -> None:
+        """记录拒绝次数"""
+        self._stats[f"rejected_{reason}"] += 1
+        ADMISSION_REJECTIONS.labels(reason).inc()
+
+    def _busy(self, message: str) -> QRCodeException:
+        """构建服务繁忙异常"""
+        logger.warning("%s，在途: %d/%d，排队: %d", message, self._in_use, self.get_budget(), len(self._waiters))
+        return QRCodeException(
+            ErrorCode.SERVER_BUSY,
+            message,
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+            status_code=429
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """获取准入统计信息"""
+        return {
+            **self._stats,
+            "queue_depth": len(self._waiters),
+            "queue_size": self.queue_size,
+            "inflight_items": self._in_use,
+            "budget_items": self.get_budget(),
+            "background_queue_depth": len(self._background_waiters),
+            "background_inflight_items": self._background_in_use,
+            "background_budget_items": self.get_background_budget(),
+        }
+
+
+# 创建准入控制器实例
+admission = AdmissionController(
+    budget=settings.ADMISSION_MAX_INFLIGHT_ITEMS,
+    queue_size=settings.ADMISSION_QUEUE_SIZE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    fast_lane_items=settings.ADMISSION_FAST_LANE_ITEMS,
+    background_share=settings.ADMISSION_BACKGROUND_SHARE,
+)
@@ -1,12 +1,23 @@
 """
 Excel文件处理服务
 
-提供Excel文件的列名读取功能
+提供Excel文件的列名和预览行读取功能：
+- .xlsx 流式解析，只读取表头、预览行和用到的共享字符串
+- .csv 根据文件开头检测一次编码，只解析表头和预览行；
+  开头是合法的UTF-8、后面出现其他编码的内容时，按GB18030重新解析一次
+读取耗时和内存占用与文件总行数无关
+
+以及按列逐行读取二维码内容和标签，供批量生成使用。
+文件以可随机访问的文件对象传入（如上传时已写入临时文件的 UploadFile.file），不整体读入内存
 """
-from typing import List
+from typing import Any, BinaryIO, Iterator, List, Optional, Sequence, Tuple
+import itertools
 import pandas as pd
+from app.core.config import settings
 from app.core.exceptions import QRCodeException, ErrorCode
+from app.utils.encoding import FALLBACK_ENCODING, detect_encoding
 from app.utils.logger import get_logger
+from app.utils.xlsx_reader import XLSXReader
 
 logger = get_logger(__name__)
 
@@ -22,21 +33,204 @@ class ExcelService:
         """获取文件扩展名"""
         return filename.lower().split('.')[-1]
 
+    @staticmethod
+    def _normalize_columns(header: Sequence[Any]) -> List[str]:
+        """
+        将表头单元格转换为列名
+
+        去除末尾的空单元格，中间的空单元格按 pandas 的规则命名为 "Unnamed: 序号"
+
+        Args:
+            header: 表头单元格的值
+
+        Returns:
+            List[str]: 列名列表
+        """
+        header = list(header)
+        while header and header[-1] in (None, ""):
+            header.pop()
+        return [
+            f"Unnamed: {index}" if value in (None, "") else str(value)
+            for index, value in enumerate(header)
+        ]
+
+    @staticmethod
+    def _read_xlsx_preview(file: BinaryIO, sample_rows: int) -> Tuple[List[Any], List[List[Any]]]:
+        """
+        流式读取.xlsx文件的表头和前几行
+
+        Args:
+            file: 文件对象
+            sample_rows: 预览行数
+
+        Returns:
+            Tuple[List[Any], List[List[Any]]]: (表头单元格, 预览行)
+        """
+        with XLSXReader(file) as reader:
+            rows = list(reader.iter_rows(max_rows=sample_rows + 1))
+        if not rows:
+            return [], []
+        return rows[0], rows[1:]
+
+    @staticmethod
+    def _read_frame_preview(frame: pd.DataFrame) -> Tuple[List[Any], List[List[Any]]]:
+        """
+        将只读取了前几行的 DataFrame 转换为表头和预览行
+
+        Args:
+            frame: 以 header=None 读取的 DataFrame
+
+        Returns:
+            Tuple[List[Any], List[List[Any]]]: (表头单元格, 预览行)
+        """
+        rows = frame.astype(object).where(frame.notna(), None).values.tolist()
+        if not rows:
+            return [], []
+        return rows[0], rows[1:]
+
+    @staticmethod
+    def detect_csv_encoding(file: BinaryIO) -> str:
+        """
+        根据文件开头的 CSV_ENCODING_SAMPLE_BYTES 字节检测CSV文件编码，检测后回到文件开头
+
+        Args:
+            file: 文件对象
+
+        Returns:
+            str: 编码名称（utf-8-sig / utf-16 / utf-32 / utf-8 / gb18030）
+        """
+        file.seek(0)
+        prefix = file.read(settings.CSV_ENCODING_SAMPLE_BYTES)
+        file.seek(0)
+        return detect_encoding(prefix)
+
+    @staticmethod
+    def _decode_error(encoding: str, error: UnicodeDecodeError) -> QRCodeException:
+        """
+        构造编码错误
+
+        Args:
+            encoding: 最后尝试的编码
+            error: 解码错误
+
+        Returns:
+            QRCodeException: 提示检查文件编码的异常
+        """
+        logger.error("CSV文件编码错误(%s): %s", encoding, str(error))
+        return QRCodeException(
+            ErrorCode.INVALID_CONTENT,
+            f"无法以 {encoding} 编码读取CSV文件, 请检查文件编码"
+        )
+
     @classmethod
-    async def read_columns(cls, file_content: bytes, filename: str) -> List[str]:
+    def _read_csv_preview(
+        cls,
+        file: BinaryIO,
+        sample_rows: int,
+        encoding: str
+    ) -> Tuple[List[Any], List[List[Any]], str]:
         """
-        读取Excel文件的列名
+        读取CSV文件的表头和前几行
+
+        预览行超出编码检测范围且按UTF-8解码失败时，按GB18030重新读取
+
+        Args:
+            file: 文件对象
+            sample_rows: 预览行数
+            encoding: 检测到的文件编码
+
+        Returns:
+            Tuple[List[Any], List[List[Any]], str]: (表头单元格, 预览行, 实际使用的编码)
+
+        Raises:
+            QRCodeException: 文件内容与编码不符时抛出
+        """
+        while True:
+            try:
+                frame = pd.read_csv(
+                    file,
+                    encoding=encoding,
+                    header=None,
+                    nrows=sample_rows + 1,
+                    dtype=str,
+                    keep_default_na=False
+                )
+            except UnicodeDecodeError as e:
+                if encoding != "utf-8":
+                    raise cls._decode_error(encoding, e) from e
+                file.seek(0)
+                encoding = FALLBACK_ENCODING
+                continue
+            except pd.errors.EmptyDataError:
+                return [], [], encoding
+            return (*cls._read_frame_preview(frame), encoding)
+
+    @staticmethod
+    def _read_csv_rows(file: BinaryIO, encoding: str) -> Iterator[List[Any]]:
+        """
+        按 EXCEL_READ_CHUNK_ROWS 行分块解析CSV文件，逐行产出
 
         Args:
-            file_content: 文件内容
+            file: 位于开头的文件对象
+            encoding: 文件编码
+
+        Yields:
+            List[Any]: 行数据
+        """
+        reader = pd.read_csv(
+            file,
+            encoding=encoding,
+            header=None,
+            dtype=str,
+            keep_default_na=False,
+            chunksize=settings.EXCEL_READ_CHUNK_ROWS
+        )
+        with reader:
+            for frame in reader:
+                yield from frame.values.tolist()
+
+    @classmethod
+    def _read_xls_preview(cls, file: BinaryIO, sample_rows: int) -> Tuple[List[Any], List[List[Any]]]:
+        """
+        读取.xls文件的表头和前几行（旧格式不支持流式读取，由 pandas 解析）
+
+        Args:
+            file: 文件对象
+            sample_rows: 预览行数
+
+        Returns:
+            Tuple[List[Any], List[List[Any]]]: (表头单元格, 预览行)
+        """
+        frame = pd.read_excel(file, header=None, nrows=sample_rows + 1)
+        return cls._read_frame_preview(frame)
+
+    @classmethod
+    async def read_preview(
+        cls,
+        file: BinaryIO,
+        filename: str,
+        sample_rows: Optional[int] = None
+    ) -> Tuple[List[str], List[List[Any]], Optional[str]]:
+        """
+        读取Excel文件的列名和预览行
+
+        只解析表头和前 sample_rows 行数据，不加载整个文件
+
+        Args:
+            file: 可随机访问的文件对象
             filename: 文件名
+            sample_rows: 预览行数，默认为 EXCEL_PREVIEW_ROWS
 
         Returns:
-            List[str]: 列名列表
+            Tuple[List[str], List[List[Any]], Optional[str]]:
+                (列名列表, 预览行列表, CSV文件编码)，每行的值与列名一一对应，非CSV文件的编码为 None
 
         Raises:
             QRCodeException: 当文件格式不支持或读取失败时抛出
         """
+        if sample_rows is None:
+            sample_rows = settings.EXCEL_PREVIEW_ROWS
+
         try:
             # 获取文件扩展名
             ext = f".{cls.get_file_extension(filename)}"
@@ -46,27 +240,18 @@ class ExcelService:
                     f"不支持的文件类型: {ext}。支持的类型: {', '.join(cls.ALLOWED_EXTENSIONS)}"
                 )
 
-            # 读取文件
+            # 读取表头和预览行
+            encoding = None
+            file.seek(0)
             if ext == '.csv':
-                # 尝试不同的编码方式读取CSV
-                encodings = ['utf-8', 'gbk', 'gb2312']
-                df = None
-                for encoding in encodings:
-                    try:
-                        df = pd.read_csv(pd.io.common.BytesIO(file_content), encoding=encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                if df is None:
-                    raise QRCodeException(
-                        ErrorCode.INVALID_CONTENT,
-                        "无法读取CSV文件, 请检查文件编码"
-                    )
+                header, rows, encoding = cls._read_csv_preview(file, sample_rows, cls.detect_csv_encoding(file))
+            elif ext == '.xlsx':
+                header, rows = cls._read_xlsx_preview(file, sample_rows)
             else:
-                df = pd.read_excel(pd.io.common.BytesIO(file_content))
+                header, rows = cls._read_xls_preview(file, sample_rows)
 
             # 获取列名
-            columns = df.columns.tolist()
+            columns = cls._normalize_columns(header)
 
             if not columns:
                 raise QRCodeException(
@@ -74,7 +259,146 @@ class ExcelService:
                     "文件没有列名"
                 )
 
-            return columns
+            width = len(columns)
+            return columns, [(row + [None] * width)[:width] for row in rows], encoding
+
+        except Exception as e:
+            if not isinstance(e, QRCodeException):
+                logger.error("读取文件失败: %s", str(e))
+                raise QRCodeException(
+                    ErrorCode.INVALID_CONTENT,
+                    f"读取文件失败: {str(e)}"
+                ) from e
+            raise
+
+    @classmethod
+    async def read_columns(cls, file: BinaryIO, filename: str) -> List[str]:
+        """
+        读取Excel文件的列名
+
+        Args:
+            file: 可随机访问的文件对象
+            filename: 文件名
+
+        Returns:
+            List[str]: 列名列表
+
+        Raises:
+            QRCodeException: 当文件格式不支持或读取失败时抛出
+        """
+        columns, _, _ = await cls.read_preview(file, filename, sample_rows=0)
+        return columns
+
+    @classmethod
+    def _iter_rows(cls, file: BinaryIO, ext: str) -> Iterator[List[Any]]:
+        """
+        逐行读取文件（包括表头）
+
+        .xlsx 流式解析，.csv 按 EXCEL_READ_CHUNK_ROWS 行分块解析，.xls 整体解析后逐行产出。
+        CSV文件开头是合法的UTF-8、后面的行按UTF-8解码失败时（如英文表头加GBK中文标签），
+        按GB18030重新解析一次，跳过已产出的行
+
+        Args:
+            file: 文件对象
+            ext: 文件扩展名
+
+        Yields:
+            List[Any]: 行数据
+        """
+        file.seek(0)
+        if ext == '.xlsx':
+            with XLSXReader(file) as reader:
+                yield from reader.iter_rows()
+        elif ext == '.csv':
+            encoding = cls.detect_csv_encoding(file)
+            done = 0
+            try:
+                for row in cls._read_csv_rows(file, encoding):
+                    yield row
+                    done += 1
+                return
+            except UnicodeDecodeError as e:
+                if encoding != "utf-8":
+                    raise cls._decode_error(encoding, e) from e
+                logger.info("CSV文件第 %d 行之后不是UTF-8编码，按 %s 重新解析", done, FALLBACK_ENCODING)
+
+            file.seek(0)
+            try:
+                yield from itertools.islice(cls._read_csv_rows(file, FALLBACK_ENCODING), done, None)
+            except UnicodeDecodeError as e:
+                raise cls._decode_error(FALLBACK_ENCODING, e) from e
+        else:
+            frame = pd.read_excel(file, header=None)
+            yield from frame.astype(object).where(frame.notna(), None).values.tolist()
+
+    @staticmethod
+    def _cell_text(value: Any) -> str:
+        """
+        将单元格的值转换为文本，整数值的浮点数去掉小数部分
+
+        Args:
+            value: 单元格的值
+
+        Returns:
+            str: 去除首尾空白的文本，空单元格为空字符串
+        """
+        if value is None:
+            return ""
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).strip()
+
+    @classmethod
+    def iter_items(
+        cls,
+        file: BinaryIO,
+        filename: str,
+        content_column: str,
+        label_column: Optional[str] = None
+    ) -> Iterator[Tuple[str, Optional[str], str]]:
+        """
+        按列逐行读取二维码内容和标签，内容为空的行被跳过
+
+        Args:
+            file: 可随机访问的文件对象
+            filename: 文件名
+            content_column: 内容列名
+            label_column: 标签列名（可选）
+
+        Yields:
+            Tuple[str, Optional[str], str]: (内容, 标签, 原始文本)，原始文本格式为"内容,标签"
+
+        Raises:
+            QRCodeException: 当文件格式不支持、列不存在或读取失败时抛出
+        """
+        ext = f".{cls.get_file_extension(filename)}"
+        if ext not in cls.ALLOWED_EXTENSIONS:
+            raise QRCodeException(
+                ErrorCode.INVALID_FILE_TYPE,
+                f"不支持的文件类型: {ext}。支持的类型: {', '.join(cls.ALLOWED_EXTENSIONS)}"
+            )
+
+        try:
+            rows = cls._iter_rows(file, ext)
+            columns = cls._normalize_columns(next(rows, []))
+            indexes = []
+            for column in (content_column, label_column):
+                if column is None:
+                    indexes.append(None)
+                elif column in columns:
+                    indexes.append(columns.index(column))
+                else:
+                    raise QRCodeException(ErrorCode.INVALID_CONTENT, f"文件中不存在列: {column}")
+            content_index, label_index = indexes
+
+            for row in rows:
+                content = cls._cell_text(row[content_index] if content_index < len(row) else None)
+                if not content:
+                    continue
+                label = None
+                if label_index is not None and label_index < len(row):
+                    label = cls._cell_text(row[label_index]) or None
+                yield content, label, f"{content},{label}" if label else content
 
         except Exception as e:
             if not isinstance(e, QRCodeException):
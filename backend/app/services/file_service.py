@@ -1,34 +1,516 @@
 """
 文件服务
 
-提供临时文件清理功能
+提供临时文件清理、输出文件查找和上传文件转存功能。
+输出文件按文件名中ULID的时间分桶存放（OUTPUT_DIR/YYYYMMDD/HH/文件名），
+写入临时文件后再重命名，读取方不会看到未写完的文件。
+生成的文件登记在按过期时间索引的 SQLite 表中，清理时只查询已过期的记录，
+不需要遍历输出目录；过期的分桶目录整体删除
 """
+import asyncio
+import hashlib
 import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
 from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Iterable, List, Optional, Sequence, Set, Tuple
+from fastapi import UploadFile
+from ulid import ULID
 from app.core.config import settings
+from app.core.exceptions import QRCodeException, ErrorCode
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+class ArtifactIndex:
+    """
+    输出文件过期索引
+
+    记录输出目录中每个文件的大小和过期时间，并通过触发器维护文件总大小，
+    多个进程共用同一个数据库时统计仍然一致。所有方法均为同步调用，需在线程池中执行
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        """
+        打开数据库并创建索引表
+
+        Args:
+            db_path: 数据库文件路径
+        """
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.created = not db_path.exists()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    name TEXT PRIMARY KEY, size INTEGER NOT NULL, expires_at REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS idx_artifacts_expires ON artifacts (expires_at);
+                CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL);
+                INSERT OR IGNORE INTO usage (id, total) VALUES (0, 0);
+                CREATE TRIGGER IF NOT EXISTS artifacts_insert AFTER INSERT ON artifacts BEGIN
+                    UPDATE usage SET total = total + NEW.size WHERE id = 0; END;
+                CREATE TRIGGER IF NOT EXISTS artifacts_update AFTER UPDATE OF size ON artifacts BEGIN
+                    UPDATE usage SET total = total + NEW.size - OLD.size WHERE id = 0; END;
+                CREATE TRIGGER IF NOT EXISTS artifacts_delete AFTER DELETE ON artifacts BEGIN
+                    UPDATE usage SET total = total - OLD.size WHERE id = 0; END;
+            """)
+
+    def close(self) -> None:
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
+
+    def record(self, entries: Iterable[Tuple[str, int, float]]) -> None:
+        """
+        登记文件，已登记的文件更新大小和过期时间
+
+        Args:
+            entries: (相对输出目录的文件名, 文件大小, 过期时间戳) 的列表
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO artifacts (name, size, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET size = excluded.size, expires_at = excluded.expires_at",
+                    entries
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def pop(self, limit: int, expires_before: Optional[float] = None) -> List[str]:
+        """
+        按过期时间从早到晚取出并删除一批记录
+
+        Args:
+            limit: 最多取出的记录数
+            expires_before: 只取出在该时间之前过期的记录，默认不限（用于超出磁盘配额时）
+
+        Returns:
+            List[str]: 取出的文件名列表
+        """
+        condition = "" if expires_before is None else "WHERE expires_at <= ?"
+        args = (limit,) if expires_before is None else (expires_before, limit)
+        with self._lock:
+            # 查询和删除在同一事务中完成，多个进程同时清理时不会重复取出
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                names = [row[0] for row in self._conn.execute(
+                    f"SELECT name FROM artifacts {condition} ORDER BY expires_at LIMIT ?", args
+                )]
+                self._conn.executemany("DELETE FROM artifacts WHERE name = ?", ((name,) for name in names))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return names
+
+    def count_prefix(self, prefix: str) -> int:
+        """
+        统计文件名以 prefix 开头的记录数
+
+        Args:
+            prefix: 文件名前缀
+
+        Returns:
+            int: 记录数
+        """
+        # 以范围查询代替 LIKE，可直接使用主键索引
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM artifacts WHERE name >= ? AND name < ?", (prefix, upper)
+            ).fetchone()[0]
+
+    def total_bytes(self) -> int:
+        """
+        获取已登记文件的总大小
+
+        Returns:
+            int: 总字节数
+        """
+        with self._lock:
+            return self._conn.execute("SELECT total FROM usage WHERE id = 0").fetchone()[0]
+
+
 class FileService:
     """文件服务类"""
 
+    # 可下载的文件扩展名 -> MIME类型
+    MEDIA_TYPES = {
+        ".png": "image/png",
+        ".svg": "image/svg+xml",
+        ".pdf": "application/pdf",
+        ".zip": "application/zip",
+    }
+
+    # 输出文件过期索引，首次使用时打开
+    _index: Optional[ArtifactIndex] = None
+    _index_lock = threading.Lock()
+    # 超出磁盘配额时只由一个线程删除文件
+    _evict_lock = threading.Lock()
+
+    # 文件名中的ULID（qr_时间_ULID[_标签].png / qrcodes_时间_ULID.pdf）
+    _ULID_PATTERN = re.compile(r"_([0-9A-HJKMNP-TV-Z]{26})(?=[_.])")
+    # 已创建的分桶目录
+    _bucket_dirs: Set[Path] = set()
+
+    @classmethod
+    def bucket_of(cls, filename: str) -> Optional[str]:
+        """
+        根据文件名中ULID的时间确定分桶目录
+
+        Args:
+            filename: 文件名
+
+        Returns:
+            Optional[str]: 相对输出目录的分桶目录，如 "20240101/08"；文件名中没有ULID时返回 None
+        """
+        match = cls._ULID_PATTERN.search(filename)
+        if match is None:
+            return None
+        try:
+            created = datetime.fromtimestamp(ULID.from_str(match.group(1)).timestamp)
+        except ValueError:
+            return None
+        return created.strftime("%Y%m%d/%H")
+
+    @classmethod
+    def output_path(cls, filename: str, create: bool = False) -> Path:
+        """
+        获取输出文件的存放路径
+
+        生成、下载和清理都通过该方法确定路径；文件名中没有ULID时（旧版本生成的文件）位于输出目录下
+
+        Args:
+            filename: 文件名（不含目录）
+            create: 是否创建分桶目录
+
+        Returns:
+            Path: 文件路径
+        """
+        bucket = cls.bucket_of(filename)
+        if bucket is None:
+            return settings.OUTPUT_DIR / filename
+        directory = settings.OUTPUT_DIR / bucket
+        if create and directory not in cls._bucket_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            cls._bucket_dirs.add(directory)
+        return directory / filename
+
+    @staticmethod
+    def temp_path(path: Path) -> Path:
+        """
+        获取写入过程中使用的临时文件路径（扩展名为 .tmp，不能被下载）
+
+        Args:
+            path: 最终文件路径
+
+        Returns:
+            Path: 同目录下的临时文件路径
+        """
+        return path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+
+    @classmethod
+    def write_atomic(cls, path: Path, data: bytes) -> None:
+        """
+        先写入临时文件再重命名，文件出现时即为完整内容
+
+        Args:
+            path: 文件路径
+            data: 文件内容
+        """
+        tmp_path = cls.temp_path(path)
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def resolve_output_file(cls, filename: str) -> Tuple[Path, os.stat_result]:
+        """
+        根据文件名查找输出目录中的文件
+
+        Args:
+            filename: 文件名（不含目录）
+
+        Returns:
+            Tuple[Path, os.stat_result]: (文件路径, 文件状态)
+
+        Raises:
+            QRCodeException: 文件名不合法或文件不存在
+        """
+        # 只接受输出目录下的文件名，拒绝路径分隔符和隐藏文件
+        if (
+            not filename
+            or filename != Path(filename).name
+            or "\\" in filename
+            or filename.startswith(".")
+            or Path(filename).suffix.lower() not in cls.MEDIA_TYPES
+        ):
+            raise QRCodeException(ErrorCode.FILE_NOT_FOUND, status_code=404)
+
+        file_path = cls.output_path(filename)
+        try:
+            stat_result = file_path.stat()
+        except OSError:
+            raise QRCodeException(ErrorCode.FILE_NOT_FOUND, status_code=404)
+        return file_path, stat_result
+
+    @staticmethod
+    async def spool_upload(file: UploadFile) -> BinaryIO:
+        """
+        将上传文件转存到由调用方管理的临时文件
+
+        UploadFile 在请求处理函数返回后即被关闭，流式响应需要在此之后继续读取时使用；
+        不超过 UPLOAD_SPOOL_BYTES 的文件保留在内存中
+
+        Args:
+            file: 上传的文件
+
+        Returns:
+            BinaryIO: 位于开头的临时文件，使用完毕后由调用方关闭
+        """
+        spooled = tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_BYTES)
+        file.file.seek(0)
+        await asyncio.get_running_loop().run_in_executor(None, shutil.copyfileobj, file.file, spooled)
+        spooled.seek(0)
+        return spooled
+
+    @staticmethod
+    def make_etag(filename: str, stat_result: os.stat_result) -> str:
+        """
+        计算文件的强ETag
+
+        输出文件名唯一且写入后不再修改，文件名、大小和修改时间即可确定内容
+
+        Args:
+            filename: 文件名
+            stat_result: 文件状态
+
+        Returns:
+            str: 带引号的ETag
+        """
+        etag_base = f"{filename}:{stat_result.st_size}:{stat_result.st_mtime_ns}"
+        return '"%s"' % hashlib.sha256(etag_base.encode("utf-8")).hexdigest()[:32]
+
+    @classmethod
+    def get_index(cls) -> ArtifactIndex:
+        """
+        获取输出文件过期索引，首次调用时打开数据库
+
+        新建数据库时输出目录中已有的文件（如升级前生成的文件）按修改时间登记一次
+
+        Returns:
+            ArtifactIndex: 过期索引
+        """
+        if cls._index is None:
+            with cls._index_lock:
+                if cls._index is None:
+                    index = ArtifactIndex(settings.ARTIFACT_DB_PATH)
+                    if index.created:
+                        cls._index_existing_files(index)
+                    cls._index = index
+        return cls._index
+
+    @staticmethod
+    def _index_existing_files(index: ArtifactIndex) -> None:
+        """
+        将输出目录中已有的文件登记到索引
+
+        Args:
+            index: 新建的过期索引
+        """
+        entries = []
+        for directory, _, filenames in os.walk(settings.OUTPUT_DIR):
+            for filename in filenames:
+                if Path(filename).suffix.lower() not in FileService.MEDIA_TYPES:
+                    continue
+                file_path = Path(directory) / filename
+                stat_result = file_path.stat()
+                entries.append((
+                    file_path.relative_to(settings.OUTPUT_DIR).as_posix(),
+                    stat_result.st_size,
+                    stat_result.st_mtime + settings.TEMP_FILE_EXPIRE
+                ))
+        index.record(entries)
+        if entries:
+            logger.info("已登记输出目录中的 %d 个文件", len(entries))
+
+    @classmethod
+    def register_files(cls, paths: Sequence[Path]) -> None:
+        """
+        登记新生成的输出文件，过期时间为 TEMP_FILE_EXPIRE 秒后
+
+        同步调用，需在线程池中执行；登记后总大小超过 OUTPUT_MAX_BYTES 时立即按过期时间从早到晚删除文件
+
+        Args:
+            paths: 输出目录中的文件路径列表
+        """
+        expires_at = time.time() + settings.TEMP_FILE_EXPIRE
+        entries = []
+        for path in paths:
+            try:
+                size = path.stat().st_size
+            except OSError:
+                continue
+            entries.append((path.relative_to(settings.OUTPUT_DIR).as_posix(), size, expires_at))
+
+        index = cls.get_index()
+        index.record(entries)
+        if settings.OUTPUT_MAX_BYTES and index.total_bytes() > settings.OUTPUT_MAX_BYTES:
+            cls._evict_over_budget()
+
+    @classmethod
+    def _delete_files(cls, names: List[str]) -> None:
+        """
+        删除输出目录中的文件
+
+        Args:
+            names: 相对输出目录的文件名列表
+        """
+        for name in names:
+            try:
+                (settings.OUTPUT_DIR / name).unlink(missing_ok=True)
+            except OSError as e:
+                logger.error("删除文件失败 %s: %s", name, str(e))
+
+    @classmethod
+    def _delete_expired_batch(cls, now: float) -> int:
+        """
+        删除一批已过期的文件
+
+        Args:
+            now: 当前时间戳
+
+        Returns:
+            int: 删除的文件数
+        """
+        names = cls.get_index().pop(settings.CLEANUP_BATCH_SIZE, expires_before=now)
+        cls._delete_files(names)
+        return len(names)
+
+    @classmethod
+    def _remove_expired_buckets(cls, now: float) -> int:
+        """
+        删除已过期且索引中已没有记录的分桶目录
+
+        分桶结束 TEMP_FILE_EXPIRE 秒后，其中的文件应已全部过期；整体删除时一并清除
+        异常退出时残留的临时文件和未登记的图片。仍有正在写入的临时文件（如耗时较长的任务的导出文件）的分桶跳过。
+        只遍历日期和小时两级目录
+
+        Args:
+            now: 当前时间戳
+
+        Returns:
+            int: 删除的分桶目录数
+        """
+        index = cls.get_index()
+        removed = 0
+        for day_dir in sorted(settings.OUTPUT_DIR.iterdir()):
+            if not (day_dir.is_dir() and day_dir.name.isdigit()):
+                continue
+            for hour_dir in sorted(day_dir.iterdir()):
+                try:
+                    bucket_end = datetime.strptime(f"{day_dir.name}{hour_dir.name}", "%Y%m%d%H").timestamp() + 3600
+                except ValueError:
+                    continue
+                if bucket_end + settings.TEMP_FILE_EXPIRE > now:
+                    break  # 之后的分桶更新
+                prefix = f"{day_dir.name}/{hour_dir.name}/"
+                if index.count_prefix(prefix):
+                    continue  # 仍有未过期的文件（如耗时较长的任务结束时才登记的导出文件）
+                if cls._has_active_temp_files(hour_dir, now):
+                    continue
+                shutil.rmtree(hour_dir, ignore_errors=True)
+                cls._bucket_dirs.discard(hour_dir)
+                removed += 1
+            if not any(day_dir.iterdir()):
+                day_dir.rmdir()
+        return removed
+
     @staticmethod
-    async def cleanup_expired_files() -> None:
-        """清理过期的临时文件"""
-        current_time = datetime.now().timestamp()
+    def _has_active_temp_files(directory: Path, now: float) -> bool:
+        """
+        检查目录中是否有正在写入的临时文件
+
+        写入过程中临时文件的修改时间持续更新，TEMP_FILE_EXPIRE 秒内未修改的视为异常退出时的残留
+
+        Args:
+            directory: 分桶目录
+            now: 当前时间戳
+
+        Returns:
+            bool: 是否有最近修改过的 .tmp 文件
+        """
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    if entry.stat().st_mtime > now - settings.TEMP_FILE_EXPIRE:
+                        return True
+                except OSError:
+                    continue  # 已写完并重命名
+        return False
+
+    @classmethod
+    def _evict_over_budget(cls) -> None:
+        """
+        超出磁盘配额时按过期时间从早到晚分批删除文件，直到总大小降到配额的90%
+
+        同一时间只有一个线程执行，其他线程直接返回
+        """
+        if not cls._evict_lock.acquire(blocking=False):
+            return
+        try:
+            index = cls.get_index()
+            target = settings.OUTPUT_MAX_BYTES * 0.9
+            removed = 0
+            while index.total_bytes() > target:
+                names = index.pop(settings.CLEANUP_BATCH_SIZE)
+                if not names:
+                    break
+                cls._delete_files(names)
+                removed += len(names)
+            if removed:
+                logger.warning("输出目录超出配额 %d 字节，已提前删除 %d 个文件", settings.OUTPUT_MAX_BYTES, removed)
+        finally:
+            cls._evict_lock.release()
+
+    @classmethod
+    async def cleanup_expired_files(cls) -> None:
+        """
+        清理过期的临时文件
 
-        # 清理输出目录中的过期二维码图片
+        从过期索引中按批取出已过期的文件，每批最多 CLEANUP_BATCH_SIZE 个，
+        查询和删除都在线程池中执行，批次之间让出事件循环；最后删除已清空的过期分桶目录
+        """
+        loop = asyncio.get_running_loop()
+        now = time.time()
+        removed = 0
         try:
-            for file_path in settings.OUTPUT_DIR.glob('*.png'):
-                if file_path.is_file():
-                    file_modified_time = file_path.stat().st_mtime
-                    if current_time - file_modified_time > settings.TEMP_FILE_EXPIRE:
-                        try:
-                            os.remove(file_path)
-                            logger.info("已删除过期二维码文件: %s", file_path)
-                        except (OSError, PermissionError) as e:
-                            logger.error("删除文件失败 %s: %s", file_path, str(e))
-        except (OSError, PermissionError) as e:
-            logger.error("清理目录失败 %s: %s", settings.OUTPUT_DIR, str(e))
+            while True:
+                count = await loop.run_in_executor(None, cls._delete_expired_batch, now)
+                removed += count
+                if count < settings.CLEANUP_BATCH_SIZE:
+                    break
+                await asyncio.sleep(0)
+            buckets = await loop.run_in_executor(None, cls._remove_expired_buckets, now)
+        except (OSError, sqlite3.Error) as e:
+            logger.error("清理过期文件失败: %s", str(e))
+            return
+        if removed or buckets:
+            logger.info("已删除 %d 个过期文件, %d 个过期目录", removed, buckets)
@@ -0,0 +1,538 @@
+"""
+批量任务服务
+
+将大批量二维码生成放到后台执行：
+- 提交后立即返回任务ID，由固定数量的后台工作协程从数据库中依次取出排队的任务处理
+- 任务及进度保存在 SQLite 中，多个服务进程共用同一数据库，任一进程都可以处理任一进程提交的任务
+- 运行中的任务记录所属进程并定时更新心跳，心跳超时（进程异常退出）的任务由存活的进程重新排队
+- 停止服务时等待运行中的任务完成，超时后中断并立即重新排队
+- 支持查询进度、下载结果和取消任务
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from ulid import ULID
+
+from app.core.config import settings
+from app.core.exceptions import QRCodeException, ErrorCode
+from app.services.admission import admission
+from app.services.qrcode_service import QRCodeService
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class JobStore:
+    """基于 SQLite 的任务存储，所有方法均为同步调用，需在线程池中执行"""
+
+    # 任务状态
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    # 查询任务时返回的字段（不包括任务内容）
+    FIELDS = ("id", "status", "params", "total", "done", "files", "error", "created_at", "started_at", "finished_at")
+    # 后续版本新增的字段，打开旧数据库时补充
+    ADDED_COLUMNS = {"owner": "TEXT", "heartbeat_at": "REAL"}
+
+    def __init__(self, db_path: Path) -> None:
+        """
+        打开数据库并创建任务表
+
+        Args:
+            db_path: 数据库文件路径
+        """
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, items TEXT NOT NULL, "
+                "total INTEGER NOT NULL, done INTEGER NOT NULL DEFAULT 0, files TEXT, error TEXT, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, owner TEXT, heartbeat_at REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in self.ADDED_COLUMNS.items():
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    def close(self) -> None:
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql: str, args: Sequence[Any] = ()) -> sqlite3.Cursor:
+        """执行一条SQL语句"""
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    def create(self, job_id: str, params: Dict[str, Any], items: List[Tuple[str, Optional[str], str]]) -> None:
+        """
+        创建排队中的任务
+
+        Args:
+            job_id: 任务ID
+            params: 生成参数
+            items: 内容、标签和原始文本的元组列表
+        """
+        self._execute(
+            "INSERT INTO jobs (id, status, params, items, total, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, self.QUEUED, json.dumps(params), json.dumps(items, ensure_ascii=False), len(items), time.time())
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询任务
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务信息（不包括任务内容），不存在时返回 None
+        """
+        row = self._execute(f"SELECT {', '.join(self.FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.FIELDS, row))
+        job["params"] = json.loads(job["params"])
+        job["files"] = json.loads(job["files"]) if job["files"] else {}
+        return job
+
+    def claim_next(self, owner: str) -> Optional[Tuple[str, Dict[str, Any], List[Tuple[str, Optional[str], str]]]]:
+        """
+        取出最早提交的排队中任务，标记为由 owner 运行
+
+        多个进程共用数据库时，同一任务只会被一个进程取得
+
+        Args:
+            owner: 当前进程的标识
+
+        Returns:
+            Optional[Tuple[str, Dict[str, Any], List[Tuple[str, Optional[str], str]]]]:
+                (任务ID, 生成参数, 任务内容)，没有排队中的任务时返回 None
+        """
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (self.QUEUED,)
+                ).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, done = 0, owner = ?, heartbeat_at = ? "
+                    "WHERE id = ? AND status = ?",
+                    (self.RUNNING, now, owner, now, row[0], self.QUEUED)
+                )
+                if cursor.rowcount:
+                    break
+                # 已被其他进程取得，继续取下一个
+            params, items = self._conn.execute(
+                "SELECT params, items FROM jobs WHERE id = ?", (row[0],)
+            ).fetchone()
+        return row[0], json.loads(params), [tuple(item) for item in json.loads(items)]
+
+    def update_progress(self, job_id: str, done: int, owner: str) -> Optional[str]:
+        """
+        更新任务进度和心跳
+
+        Args:
+            job_id: 任务ID
+            done: 已完成的数量
+            owner: 当前进程的标识
+
+        Returns:
+            Optional[str]: 任务当前状态，不是 running 时调用方应停止处理；
+                任务已被重新排队并由其他进程取得时返回 None
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET done = ?, heartbeat_at = ? WHERE id = ? AND status = ? AND owner = ?",
+                (done, time.time(), job_id, self.RUNNING, owner)
+            )
+            status, job_owner = self._conn.execute(
+                "SELECT status, owner FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return status if job_owner == owner else None
+
+    def finish(
+        self,
+        job_id: str,
+        owner: str,
+        status: str,
+        files: Optional[Dict[str, str]] = None,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        结束当前进程运行中的任务（已取消或已由其他进程接管的任务保持不变）
+
+        Args:
+            job_id: 任务ID
+            owner: 当前进程的标识
+            status: 结束状态（completed / failed）
+            files: 导出文件 {导出格式: 文件名}
+            error: 错误信息
+        """
+        self._execute(
+            "UPDATE jobs SET status = ?, files = ?, error = ?, finished_at = ?, "
+            "done = CASE WHEN ? = 'completed' THEN total ELSE done END "
+            "WHERE id = ? AND status = ? AND owner = ?",
+            (status, json.dumps(files or {}), error, time.time(), status, job_id, self.RUNNING, owner)
+        )
+
+    def heartbeat(self, owner: str) -> None:
+        """
+        更新当前进程所有运行中任务的心跳
+
+        Args:
+            owner: 当前进程的标识
+        """
+        self._execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ?",
+            (time.time(), self.RUNNING, owner)
+        )
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消排队中或运行中的任务
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            bool: 是否取消成功
+        """
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status IN (?, ?)",
+            (self.CANCELLED, time.time(), job_id, self.QUEUED, self.RUNNING)
+        )
+        return cursor.rowcount > 0
+
+    def requeue_owned(self, owner: str) -> int:
+        """
+        将当前进程中断的运行中任务重新排队（服务停止时调用）
+
+        Args:
+            owner: 当前进程的标识
+
+        Returns:
+            int: 重新排队的任务数
+        """
+        return self._execute(
+            "UPDATE jobs SET status = ?, done = 0, started_at = NULL, owner = NULL, heartbeat_at = NULL "
+            "WHERE status = ? AND owner = ?",
+            (self.QUEUED, self.RUNNING, owner)
+        ).rowcount
+
+    def requeue_stale(self, timeout: float) -> int:
+        """
+        将心跳超时的运行中任务重新排队，这些任务所属的进程已异常退出
+
+        正常运行的进程定时更新心跳，其他进程的任务不会被重新排队
+
+        Args:
+            timeout: 心跳超时时间（秒）
+
+        Returns:
+            int: 重新排队的任务数
+        """
+        return self._execute(
+            "UPDATE jobs SET status = ?, done = 0, started_at = NULL, owner = NULL, heartbeat_at = NULL "
+            "WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+            (self.QUEUED, self.RUNNING, time.time() - timeout)
+        ).rowcount
+
+
+class JobService:
+    """批量任务服务类"""
+
+    _store: Optional[JobStore] = None
+    _wakeup: Optional[asyncio.Event] = None  # 当前进程提交任务时唤醒空闲的工作协程
+    _workers: List["asyncio.Task[None]"] = []
+    _heartbeat: Optional["asyncio.Task[None]"] = None
+    _busy: Set["asyncio.Task[None]"] = set()  # 正在处理任务的工作协程
+    _stopping = False
+    _owner = ""  # 当前进程的标识（主机名:进程号），记录在运行中的任务上
+
+    @classmethod
+    def _get_store(cls) -> JobStore:
+        """获取任务存储"""
+        if cls._store is None:
+            raise RuntimeError("任务服务未启动")
+        return cls._store
+
+    @classmethod
+    async def _run_store(cls, method: str, *args: Any) -> Any:
+        """在线程池中调用任务存储的方法"""
+        return await asyncio.get_running_loop().run_in_executor(None, getattr(cls._get_store(), method), *args)
+
+    @classmethod
+    async def start(cls) -> None:
+        """
+        打开任务存储，启动工作协程和心跳协程
+
+        数据库中排队的任务（包括服务重启前提交的任务）由工作协程轮询取出
+        """
+        cls._store = JobStore(settings.JOB_DB_PATH)
+        cls._wakeup = asyncio.Event()
+        cls._stopping = False
+        cls._owner = f"{socket.gethostname()}:{os.getpid()}"
+        await cls._requeue_stale()
+        cls._workers = [asyncio.create_task(cls._worker()) for _ in range(settings.JOB_WORKERS)]
+        cls._heartbeat = asyncio.create_task(cls._heartbeat_loop())
+        logger.info("批量任务服务已启动，工作协程数: %d", settings.JOB_WORKERS)
+
+    @classmethod
+    async def stop(cls, timeout: float = 0) -> None:
+        """
+        停止工作协程
+
+        不再开始新任务，等待运行中的任务最多 timeout 秒后中断；
+        中断的任务立即重新排队，由其他进程或下次启动后的进程处理
+
+        Args:
+            timeout: 等待运行中任务的最长时间（秒）
+        """
+        cls._stopping = True
+        for worker in cls._workers:
+            if worker not in cls._busy:
+                worker.cancel()
+        if cls._busy and timeout > 0:
+            logger.info("等待 %d 个运行中的批量任务完成", len(cls._busy))
+            await asyncio.wait(cls._workers, timeout=timeout)
+        tasks = cls._workers + ([cls._heartbeat] if cls._heartbeat is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        cls._workers = []
+        cls._heartbeat = None
+        if cls._store is not None:
+            requeued = await cls._run_store("requeue_owned", cls._owner)
+            if requeued:
+                logger.info("已将 %d 个中断的批量任务重新排队", requeued)
+            cls._store.close()
+            cls._store = None
+        logger.info("批量任务服务已停止")
+
+    @classmethod
+    async def submit(
+        cls,
+        items: List[Tuple[str, Optional[str], str]],
+        output_format: str = "png",
+        mask_pattern: Optional[int] = None,
+        exports: Sequence[str] = ("zip",)
+    ) -> str:
+        """
+        提交批量任务
+
+        Args:
+            items: 内容、标签和原始文本的元组列表 [(content, label, original_text), ...]
+            output_format: 输出格式
+            mask_pattern: 整个批次使用的掩码（0-7）
+            exports: 导出格式列表（pdf / zip），任务结果通过导出文件下载
+
+        Returns:
+            str: 任务ID
+
+        Raises:
+            QRCodeException: 内容为空或未指定导出格式时抛出
+        """
+        if not items:
+            raise QRCodeException(ErrorCode.INVALID_CONTENT, "内容列表不能为空")
+        if not exports:
+            raise QRCodeException(ErrorCode.INVALID_CONTENT, "批量任务至少需要一种导出格式")
+
+        job_id = str(ULID())
+        params = {"output_format": output_format, "mask_pattern": mask_pattern, "exports": list(exports)}
+        await cls._run_store("create", job_id, params, items)
+        cls._wakeup.set()
+        logger.info("已提交批量任务 %s，数量: %d", job_id, len(items))
+        return job_id
+
+    @classmethod
+    async def get(cls, job_id: str) -> Dict[str, Any]:
+        """
+        查询任务进度
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Dict[str, Any]: 任务信息，运行中的任务附带预计剩余秒数 eta
+
+        Raises:
+            QRCodeException: 任务不存在时抛出
+        """
+        job = await cls._run_store("get", job_id)
+        if job is None:
+            raise QRCodeException(ErrorCode.JOB_NOT_FOUND, status_code=404)
+
+        job["eta"] = None
+        if job["status"] == JobStore.RUNNING and job["done"] and job["started_at"]:
+            elapsed = time.time() - job["started_at"]
+            job["eta"] = round(elapsed / job["done"] * (job["total"] - job["done"]), 1)
+        return job
+
+    @classmethod
+    async def cancel(cls, job_id: str) -> Dict[str, Any]:
+        """
+        取消任务，运行中的任务在处理完当前分块后停止
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Dict[str, Any]: 取消后的任务信息
+
+        Raises:
+            QRCodeException: 任务不存在或已结束时抛出
+        """
+        if not await cls._run_store("cancel", job_id):
+            job = await cls.get(job_id)
+            raise QRCodeException(ErrorCode.INVALID_CONTENT, f"任务已结束，无法取消: {job['status']}")
+        logger.info("已取消批量任务 %s", job_id)
+        return await cls.get(job_id)
+
+    @classmethod
+    async def _worker(cls) -> None:
+        """
+        工作协程，从数据库中依次取出排队的任务处理，服务停止时处理完当前任务后退出
+
+        没有排队的任务时等待当前进程提交新任务，最长 JOB_POLL_INTERVAL 秒后再次查询，
+        以便取得其他进程提交或重新排队的任务
+        """
+        worker = asyncio.current_task()
+        while not cls._stopping:
+            cls._wakeup.clear()
+            claimed = await cls._run_store("claim_next", cls._owner)
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(cls._wakeup.wait(), settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job_id = claimed[0]
+            cls._busy.add(worker)
+            try:
+                await cls._process(*claimed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("批量任务 %s 处理失败: %s", job_id, str(e))
+            finally:
+                cls._busy.discard(worker)
+
+    @classmethod
+    async def _heartbeat_loop(cls) -> None:
+        """心跳协程，定时更新当前进程运行中任务的心跳，并重新排队心跳超时的任务"""
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_INTERVAL)
+            try:
+                await cls._run_store("heartbeat", cls._owner)
+                await cls._requeue_stale()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("更新批量任务心跳失败: %s", str(e))
+
+    @classmethod
+    async def _requeue_stale(cls) -> None:
+        """重新排队所属进程已异常退出的任务"""
+        requeued = await cls._run_store("requeue_stale", settings.JOB_HEARTBEAT_TIMEOUT)
+        if requeued:
+            logger.info("已将 %d 个心跳超时的批量任务重新排队", requeued)
+            cls._wakeup.set()
+
+    @classmethod
+    async def _process(
+        cls,
+        job_id: str,
+        params: Dict[str, Any],
+        items: List[Tuple[str, Optional[str], str]]
+    ) -> None:
+        """
+        处理一个已取得的任务
+
+        申请与在线请求共享的在途渲染项预算，预算不足时等待而不是拒绝
+
+        Args:
+            job_id: 任务ID
+            params: 任务参数
+            items: 内容、标签和原始文本的元组列表
+        """
+        ticket = await admission.acquire(background=True)
+        try:
+            await cls._run_batch(job_id, params, items)
+        finally:
+            ticket.release()
+
+    @classmethod
+    async def _run_batch(
+        cls,
+        job_id: str,
+        params: Dict[str, Any],
+        items: List[Tuple[str, Optional[str], str]]
+    ) -> None:
+        """
+        生成任务的二维码和导出文件
+
+        每完成 RENDER_CHUNK_SIZE 个二维码更新一次进度并检查任务是否已被取消
+
+        Args:
+            job_id: 任务ID
+            params: 任务参数
+            items: 内容、标签和原始文本的元组列表
+        """
+        logger.info("开始处理批量任务 %s，数量: %d", job_id, len(items))
+
+        done = 0
+        files: Dict[str, str] = {}
+        batch = QRCodeService.iter_batch(
+            items,
+            params["output_format"],
+            params["mask_pattern"],
+            inline=False,
+            exports=params["exports"]
+        )
+        try:
+            async for file_path, _, file_type, _ in batch:
+                if file_type != "image":
+                    files[file_type] = Path(file_path).name
+                    continue
+                done += 1
+                if done % settings.RENDER_CHUNK_SIZE == 0:
+                    status = await cls._run_store("update_progress", job_id, done, cls._owner)
+                    if status == JobStore.CANCELLED:
+                        logger.info("批量任务 %s 已取消，已完成 %d/%d", job_id, done, len(items))
+                        return
+                    if status != JobStore.RUNNING:
+                        logger.warning("批量任务 %s 已由其他进程接管，停止处理", job_id)
+                        return
+        except QRCodeException as e:
+            await cls._run_store("finish", job_id, cls._owner, JobStore.FAILED, None, e.detail["message"])
+            return
+        except asyncio.CancelledError:
+            # 服务停止时中断，任务保持运行中状态，重启后重新排队
+            raise
+        except Exception as e:
+            logger.error("批量任务 %s 处理失败: %s", job_id, str(e))
+            await cls._run_store("finish", job_id, cls._owner, JobStore.FAILED, None, str(e) or type(e).__name__)
+            return
+        finally:
+            # 提前结束时关闭生成器，取消未完成的分块并删除未写完的导出文件
+            await batch.aclose()
+
+        await cls._run_store("finish", job_id, cls._owner, JobStore.COMPLETED, files)
+        logger.info("批量任务 %s 已完成", job_id)
@@ -5,19 +5,35 @@
 - 单个文本生成二维码
 - 多行文本生成二维码
 - 批量生成带标签的二维码
+- 支持PNG位图和SVG矢量输出
+- 批量结果导出为PDF和ZIP
 """
-from typing import List, Optional, Tuple, Any, Coroutine
+from typing import Dict, List, Optional, Tuple, Any, Coroutine, AsyncIterator, Deque, Iterable, Sequence, Sized
+from collections import OrderedDict, deque
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 import base64
+import os
+import time
 from io import BytesIO
+import zipfile
 import qrcode
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 from ulid import ULID
 import asyncio
 
 from app.core.config import settings
 from app.core.exceptions import QRCodeException, ErrorCode
+from app.core.metrics import BATCH_DUPLICATES, BATCH_ITEMS, OUTPUT_BYTES, RENDER_CACHE, stage_timer
+from app.services.file_service import FileService
+from app.services.render_cache import render_cache
+from app.services.render_engine import RenderEngine
+from app.utils.font import get_label_font
+from app.utils.pdf_writer import PDFStreamWriter
+from app.utils.qr_encoder import encode_matrix
+from app.utils.raster import rasterize_matrix
+from app.utils.vector import VectorPage, pack_page, render_svg, unpack_page, vector_page
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -26,30 +42,40 @@ logger = get_logger(__name__)
 class QRCodeService:
     """二维码生成服务类"""
 
+    # 输出格式 -> (文件扩展名, MIME类型)
+    OUTPUT_FORMATS = {
+        "png": ("png", "image/png"),
+        "svg": ("svg", "image/svg+xml"),
+    }
+
+    # 批量导出格式 -> (MIME类型, 内容描述)
+    EXPORT_FORMATS = {
+        "pdf": ("application/pdf", "PDF文档"),
+        "zip": ("application/zip", "ZIP压缩包"),
+    }
+
     @staticmethod
-    def _generate_qr_image(content: str) -> Image.Image:
+    def _generate_qr_matrix(content: str, mask_pattern: Optional[int] = None) -> Sequence[Sequence[bool]]:
         """
-        生成二维码图片
+        生成二维码模块矩阵
 
         Args:
             content: 二维码内容
+            mask_pattern: 指定掩码（0-7），默认选择罚分最低的掩码
 
         Returns:
-            Image.Image: 生成的二维码图片
+            Sequence[Sequence[bool]]: 含边框的模块矩阵，True 表示深色模块
 
         Raises:
             QRCodeException: 当二维码内容无效时抛出
         """
         try:
-            # 生成二维码
-            qr_image = qrcode.make(
-                content,
-                box_size=settings.QR_BORDER
-            )
-
-            # 调整图片大小
-            qr_image = qr_image.resize((settings.QR_SIZE, settings.QR_SIZE))
-            return qr_image
+            with stage_timer("encode"):
+                if settings.QR_ENCODER == "numpy":
+                    return encode_matrix(content, mask_pattern=mask_pattern)
+                qr = qrcode.QRCode(mask_pattern=mask_pattern)
+                qr.add_data(content)
+                return qr.get_matrix()
         except Exception as e:
             logger.error("生成二维码失败: %s", str(e))
             raise QRCodeException(
@@ -57,61 +83,152 @@ class QRCodeService:
                 f"生成二维码失败: {str(e)}"
             ) from e
 
-    @staticmethod
-    def _add_label(qr_image: Image.Image, label: str) -> Image.Image:
+    @classmethod
+    def _generate_qr_image(cls, content: str, mask_pattern: Optional[int] = None) -> Image.Image:
         """
-        为二维码添加标签
+        生成二维码图片
+
+        由模块矩阵直接栅格化为 QR_SIZE 尺寸的1位图片
 
         Args:
-            qr_image: 二维码图片
-            label: 标签文本
+            content: 二维码内容
+            mask_pattern: 指定掩码（0-7），默认选择罚分最低的掩码
 
         Returns:
-            Image.Image: 添加标签后的图片
+            Image.Image: 生成的二维码图片
+
+        Raises:
+            QRCodeException: 当二维码内容无效时抛出
         """
-        # 创建新图片（包含标签区域）
-        new_height = qr_image.height + settings.LABEL_HEIGHT
-        new_image = Image.new('RGB', (qr_image.width, new_height), 'white')
+        matrix = cls._generate_qr_matrix(content, mask_pattern)
+        with stage_timer("rasterize"):
+            return rasterize_matrix(matrix, settings.QR_SIZE)
 
-        # 粘贴二维码图片
-        new_image.paste(qr_image, (0, 0))
+    @staticmethod
+    @lru_cache(maxsize=settings.LABEL_CACHE_SIZE)
+    def _render_label_strip(label: str, width: int, font_size: int) -> Image.Image:
+        """
+        渲染标签区域图片（按文本、宽度和字号缓存，调用方不得修改返回的图片）
 
-        # 添加标签文本
-        draw = ImageDraw.Draw(new_image)
-        try:
-            # 尝试加载中文字体
-            font = ImageFont.truetype("simhei.ttf", settings.LABEL_HEIGHT // 2)
-            # 如果是ubuntu，则安装中文字体或者选择该系统有的中文字体
-            # sudo apt-get update
-            # sudo apt-get install fonts-wqy-zenhei fonts-wqy-microhei
-            # 查看字体路径，在ubuntu command中输入 fc-list :lang=zh
-            # 然后注销上面代码，使用下面代码
-            # font = ImageFont.truetype("/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc", settings.LABEL_HEIGHT // 2)
-        except OSError:
-            # 如果找不到中文字体，使用默认字体
-            font = ImageFont.load_default()
+        Args:
+            label: 标签文本
+            width: 标签区域宽度
+            font_size: 字号
+
+        Returns:
+            Image.Image: 标签区域图片
+        """
+        strip = Image.new('L', (width, settings.LABEL_HEIGHT), 'white')
+        draw = ImageDraw.Draw(strip)
+        font = get_label_font(font_size)
 
         # 计算文本位置使其居中
         text_bbox = draw.textbbox((0, 0), label, font=font)
         text_width = text_bbox[2] - text_bbox[0]
         text_height = text_bbox[3] - text_bbox[1]
 
-        x = (qr_image.width - text_width) // 2
-        y = qr_image.height + (settings.LABEL_HEIGHT - text_height) // 2
+        x = (width - text_width) // 2
+        y = (settings.LABEL_HEIGHT - text_height) // 2
 
         # 绘制文本
         draw.text((x, y), label, fill='black', font=font)
+        return strip
+
+    @classmethod
+    def _add_label(cls, qr_image: Image.Image, label: str) -> Image.Image:
+        """
+        为二维码添加标签
+
+        Args:
+            qr_image: 二维码图片
+            label: 标签文本
+
+        Returns:
+            Image.Image: 添加标签后的图片
+        """
+        with stage_timer("label"):
+            # 创建新图片（包含标签区域）
+            new_height = qr_image.height + settings.LABEL_HEIGHT
+            new_image = Image.new('L', (qr_image.width, new_height), 'white')
+
+            # 粘贴二维码图片和标签区域
+            new_image.paste(qr_image, (0, 0))
+            strip = cls._render_label_strip(label, qr_image.width, settings.LABEL_HEIGHT // 2)
+            new_image.paste(strip, (0, qr_image.height))
 
         return new_image
 
     @staticmethod
-    def _save_image(image: Image.Image, label: Optional[str] = None) -> Path:
+    @lru_cache(maxsize=None)
+    def _gray_palette(bits: int) -> Tuple[List[int], List[int]]:
+        """
+        获取指定位深的灰阶调色板
+
+        Args:
+            bits: 位深（2或4）
+
+        Returns:
+            Tuple[List[int], List[int]]: (灰度值到调色板下标的映射表, RGB调色板)
+        """
+        levels = (1 << bits) - 1
+        lut = [(value * levels + 127) // 255 for value in range(256)]
+        palette = []
+        for index in range(levels + 1):
+            palette.extend([index * 255 // levels] * 3)
+        return lut, palette
+
+    @classmethod
+    def _encode_png(cls, image: Image.Image) -> bytes:
+        """
+        将图片编码为PNG数据
+
+        黑白二维码（mode '1'）保存为1位PNG；带标签的灰度图片按 PNG_LABEL_BITS 降低位深，
+        2/4位时量化为灰阶调色板，8位时保存为灰度图
+
+        Args:
+            image: PIL图片对象（mode '1' 或 'L'）
+
+        Returns:
+            bytes: PNG图片数据
+        """
+        options = {"compress_level": settings.PNG_COMPRESS_LEVEL}
+        bits = settings.PNG_LABEL_BITS
+        if image.mode == "L" and bits == 1:
+            image = image.convert("1", dither=Image.Dither.NONE)
+        elif image.mode == "L" and bits < 8:
+            lut, palette = cls._gray_palette(bits)
+            indexed = Image.frombytes("P", image.size, image.point(lut).tobytes())
+            indexed.putpalette(palette)
+            image = indexed
+            options["bits"] = bits
+
+        with stage_timer("png_encode"):
+            buffered = BytesIO()
+            image.save(buffered, format="PNG", **options)
+            return buffered.getvalue()
+
+    @staticmethod
+    def _safe_label(label: str) -> str:
+        """
+        去除标签中不适合用作文件名的字符
+
+        Args:
+            label: 标签文本
+
+        Returns:
+            str: 只包含字母、数字、空格、下划线和连字符的文本
+        """
+        return "".join(c for c in label if c.isalnum() or c in (' ', '_', '-'))
+
+    @classmethod
+    def _save_image(cls, image_data: bytes, label: Optional[str] = None, output_format: str = "png") -> Path:
         """
         保存图片到临时目录
 
         Args:
-            image: 图片对象
+            image_data: 图片数据
             label: 标签文本（用于文件名）
+            output_format: 输出格式
 
         Returns:
             Path: 保存的文件路径
@@ -122,158 +239,687 @@ class QRCodeService:
         filename = f"qr_{timestamp}_{ulid}"
         if label:
             # 如果有标签，添加到文件名中（去除特殊字符）
-            safe_label = "".join(c for c in label if c.isalnum() or c in (' ', '_', '-'))
-            filename = f"{filename}_{safe_label}"
-        filename = f"{filename}.png"
+            filename = f"{filename}_{cls._safe_label(label)}"
+        filename = f"{filename}.{cls.OUTPUT_FORMATS[output_format][0]}"
 
         # 保存文件
-        file_path = settings.OUTPUT_DIR / filename
-        image.save(file_path, 'PNG')
+        with stage_timer("file_write"):
+            file_path = FileService.output_path(filename, create=True)
+            FileService.write_atomic(file_path, image_data)
+        OUTPUT_BYTES.labels("image").inc(len(image_data))
         return file_path
 
-    @staticmethod
-    def _image_to_base64(image: Image.Image) -> str:
+    @classmethod
+    def _image_to_base64(cls, image_data: bytes, output_format: str = "png") -> str:
         """
-        将图片转换为base64编码
+        将图片数据转换为base64编码
 
         Args:
-            image: PIL图片对象
+            image_data: 图片数据
+            output_format: 输出格式
 
         Returns:
             str: base64编码的图片数据
         """
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        return f"data:image/png;base64,{img_str}"
+        with stage_timer("base64"):
+            img_str = base64.b64encode(image_data).decode()
+            return f"data:{cls.OUTPUT_FORMATS[output_format][1]};base64,{img_str}"
 
     @staticmethod
-    async def _generate_pdf(images: List[Image.Image]) -> bytes:
+    def _new_export_path(export_format: str) -> Path:
         """
-        将多个图片生成为PDF
+        生成批量导出文件路径
 
         Args:
-            images: PIL图片对象列表
+            export_format: 导出格式（pdf / zip）
 
         Returns:
-            bytes: PDF文件的二进制数据
-        """
-        # 创建一个字节流来保存PDF
-        pdf_buffer = BytesIO()
-
-        # 如果没有图片，返回空PDF
-        if not images:
-            return pdf_buffer.getvalue()
-
-        # 在事件循环的默认执行器中运行PDF生成
-        def generate():
-            first_image = images[0]
-            first_image_rgb = first_image.convert('RGB')
-            first_image_rgb.save(
-                pdf_buffer,
-                format='PDF',
-                save_all=True,
-                append_images=[img.convert('RGB') for img in images[1:]]
-            )
-            return pdf_buffer.getvalue()
+            Path: 输出目录中的导出文件路径
+        """
+        # 生成唯一文件名
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        ulid = str(ULID())
+        return FileService.output_path(f"qrcodes_{timestamp}_{ulid}.{export_format}", create=True)
 
-        return await asyncio.get_event_loop().run_in_executor(None, generate)
+    @classmethod
+    def _append_pdf_pages(
+        cls,
+        pdf_writer: PDFStreamWriter,
+        images: List[Tuple[Path, str, Optional[str], Optional[VectorPage]]],
+        output_format: str = "png",
+        mask_pattern: Optional[int] = None
+    ) -> None:
+        """
+        将图片文件逐页追加到PDF
+
+        Args:
+            pdf_writer: PDF写入器
+            images: [(image_path, content, label, page), ...]，page 为渲染时计算的矢量页面（仅 svg 格式）
+            output_format: 输出格式，svg 格式以矢量方式写入
+            mask_pattern: 批次使用的掩码，需要重新计算矢量页面时使用
+        """
+        for image_path, content, label, page in images:
+            with stage_timer("pdf"):
+                # 批次内重复的二维码共用同一文件，重复页面引用已写入的对象
+                if pdf_writer.repeat_page(image_path):
+                    continue
+                if output_format == "svg":
+                    if page is None:
+                        # 重复项的页面已被写入器淘汰，重新计算
+                        page = cls._vector_page_item(content, mask_pattern)
+                    scale, rects = page
+                    label_image = None
+                    if label:
+                        # 在线程池中执行，字体对象与小批量渲染共用，需依次使用
+                        label_image = RenderEngine.call_inline(
+                            cls._render_label_strip, label, settings.QR_SIZE, settings.LABEL_HEIGHT // 2
+                        )
+                    pdf_writer.add_vector(settings.QR_SIZE, scale, rects, label_image, key=image_path)
+                else:
+                    pdf_writer.add_png(image_path.read_bytes(), key=image_path)
 
     @staticmethod
-    async def _save_pdf(pdf_data: bytes) -> Path:
+    def _open_zip(zip_path: Path) -> zipfile.ZipFile:
         """
-        保存PDF文件到临时目录
+        创建ZIP文件
+
+        图片已经过压缩，条目以存储方式写入；启用ZIP64以支持超过65535个条目或4GB的压缩包
 
         Args:
-            pdf_data: PDF文件的二进制数据
+            zip_path: ZIP文件路径
 
         Returns:
-            Path: 保存的文件路径
+            zipfile.ZipFile: 以写模式打开的ZIP文件
         """
-        # 生成唯一文件名
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        ulid = str(ULID())
-        filename = f"qrcodes_{timestamp}_{ulid}.pdf"
+        return zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
 
-        # 保存文件
-        file_path = settings.OUTPUT_DIR / filename
+    @classmethod
+    def _append_zip_entries(
+        cls,
+        zip_file: zipfile.ZipFile,
+        images: List[Tuple[Path, Optional[str]]],
+        start: int,
+        total: Optional[int]
+    ) -> None:
+        """
+        将图片文件逐个追加到ZIP，条目数据从文件中分块复制
 
-        # 异步写入文件
-        def write_file():
-            with open(file_path, 'wb') as f:
-                f.write(pdf_data)
-            return file_path
+        条目名为 序号_标签.扩展名（无标签时为 序号.扩展名），序号从1开始并按总数补零
 
-        await asyncio.get_event_loop().run_in_executor(None, write_file)
-        return file_path
+        Args:
+            zip_file: ZIP文件
+            images: 图片文件路径和标签的元组列表 [(image_path, label), ...]
+            start: 第一张图片在批次中的下标
+            total: 批次总数，未知时为 None（序号补零到6位）
+        """
+        width = len(str(total)) if total else 6
+        for index, (image_path, label) in enumerate(images, start + 1):
+            name = f"{index:0{width}d}"
+            if label:
+                name = f"{name}_{cls._safe_label(label)}"
+            with stage_timer("zip"):
+                zip_file.write(image_path, f"{name}{image_path.suffix}")
 
     @classmethod
-    async def generate_single(cls, content: str) -> Tuple[Path, str]:
+    def _render_item(
+        cls,
+        content: str,
+        label: Optional[str],
+        output_format: str = "png",
+        mask_pattern: Optional[int] = None
+    ) -> bytes:
+        """
+        渲染单个二维码（可在渲染进程中执行）
+
+        Args:
+            content: 二维码内容
+            label: 标签文本
+            output_format: 输出格式
+            mask_pattern: 指定掩码（0-7），默认选择罚分最低的掩码
+
+        Returns:
+            bytes: 图片数据
+        """
+        if output_format == "svg":
+            return cls._render_vector_item(content, label, mask_pattern)[0]
+
+        qr_image = cls._generate_qr_image(content, mask_pattern)
+        if label:
+            qr_image = cls._add_label(qr_image, label)
+        return cls._encode_png(qr_image)
+
+    @classmethod
+    def _store_images(
+        cls,
+        rendered: List[Tuple[bytes, Optional[str]]],
+        output_format: str = "png",
+        inline: bool = True,
+        register: bool = True
+    ) -> List[Tuple[Path, Optional[str]]]:
+        """
+        保存图片并转换为base64编码，保存的文件登记到过期索引
+
+        Args:
+            rendered: 图片数据和标签的元组列表 [(image_data, label), ...]
+            output_format: 输出格式
+            inline: 是否生成base64编码，为 False 时只保存文件
+            register: 是否立即登记；批量生成时在写入PDF和ZIP之后再登记，
+                避免登记后因超出磁盘配额被删除
+
+        Returns:
+            List[Tuple[Path, Optional[str]]]: [(文件路径, base64编码的图片数据), ...]
+        """
+        stored = [
+            (
+                cls._save_image(image_data, label, output_format),
+                cls._image_to_base64(image_data, output_format) if inline else None
+            )
+            for image_data, label in rendered
+        ]
+        if register:
+            FileService.register_files([file_path for file_path, _ in stored])
+        return stored
+
+    @classmethod
+    def _vector_page_item(cls, content: str, mask_pattern: Optional[int] = None) -> VectorPage:
+        """
+        计算单个二维码的矢量页面（可在渲染进程中执行）
+
+        Args:
+            content: 二维码内容
+            mask_pattern: 指定掩码（0-7），默认选择罚分最低的掩码
+
+        Returns:
+            VectorPage: (每个模块的像素尺寸, 矩形列表)
+        """
+        return vector_page(cls._generate_qr_matrix(content, mask_pattern), settings.QR_SIZE)
+
+    @classmethod
+    def _render_vector_item(
+        cls,
+        content: str,
+        label: Optional[str],
+        mask_pattern: Optional[int] = None
+    ) -> Tuple[bytes, VectorPage]:
+        """
+        渲染单个SVG二维码，同时返回矢量页面用于写入PDF（可在渲染进程中执行）
+
+        Args:
+            content: 二维码内容
+            label: 标签文本
+            mask_pattern: 指定掩码（0-7），默认选择罚分最低的掩码
+
+        Returns:
+            Tuple[bytes, VectorPage]: (SVG数据, 矢量页面)
+        """
+        page = cls._vector_page_item(content, mask_pattern)
+        with stage_timer("svg_render"):
+            return render_svg(page, settings.QR_SIZE, label, settings.LABEL_HEIGHT), page
+
+    @classmethod
+    async def _render_cached(
+        cls,
+        items: List[Tuple[str, Optional[str]]],
+        output_format: str = "png",
+        mask_pattern: Optional[int] = None,
+        with_pages: bool = False
+    ) -> Tuple[List[bytes], Optional[List[VectorPage]]]:
+        """
+        渲染二维码，优先使用渲染缓存
+
+        SVG格式渲染时得到的矢量页面与SVG数据一起写入缓存，
+        之后导出矢量PDF时命中缓存的项直接读取矢量页面，不再编码
+
+        Args:
+            items: 内容和标签的元组列表 [(content, label), ...]
+            output_format: 输出格式
+            mask_pattern: 指定掩码（0-7），默认选择罚分最低的掩码
+            with_pages: 是否同时返回矢量页面（仅 svg 格式，用于写入矢量PDF）
+
+        Returns:
+            Tuple[List[bytes], Optional[List[VectorPage]]]: 与 items 顺序一致的图片数据列表和矢量页面列表
+        """
+        cache_enabled = settings.RENDER_CACHE_ENABLED
+        with_pages = with_pages and output_format == "svg"
+        render_pages = output_format == "svg" and (with_pages or cache_enabled)
+        if render_pages:
+            render_func = cls._render_vector_item
+            render_items = [(content, label, mask_pattern) for content, label in items]
+        else:
+            render_func = cls._render_item
+            render_items = [(content, label, output_format, mask_pattern) for content, label in items]
+
+        loop = asyncio.get_running_loop()
+        results: List[Optional[bytes]] = [None] * len(items)
+        pages: List[Optional[VectorPage]] = [None] * len(items)
+        if cache_enabled:
+            keys = [render_cache.make_key(content, label, output_format, mask_pattern) for content, label in items]
+            results = await loop.run_in_executor(None, render_cache.get_many, keys)
+
+        # 只渲染未命中缓存的项
+        missing = [i for i, data in enumerate(results) if data is None]
+        if cache_enabled:
+            RENDER_CACHE.labels("hit").inc(len(items) - len(missing))
+            RENDER_CACHE.labels("miss").inc(len(missing))
+        if missing:
+            rendered = await RenderEngine.map(render_func, [render_items[i] for i in missing])
+            for i, result in zip(missing, rendered):
+                if render_pages:
+                    results[i], pages[i] = result
+                else:
+                    results[i] = result
+            if cache_enabled:
+                entries = {keys[i]: results[i] for i in missing}
+                if render_pages:
+                    entries.update({cls._page_key(items[i][0], mask_pattern): pack_page(pages[i]) for i in missing})
+                await loop.run_in_executor(None, render_cache.put_many, entries)
+
+        if not with_pages:
+            return results, None
+        hits = [i for i, page in enumerate(pages) if page is None]
+        if hits and cache_enabled:
+            page_data = await loop.run_in_executor(
+                None,
+                render_cache.get_many,
+                [cls._page_key(items[i][0], mask_pattern) for i in hits]
+            )
+            for i, data in zip(hits, page_data):
+                if data is not None:
+                    pages[i] = unpack_page(data)
+            hits = [i for i in hits if pages[i] is None]
+        if hits:
+            # 缓存中只有SVG数据（如启用矢量页面缓存前写入的项），单独计算矢量页面
+            hit_pages = await RenderEngine.map(cls._vector_page_item, [(items[i][0], mask_pattern) for i in hits])
+            for i, page in zip(hits, hit_pages):
+                pages[i] = page
+            if cache_enabled:
+                await loop.run_in_executor(
+                    None,
+                    render_cache.put_many,
+                    {cls._page_key(items[i][0], mask_pattern): pack_page(pages[i]) for i in hits}
+                )
+        return results, pages
+
+    @staticmethod
+    def _page_key(content: str, mask_pattern: Optional[int] = None) -> str:
+        """
+        计算矢量页面的缓存键（矢量页面与标签无关）
+
+        Args:
+            content: 二维码内容
+            mask_pattern: 指定的掩码
+
+        Returns:
+            str: 缓存键
+        """
+        return render_cache.make_key(content, None, "vector", mask_pattern)
+
+    @classmethod
+    async def generate_single(
+        cls,
+        content: str,
+        output_format: str = "png",
+        inline: bool = True
+    ) -> Tuple[Path, Optional[str]]:
         """
         生成单个二维码
 
         Args:
             content: 二维码内容
+            output_format: 输出格式
+            inline: 是否返回base64编码的图片数据
 
         Returns:
-            Tuple[Path, str]: (文件路径, base64编码的图片数据)
+            Tuple[Path, Optional[str]]: (文件路径, base64编码的图片数据)
         """
-        qr_image = cls._generate_qr_image(content)
-        file_path = cls._save_image(qr_image)
-        base64_image = cls._image_to_base64(qr_image)
-        return file_path, base64_image
+        image_data = (await cls._render_cached([(content, None)], output_format))[0][0]
+        # 编码后的数据同时用于写文件和base64，文件写入在线程池中进行
+        stored = await asyncio.get_running_loop().run_in_executor(
+            None,
+            cls._store_images,
+            [(image_data, None)],
+            output_format,
+            inline
+        )
+        return stored[0]
 
     @classmethod
-    async def generate_multiple(cls, contents: List[str]) -> List[Tuple[Path, str]]:
+    async def generate_multiple(
+        cls,
+        contents: List[str],
+        output_format: str = "png",
+        inline: bool = True
+    ) -> List[Tuple[Path, Optional[str]]]:
         """
         生成多个二维码
 
         Args:
             contents: 二维码内容列表
+            output_format: 输出格式
+            inline: 是否返回base64编码的图片数据
 
         Returns:
-            List[Tuple[Path, str]]: [(文件路径, base64编码的图片数据), ...]
+            List[Tuple[Path, Optional[str]]]: [(文件路径, base64编码的图片数据), ...]
         """
         results = []
         for content in contents:
-            file_path, base64_image = await cls.generate_single(content)
+            file_path, base64_image = await cls.generate_single(content, output_format, inline)
             results.append((file_path, base64_image))
         return results
 
     @classmethod
-    async def generate_batch(cls, items: List[Tuple[str, Optional[str], str]]) -> List[Tuple[Path, str, str, str]]:
+    async def _generate_chunk(
+        cls,
+        chunk: List[Tuple[str, Optional[str], str]],
+        output_format: str = "png",
+        mask_pattern: Optional[int] = None,
+        inline: bool = True,
+        with_pages: bool = False
+    ) -> Tuple[List[Tuple[Path, Optional[str], str, str]], Optional[List[VectorPage]]]:
         """
-        批量生成带标签的二维码
+        生成一个分块的二维码图片并保存
 
         Args:
-            items: 内容、标签和原始文本的元组列表 [(content, label, original_text), ...]
+            chunk: 内容、标签和原始文本的元组列表 [(content, label, original_text), ...]
+            output_format: 输出格式
+            mask_pattern: 指定掩码（0-7），默认选择罚分最低的掩码
+            inline: 是否生成base64编码的数据
+            with_pages: 是否同时返回矢量页面（svg 格式导出PDF时）
 
         Returns:
-            List[Tuple[Path, str, str, str]]: [(文件路径, base64编码的数据, 文件类型, 原始文本), ...]
+            Tuple[List[Tuple[Path, Optional[str], str, str]], Optional[List[VectorPage]]]:
+                ([(文件路径, base64编码的数据, 文件类型, 原始文本), ...], 矢量页面列表)，
+                图片文件尚未登记到过期索引，由调用方写入导出文件后登记
         """
-        results = []
-        qr_images = []  # 存储生成的图片对象，用于后续生成PDF
+        # 命中缓存的项不再渲染，结果与输入顺序一致
+        rendered, pages = await cls._render_cached(
+            [(content, label) for content, label, _ in chunk],
+            output_format,
+            mask_pattern,
+            with_pages
+        )
+        stored = await asyncio.get_running_loop().run_in_executor(
+            None,
+            cls._store_images,
+            [(image_data, label) for image_data, (_, label, _) in zip(rendered, chunk)],
+            output_format,
+            inline,
+            False
+        )
+        return [
+            (file_path, base64_image, "image", original_text)
+            for (file_path, base64_image), (_, _, original_text) in zip(stored, chunk)
+        ], pages
 
-        # 1. 生成所有二维码图片
-        for content, label, original_text in items:
-            qr_image = cls._generate_qr_image(content)
-            if label:
-                qr_image = cls._add_label(qr_image, label)
-            file_path = cls._save_image(qr_image, label)
-            base64_image = cls._image_to_base64(qr_image)
-            results.append((file_path, base64_image, "image", original_text))
-            qr_images.append(qr_image)
-
-        # 2. 生成PDF并添加到结果列表
-        if qr_images:  # 只在有图片时生成PDF
-            pdf_data = await cls._generate_pdf(qr_images)
-            pdf_path = await cls._save_pdf(pdf_data)
-            pdf_base64 = base64.b64encode(pdf_data).decode()
-            results.append((
-                pdf_path,
-                f"data:application/pdf;base64,{pdf_base64}",
-                "pdf",
-                "PDF文档"  # PDF的内容描述
-            ))
+    @classmethod
+    def _dispatch_chunk(
+        cls,
+        chunk: List[Tuple[str, Optional[str], str]],
+        seen: "OrderedDict[Tuple[str, Optional[str]], asyncio.Future]",
+        output_format: str = "png",
+        mask_pattern: Optional[int] = None,
+        inline: bool = True,
+        with_pages: bool = False,
+        evicted: Optional[List[asyncio.Future]] = None
+    ) -> asyncio.Future:
+        """
+        提交一个分块的生成任务，批次内重复的 (内容, 标签) 只生成一次
 
-        return results
+        seen 记录批次中已提交的 (内容, 标签) 及其 (文件路径, base64编码的数据) 结果，
+        重复项（包括仍在生成中的其他分块里的项）直接复用该结果，共用同一文件；
+        记录按最近使用淘汰，最多保留 BATCH_DEDUP_MAX_ENTRIES 条
+
+        Args:
+            chunk: 内容、标签和原始文本的元组列表 [(content, label, original_text), ...]
+            seen: 批次内的去重记录
+            output_format: 输出格式
+            mask_pattern: 指定掩码（0-7），默认选择罚分最低的掩码
+            inline: 是否生成base64编码的数据
+            with_pages: 是否同时返回矢量页面（svg 格式导出PDF时）
+            evicted: 收集被淘汰的去重记录，其文件之后不再被复用
+
+        Returns:
+            asyncio.Future: 结果为 ([(文件路径, base64编码的数据, 文件类型, 原始文本), ...], 矢量页面列表)，
+                只有每个二维码首次出现的位置带有矢量页面，重复项为 None
+        """
+        loop = asyncio.get_running_loop()
+        owned: List[Tuple[Tuple[str, Optional[str], str], asyncio.Future]] = []
+        sources: List[asyncio.Future] = []
+        for item in chunk:
+            key = (item[0], item[1])
+            source = seen.get(key)
+            if source is None:
+                source = loop.create_future()
+                owned.append((item, source))
+                if settings.BATCH_DEDUP_MAX_ENTRIES > 0:
+                    seen[key] = source
+                    if len(seen) > settings.BATCH_DEDUP_MAX_ENTRIES:
+                        _, dropped = seen.popitem(last=False)
+                        if evicted is not None:
+                            evicted.append(dropped)
+            else:
+                seen.move_to_end(key)
+            sources.append(source)
+        if len(owned) < len(chunk):
+            BATCH_DUPLICATES.inc(len(chunk) - len(owned))
+
+        async def run() -> Tuple[List[Tuple[Path, Optional[str], str, str]], List[Optional[VectorPage]]]:
+            owned_pages: Dict[int, VectorPage] = {}
+            if owned:
+                try:
+                    results, pages = await cls._generate_chunk(
+                        [item for item, _ in owned],
+                        output_format,
+                        mask_pattern,
+                        inline,
+                        with_pages
+                    )
+                except BaseException:
+                    # 等待这些结果的其他分块随之失败
+                    for _, source in owned:
+                        source.cancel()
+                    raise
+                for (_, source), (file_path, base64_image, _, _) in zip(owned, results):
+                    source.set_result((file_path, base64_image))
+                if pages is not None:
+                    owned_pages = {id(source): page for (_, source), page in zip(owned, pages)}
+            stored = [await source for source in sources]
+            return [
+                (file_path, base64_image, "image", original_text)
+                for (file_path, base64_image), (_, _, original_text) in zip(stored, chunk)
+            ], [owned_pages.pop(id(source), None) for source in sources]
+
+        return asyncio.ensure_future(run())
+
+    @classmethod
+    async def iter_batch(
+        cls,
+        items: Iterable[Tuple[str, Optional[str], str]],
+        output_format: str = "png",
+        mask_pattern: Optional[int] = None,
+        inline: bool = True,
+        exports: Sequence[str] = ("pdf",)
+    ) -> AsyncIterator[Tuple[Path, Optional[str], str, str]]:
+        """
+        批量生成带标签的二维码，按输入顺序逐个产出结果，最后产出导出文件
+
+        同时处理的分块数量受渲染进程数限制，内存占用与批量大小无关；
+        items 可以是逐行读取文件的迭代器，分块在线程池中按需读取；
+        PDF和ZIP随生成进度逐块写入文件，不在内存中保留完整内容。
+        编码器按版本缓存功能图形、按数据段结构缓存版本选择，
+        等长编号类批次中每项只需放置数据码字和计算掩码；指定 mask_pattern 时跳过掩码评估。
+        批次内重复的 (内容, 标签) 只渲染和保存一次，重复项产出同一文件，PDF中的重复页面不再重新写入图片
+
+        Args:
+            items: 内容、标签和原始文本的元组列表或迭代器 [(content, label, original_text), ...]
+            output_format: 输出格式，svg 格式的PDF以矢量方式生成
+            mask_pattern: 整个批次使用的掩码（0-7），默认逐项选择罚分最低的掩码
+            inline: 是否产出base64编码的数据，为 False 时只产出文件路径（数据为 None）
+            exports: 导出格式列表（pdf / zip），在所有图片之后按 pdf、zip 的顺序产出
+
+        Yields:
+            Tuple[Path, Optional[str], str, str]: (文件路径, base64编码的数据, 文件类型, 原始文本)
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        window = RenderEngine.get_worker_count() * 2
+        pending: Deque[Tuple[List[Tuple[str, Optional[str], str]], asyncio.Future, List[asyncio.Future]]] = deque()
+        seen: "OrderedDict[Tuple[str, Optional[str]], asyncio.Future]" = OrderedDict()
+        exports = [export for export in cls.EXPORT_FORMATS if export in exports]
+        export_paths = {export: cls._new_export_path(export) for export in exports}
+        # 导出文件先写入临时文件，全部写完后再重命名
+        temp_paths = {export: FileService.temp_path(path) for export, path in export_paths.items()}
+        pdf_file = None
+        pdf_writer = None
+        zip_file = None
+        finished = False
+        emitted = 0
+        total = len(items) if isinstance(items, Sized) else None
+        chunks = RenderEngine.iter_chunks(items, settings.RENDER_CHUNK_SIZE)
+        # svg 格式的矢量PDF直接使用渲染时得到的矩形
+        with_pages = output_format == "svg" and "pdf" in export_paths
+
+        def stored_path(source: asyncio.Future) -> Optional[Path]:
+            # 去重记录对应的已保存文件，未生成完成时为 None
+            if source.done() and not source.cancelled() and source.exception() is None:
+                return source.result()[0]
+            return None
+
+        def is_reusable(content: str, label: Optional[str], path: Path) -> bool:
+            source = seen.get((content, label))
+            return source is not None and stored_path(source) == path
+
+        async def emit(
+            chunk: List[Tuple[str, Optional[str], str]],
+            chunk_results: List[Tuple[Path, Optional[str], str, str]],
+            pages: List[Optional[VectorPage]],
+            evicted: List[asyncio.Future]
+        ) -> None:
+            # 随生成进度逐页写入PDF、逐个写入ZIP，内存中只保留当前分块
+            nonlocal pdf_file, pdf_writer, zip_file, emitted
+            images = [(result[0], label) for result, (_, label, _) in zip(chunk_results, chunk)]
+            if "pdf" in export_paths:
+                pdf_images = [
+                    (result[0], content, label, page)
+                    for result, (content, label, _), page in zip(chunk_results, chunk, pages)
+                ]
+                if pdf_writer is None:
+                    pdf_file = await loop.run_in_executor(None, open, temp_paths["pdf"], 'wb')
+                    # 与批次内去重记录的容量一致，超出后的重复页面重新写入图片
+                    pdf_writer = PDFStreamWriter(pdf_file, settings.BATCH_DEDUP_MAX_ENTRIES)
+                await loop.run_in_executor(
+                    None, cls._append_pdf_pages, pdf_writer, pdf_images, output_format, mask_pattern
+                )
+            if "zip" in export_paths:
+                if zip_file is None:
+                    zip_file = await loop.run_in_executor(None, cls._open_zip, temp_paths["zip"])
+                await loop.run_in_executor(None, cls._append_zip_entries, zip_file, images, emitted, total)
+            # 图片写入导出文件后才登记到过期索引，登记前不会被清理或因超出磁盘配额被删除；
+            # 仍在去重记录中的文件之后的分块可能再次读取，淘汰出记录或批次结束时再登记
+            paths = [
+                result[0] for result, (content, label, _) in zip(chunk_results, chunk)
+                if not is_reusable(content, label, result[0])
+            ]
+            paths.extend(stored_path(source) for source in evicted if stored_path(source) is not None)
+            await loop.run_in_executor(None, FileService.register_files, list(dict.fromkeys(paths)))
+            emitted += len(images)
+
+        try:
+            # 1. 分块生成二维码图片，按顺序产出已完成的分块
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                # 分块提交时被淘汰的去重记录，在该分块写入导出文件后登记（其首次出现的分块已先写入）
+                evicted: List[asyncio.Future] = []
+                pending.append((
+                    chunk,
+                    cls._dispatch_chunk(chunk, seen, output_format, mask_pattern, inline, with_pages, evicted),
+                    evicted
+                ))
+                if len(pending) < window:
+                    continue
+                done_chunk, future, evicted = pending.popleft()
+                chunk_results, pages = await future
+                await emit(done_chunk, chunk_results, pages, evicted)
+                for result in chunk_results:
+                    yield result
+            while pending:
+                done_chunk, future, evicted = pending.popleft()
+                chunk_results, pages = await future
+                await emit(done_chunk, chunk_results, pages, evicted)
+                for result in chunk_results:
+                    yield result
+
+            # 2. 结束PDF和ZIP
+            if pdf_writer is not None:
+                await loop.run_in_executor(None, pdf_writer.close)
+                await loop.run_in_executor(None, pdf_file.close)
+            if zip_file is not None:
+                await loop.run_in_executor(None, zip_file.close)
+            await loop.run_in_executor(
+                None,
+                FileService.register_files,
+                [path for path in map(stored_path, seen.values()) if path is not None]
+            )
+            if emitted:
+                for export, export_path in export_paths.items():
+                    await loop.run_in_executor(None, os.replace, temp_paths[export], export_path)
+                    OUTPUT_BYTES.labels(export).inc((await loop.run_in_executor(None, export_path.stat)).st_size)
+                await loop.run_in_executor(None, FileService.register_files, list(export_paths.values()))
+            finished = True
+            BATCH_ITEMS.labels(output_format).observe(emitted)
+            logger.info("批量生成完成，数量: %d，耗时: %.2f秒", emitted, time.perf_counter() - started)
+        finally:
+            # 客户端断开或出错时取消尚未完成的分块，并删除未写完的导出文件
+            for _, future, _ in pending:
+                future.cancel()
+            if pdf_file is not None:
+                pdf_file.close()
+            if zip_file is not None:
+                zip_file.close()
+            if not finished:
+                for temp_path in temp_paths.values():
+                    temp_path.unlink(missing_ok=True)
+
+        if not emitted:  # 只在有图片时输出导出文件
+            return
+        for export, export_path in export_paths.items():
+            media_type, description = cls.EXPORT_FORMATS[export]
+            export_base64 = None
+            if inline:
+                export_data = await loop.run_in_executor(None, export_path.read_bytes)
+                export_base64 = f"data:{media_type};base64,{base64.b64encode(export_data).decode()}"
+            yield (
+                export_path,
+                export_base64,
+                export,
+                description
+            )
+
+    @classmethod
+    async def generate_batch(
+        cls,
+        items: Iterable[Tuple[str, Optional[str], str]],
+        output_format: str = "png",
+        mask_pattern: Optional[int] = None,
+        inline: bool = True,
+        exports: Sequence[str] = ("pdf",)
+    ) -> List[Tuple[Path, Optional[str], str, str]]:
+        """
+        批量生成带标签的二维码
+
+        Args:
+            items: 内容、标签和原始文本的元组列表或迭代器 [(content, label, original_text), ...]
+            output_format: 输出格式
+            mask_pattern: 整个批次使用的掩码（0-7），默认逐项选择罚分最低的掩码
+            inline: 是否返回base64编码的数据
+            exports: 导出格式列表（pdf / zip）
+
+        Returns:
+            List[Tuple[Path, Optional[str], str, str]]: [(文件路径, base64编码的数据, 文件类型, 原始文本), ...]
+        """
+        return [
+            result
+            async for result in cls.iter_batch(items, output_format, mask_pattern, inline, exports)
+        ]
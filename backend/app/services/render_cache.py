@@ -0,0 +1,402 @@
+"""
+渲染缓存
+
+以内容哈希为键缓存渲染后的二维码图片数据：
+- 一级缓存：进程内 LRU，按字节数限制容量
+- 二级缓存：磁盘存储，重启后仍然有效；索引和总大小保存在 SQLite 中，
+  多个服务进程共用同一个磁盘容量
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DiskCacheIndex:
+    """
+    磁盘渲染缓存索引
+
+    记录每个缓存文件的大小和最近使用时间，并通过触发器维护文件总大小，
+    多个进程共用同一个数据库时按同一个容量淘汰。所有方法均为同步调用
+    """
+
+    # 每次查询的待淘汰记录数
+    EVICT_BATCH_SIZE = 256
+
+    def __init__(self, db_path: Path) -> None:
+        """
+        打开数据库并创建索引表
+
+        Args:
+            db_path: 数据库文件路径
+        """
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.created = not db_path.exists()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, size INTEGER NOT NULL, used_at REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS idx_entries_used ON entries (used_at);
+                CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL);
+                INSERT OR IGNORE INTO usage (id, total) VALUES (0, 0);
+                CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+                    UPDATE usage SET total = total + NEW.size WHERE id = 0; END;
+                CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+                    UPDATE usage SET total = total + NEW.size - OLD.size WHERE id = 0; END;
+                CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+                    UPDATE usage SET total = total - OLD.size WHERE id = 0; END;
+            """)
+
+    def close(self) -> None:
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
+
+    def record(self, entries: Iterable[Tuple[str, int, float]]) -> None:
+        """
+        登记磁盘上已有的缓存文件，已登记的文件不变
+
+        Args:
+            entries: (缓存键, 文件大小, 最近使用时间戳) 的列表
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO entries (key, size, used_at) VALUES (?, ?, ?)", entries
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def touch(self, keys: Iterable[str]) -> None:
+        """
+        更新缓存项的最近使用时间
+
+        Args:
+            keys: 缓存键列表
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "UPDATE entries SET used_at = ? WHERE key = ?", ((now, key) for key in keys)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def add(self, disk_dir: Path, entries: Iterable[Tuple[str, Path, int]], limit: int) -> List[str]:
+        """
+        登记写好的缓存文件，并按最近使用时间淘汰超出容量的文件
+
+        临时文件的重命名和淘汰文件的删除都在写事务中进行，
+        其他进程看到的索引与磁盘上的文件保持一致
+
+        Args:
+            disk_dir: 磁盘缓存目录
+            entries: (缓存键, 已写好的临时文件路径, 文件大小) 的列表
+            limit: 磁盘缓存容量（字节）
+
+        Returns:
+            List[str]: 被淘汰的缓存键
+        """
+        now = time.time()
+        evicted: List[str] = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, tmp_path, size in entries:
+                    os.replace(tmp_path, disk_dir / f"{key}.bin")
+                    self._conn.execute(
+                        "INSERT INTO entries (key, size, used_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET size = excluded.size, used_at = excluded.used_at",
+                        (key, size, now)
+                    )
+                total = self._conn.execute("SELECT total FROM usage WHERE id = 0").fetchone()[0]
+                while total > limit:
+                    oldest = self._conn.execute(
+                        "SELECT key, size FROM entries ORDER BY used_at LIMIT ?", (self.EVICT_BATCH_SIZE,)
+                    ).fetchall()
+                    if not oldest:
+                        break
+                    for key, size in oldest:
+                        if total <= limit:
+                            break
+                        self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                        try:
+                            os.remove(disk_dir / f"{key}.bin")
+                        except OSError:
+                            pass
+                        evicted.append(key)
+                        total -= size
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return evicted
+
+    def remove(self, key: str) -> None:
+        """
+        删除缓存项的记录（文件已不存在时调用）
+
+        Args:
+            key: 缓存键
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def usage(self) -> Tuple[int, int]:
+        """
+        获取缓存项数量和总大小
+
+        Returns:
+            Tuple[int, int]: (缓存项数量, 总字节数)
+        """
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            total = self._conn.execute("SELECT total FROM usage WHERE id = 0").fetchone()[0]
+        return count, total
+
+
+
+class RenderCache:
+    """两级渲染缓存"""
+
+    def __init__(self, memory_bytes: int, disk_dir: Path, disk_bytes: int) -> None:
+        """
+        初始化缓存
+
+        Args:
+            memory_bytes: 内存缓存容量（字节）
+            disk_dir: 磁盘缓存目录
+            disk_bytes: 磁盘缓存容量（字节）
+        """
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk: Optional[DiskCacheIndex] = None  # 首次使用时打开的磁盘索引
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    @staticmethod
+    def make_key(
+        content: str,
+        label: Optional[str],
+        output_format: str = "png",
+        mask_pattern: Optional[int] = None
+    ) -> str:
+        """
+        计算缓存键
+
+        Args:
+            content: 二维码内容
+            label: 标签文本
+            output_format: 输出格式（vector 表示用于矢量PDF的矢量页面）
+            mask_pattern: 指定的掩码
+
+        Returns:
+            str: 缓存键（sha256 十六进制）
+        """
+        parts = [
+            content,
+            label or "",
+            str(settings.QR_SIZE),
+            str(settings.QR_BORDER),
+            str(settings.LABEL_HEIGHT),
+            output_format,
+        ]
+        if output_format == "png":
+            parts.append(f"png{settings.PNG_LABEL_BITS}z{settings.PNG_COMPRESS_LEVEL}")
+            if label:
+                # PNG的标签文字由服务端字体绘制，更换字体后不能再使用旧图片
+                parts.append("font:" + "|".join(settings.LABEL_FONT_PATHS))
+        if mask_pattern is not None:
+            parts.append(f"mask{mask_pattern}")
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        """获取缓存键对应的磁盘文件路径"""
+        return self.disk_dir / f"{key}.bin"
+
+    def _disk_index(self) -> DiskCacheIndex:
+        """
+        获取磁盘索引，首次调用时打开数据库
+
+        新建数据库时缓存目录中已有的文件（如升级前的缓存）按修改时间登记一次
+        """
+        if self._disk is None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            index = DiskCacheIndex(self.disk_dir / "index.db")
+            if index.created:
+                entries = []
+                for entry in os.scandir(self.disk_dir):
+                    if entry.is_file() and entry.name.endswith(".bin"):
+                        stat = entry.stat()
+                        entries.append((entry.name[:-4], stat.st_size, stat.st_mtime))
+                index.record(entries)
+                logger.info("已登记磁盘渲染缓存: %d 项", len(entries))
+            self._disk = index
+        return self._disk
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        """写入内存缓存并按容量淘汰"""
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self._stats["memory_evictions"] += 1
+
+    def _put_disk(self, entries: Dict[str, bytes]) -> None:
+        """写入磁盘缓存并按共用的容量淘汰"""
+        index = self._disk_index()
+        # 先写临时文件，登记时再重命名，避免其他进程读到不完整的数据
+        written = []
+        for key, data in entries.items():
+            tmp_path = self._disk_path(key).with_suffix(f".{os.getpid()}.tmp")
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+            except OSError as e:
+                logger.error("写入磁盘渲染缓存失败 %s: %s", tmp_path, str(e))
+                tmp_path.unlink(missing_ok=True)
+                continue
+            written.append((key, tmp_path, len(data)))
+        if not written:
+            return
+
+        try:
+            evicted = index.add(self.disk_dir, written, self.disk_bytes)
+        except (OSError, sqlite3.Error) as e:
+            logger.error("登记磁盘渲染缓存失败: %s", str(e))
+            for _, tmp_path, _ in written:
+                tmp_path.unlink(missing_ok=True)
+            return
+        self._stats["disk_evictions"] += len(evicted)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[bytes]: 命中时返回图片数据，否则返回 None
+        """
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """
+        批量读取缓存，结果与 keys 顺序一致
+
+        命中的项在同一个事务中更新磁盘索引的最近使用时间
+
+        Args:
+            keys: 缓存键列表
+
+        Returns:
+            List[Optional[bytes]]: 命中时为图片数据，否则为 None
+        """
+        results: List[Optional[bytes]] = []
+        with self._lock:
+            index = self._disk_index()
+            for key in keys:
+                data = self._memory.get(key)
+                if data is not None:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                else:
+                    try:
+                        data = self._disk_path(key).read_bytes()
+                    except FileNotFoundError:
+                        self._stats["misses"] += 1
+                    except OSError as e:
+                        logger.error("读取磁盘渲染缓存失败 %s: %s", key, str(e))
+                        index.remove(key)
+                        self._stats["misses"] += 1
+                    else:
+                        self._put_memory(key, data)
+                        self._stats["disk_hits"] += 1
+                results.append(data)
+
+            hits = [key for key, data in zip(keys, results) if data is not None]
+            if hits:
+                try:
+                    index.touch(hits)
+                except sqlite3.Error as e:
+                    logger.error("更新磁盘渲染缓存索引失败: %s", str(e))
+        return results
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            data: 图片数据
+        """
+        self.put_many({key: data})
+
+    def put_many(self, entries: Dict[str, bytes]) -> None:
+        """
+        批量写入缓存，磁盘索引在同一个事务中登记
+
+        Args:
+            entries: 缓存键 -> 图片数据
+        """
+        with self._lock:
+            for key, data in entries.items():
+                self._put_memory(key, data)
+            self._put_disk(entries)
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存统计信息"""
+        with self._lock:
+            disk_items, disk_bytes = self._disk_index().usage()
+            return {
+                **self._stats,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_items": disk_items,
+                "disk_bytes": disk_bytes,
+            }
+
+
+# 创建缓存实例
+render_cache = RenderCache(
+    memory_bytes=settings.RENDER_CACHE_MEMORY_BYTES,
+    disk_dir=settings.RENDER_CACHE_DIR,
+    disk_bytes=settings.RENDER_CACHE_DISK_BYTES,
+)
@@ -0,0 +1,168 @@
+"""
+渲染引擎
+
+基于进程池的批量渲染：
+- 将任务切分为多个分块，交由工作进程并行处理
+- 按输入顺序合并各分块的结果
+- 小批量任务在当前进程的线程池中处理，不阻塞事件循环
+"""
+import asyncio
+import itertools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.metrics import mark_dead_processes
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _render_chunk(func: Callable[..., Any], chunk: List[Tuple[Any, ...]]) -> List[Any]:
+    """
+    在工作进程中依次处理一个分块
+
+    Args:
+        func: 处理单个任务的函数（必须可被 pickle）
+        chunk: 任务参数元组列表
+
+    Returns:
+        List[Any]: 与 chunk 顺序一致的结果列表
+    """
+    return [func(*args) for args in chunk]
+
+
+class RenderEngine:
+    """进程池渲染引擎"""
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    # 线程池中的小批量渲染共用字体等对象，依次执行
+    _inline_lock = threading.Lock()
+
+    @staticmethod
+    def get_worker_count() -> int:
+        """获取渲染进程数，未配置时由所有服务进程平分 CPU 核心"""
+        return settings.RENDER_WORKERS or max(1, (os.cpu_count() or 1) // max(settings.APP_WORKERS, 1))
+
+    @classmethod
+    def _get_executor(cls) -> ProcessPoolExecutor:
+        """获取进程池，首次使用时创建"""
+        if cls._executor is None:
+            workers = cls.get_worker_count()
+            cls._executor = ProcessPoolExecutor(max_workers=workers)
+            logger.info("渲染进程池已启动，进程数: %d", workers)
+        return cls._executor
+
+    @staticmethod
+    def _close_executor(executor: ProcessPoolExecutor) -> None:
+        """等待进程池的进程退出，并归档这些进程的监控指标文件"""
+        executor.shutdown(wait=True, cancel_futures=True)
+        mark_dead_processes()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """关闭进程池"""
+        if cls._executor is not None:
+            cls._close_executor(cls._executor)
+            cls._executor = None
+            logger.info("渲染进程池已关闭")
+
+    @staticmethod
+    def split_chunks(items: Sequence[Tuple[Any, ...]], chunk_size: int) -> List[List[Tuple[Any, ...]]]:
+        """
+        将任务切分为固定大小的分块
+
+        Args:
+            items: 任务参数元组列表
+            chunk_size: 分块大小
+
+        Returns:
+            List[List[Tuple[Any, ...]]]: 分块列表
+        """
+        chunk_size = max(chunk_size, 1)
+        return [list(items[i:i + chunk_size]) for i in range(0, len(items), chunk_size)]
+
+    @staticmethod
+    def iter_chunks(items: Iterable[Tuple[Any, ...]], chunk_size: int) -> Iterator[List[Tuple[Any, ...]]]:
+        """
+        按固定大小逐块读取任务，适用于长度未知的任务流
+
+        Args:
+            items: 任务参数元组的可迭代对象
+            chunk_size: 分块大小
+
+        Yields:
+            List[Tuple[Any, ...]]: 分块
+        """
+        iterator = iter(items)
+        chunk_size = max(chunk_size, 1)
+        while True:
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    @classmethod
+    def call_inline(cls, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        在当前进程中执行使用共享字体等对象的函数，与线程池中的小批量渲染依次执行
+
+        Args:
+            func: 要执行的函数（不得再次调用 call_inline）
+            *args: 函数参数
+
+        Returns:
+            Any: 函数的返回值
+        """
+        with cls._inline_lock:
+            return func(*args)
+
+    @classmethod
+    def _render_inline(cls, func: Callable[..., Any], chunk: List[Tuple[Any, ...]]) -> List[Any]:
+        """在线程池中处理一个小批量分块"""
+        return cls.call_inline(_render_chunk, func, chunk)
+
+    @classmethod
+    async def map(cls, func: Callable[..., Any], items: Sequence[Tuple[Any, ...]]) -> List[Any]:
+        """
+        并行处理任务并按输入顺序返回结果
+
+        Args:
+            func: 处理单个任务的函数（模块级函数或静态方法）
+            items: 任务参数元组列表
+
+        Returns:
+            List[Any]: 与 items 顺序一致的结果列表
+        """
+        if not items:
+            return []
+
+        loop = asyncio.get_running_loop()
+        # 小批量任务在当前进程的线程池中处理，避免进程间通信开销，同时不阻塞事件循环
+        if len(items) <= settings.RENDER_INLINE_THRESHOLD:
+            return await loop.run_in_executor(None, cls._render_inline, func, list(items))
+
+        executor = cls._get_executor()
+        chunks = cls.split_chunks(items, settings.RENDER_CHUNK_SIZE)
+        futures = [
+            loop.run_in_executor(executor, _render_chunk, func, chunk)
+            for chunk in chunks
+        ]
+
+        try:
+            chunk_results = await asyncio.gather(*futures)
+        except BrokenProcessPool:
+            # 工作进程异常退出，丢弃当前进程池，下次使用时重建
+            if cls._executor is executor:
+                logger.error("渲染进程池异常，已重置")
+                cls._executor = None
+                loop.run_in_executor(None, cls._close_executor, executor)
+            raise
+
+        results = []
+        for chunk_result in chunk_results:
+            results.extend(chunk_result)
+        return results
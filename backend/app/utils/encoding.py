@@ -0,0 +1,45 @@
+"""
+文本编码检测模块
+
+根据文件开头的有限字节判断CSV文件编码，只检查一次：
+- 有BOM时按BOM确定编码
+- 前缀是合法的UTF-8时使用UTF-8
+- 否则使用GB18030（兼容GBK和GB2312，Excel导出的中文CSV多为此类编码）
+
+前缀之后才出现非UTF-8内容的文件由调用方在解码失败时按 FALLBACK_ENCODING 重新解析
+"""
+import codecs
+
+# BOM -> 编码名称，较长的BOM在前
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+FALLBACK_ENCODING = "gb18030"
+
+
+def detect_encoding(prefix: bytes) -> str:
+    """
+    检测文本编码
+
+    Args:
+        prefix: 文件开头的字节（可在多字节字符中间截断）
+
+    Returns:
+        str: 可用于 open() / pandas 的编码名称
+    """
+    for bom, encoding in BOM_ENCODINGS:
+        if prefix.startswith(bom):
+            return encoding
+
+    # 增量解码，末尾被截断的多字节字符不视为错误
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        decoder.decode(prefix, final=False)
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+    return "utf-8"
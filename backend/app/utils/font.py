@@ -0,0 +1,38 @@
+"""
+字体管理模块
+
+按配置的字体路径列表解析标签字体，每个字号只加载一次
+"""
+from functools import lru_cache
+from PIL import ImageFont
+
+from app.core.config import settings
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@lru_cache()
+def get_label_font(size: int) -> ImageFont.ImageFont:
+    """
+    获取标签字体
+
+    依次尝试 LABEL_FONT_PATHS 中的字体，全部失败时使用默认字体
+
+    Args:
+        size: 字号
+
+    Returns:
+        ImageFont.ImageFont: 字体对象
+    """
+    for font_path in settings.LABEL_FONT_PATHS:
+        try:
+            font = ImageFont.truetype(font_path, size)
+            logger.info("已加载标签字体: %s (字号 %d)", font_path, size)
+            return font
+        except OSError:
+            continue
+
+    # 如果找不到中文字体，使用默认字体
+    logger.warning("未找到可用的标签字体, 使用默认字体。已尝试: %s", ", ".join(settings.LABEL_FONT_PATHS))
+    return ImageFont.load_default()
@@ -0,0 +1,82 @@
+"""
+主进程选举模块
+
+多个服务进程通过本地文件锁选出一个主进程，定时任务等只需执行一次的工作只在主进程中进行。
+锁由操作系统在进程退出（包括异常退出）时释放，其他进程下次尝试时即可接替
+"""
+import os
+from pathlib import Path
+from typing import Optional, TextIO
+
+from app.core.config import settings
+from app.utils.logger import get_logger
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+logger = get_logger(__name__)
+
+
+class LeaderLock:
+    """基于文件锁的主进程选举"""
+
+    def __init__(self, path: Path) -> None:
+        """
+        初始化
+
+        Args:
+            path: 锁文件路径，所有服务进程使用同一路径
+        """
+        self.path = path
+        self._file: Optional[TextIO] = None
+
+    def try_acquire(self) -> bool:
+        """
+        尝试成为主进程，不阻塞
+
+        Returns:
+            bool: 当前进程是否持有锁（已持有时直接返回 True）
+        """
+        if self._file is not None:
+            return True
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file = open(self.path, "a+", encoding="utf-8")
+        try:
+            if os.name == "nt":
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+
+        # 记录主进程号，便于排查
+        file.seek(0)
+        file.truncate()
+        file.write(str(os.getpid()))
+        file.flush()
+        self._file = file
+        logger.info("当前进程成为主进程: %d", os.getpid())
+        return True
+
+    def release(self) -> None:
+        """释放锁"""
+        if self._file is None:
+            return
+        try:
+            if os.name == "nt":
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+# 创建选举锁实例
+leader = LeaderLock(settings.LEADER_LOCK_PATH)
@@ -0,0 +1,313 @@
+"""
+流式PDF写入模块
+
+逐页写入图片或矢量二维码，写完一页即输出到目标文件，内存中只保留当前页和对象偏移表。
+相同内容的页面可按键复用已写入的内容流和图片对象，只新增一个页面对象；
+可复用的页面按最近使用保留，数量有上限
+"""
+import struct
+import zlib
+from collections import OrderedDict
+from io import BytesIO
+from typing import BinaryIO, Hashable, List, Optional, Tuple
+
+from PIL import Image
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG颜色类型 -> (PDF颜色空间, 每像素分量数)
+PNG_COLOR_SPACES = {
+    0: ("/DeviceGray", 1),
+    2: ("/DeviceRGB", 3),
+    3: (None, 1),  # 调色板图片，颜色空间由 PLTE 决定
+}
+
+
+class PDFStreamWriter:
+    """流式PDF写入器"""
+
+    # 对象1为文档目录，对象2为页面树，在关闭时写入
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, file: BinaryIO, max_shared_pages: int = 0) -> None:
+        """
+        初始化写入器
+
+        Args:
+            file: 以二进制写模式打开的目标文件
+            max_shared_pages: 保留的可复用页面数，0 表示不复用（忽略页面键）
+        """
+        self._file = file
+        self._offsets: List[int] = [0, 0, 0]  # 下标即对象编号，0号对象不使用
+        self._page_ids: List[int] = []
+        # 页面键 -> (宽, 高, 资源字典, 内容流对象编号)，用于重复页面
+        self._shared_pages: "OrderedDict[Hashable, Tuple[int, int, bytes, int]]" = OrderedDict()
+        self._max_shared_pages = max_shared_pages
+        self._position = 0
+        self._closed = False
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data: bytes) -> None:
+        """写入数据并记录当前位置"""
+        self._file.write(data)
+        self._position += len(data)
+
+    def _reserve_id(self) -> int:
+        """分配一个新的对象编号"""
+        self._offsets.append(0)
+        return len(self._offsets) - 1
+
+    def _write_object(self, obj_id: int, body: bytes, stream: Optional[bytes] = None) -> None:
+        """
+        写入一个间接对象
+
+        Args:
+            obj_id: 对象编号
+            body: 对象字典内容
+            stream: 流数据（可选）
+        """
+        self._offsets[obj_id] = self._position
+        self._write(b"%d 0 obj\n" % obj_id)
+        if stream is None:
+            self._write(body + b"\nendobj\n")
+        else:
+            self._write(body[:-2] + b" /Length %d >>\nstream\n" % len(stream))
+            self._write(stream)
+            self._write(b"\nendstream\nendobj\n")
+
+    def _write_page(
+        self,
+        width: int,
+        height: int,
+        content: bytes,
+        images: List[Tuple[bytes, bytes]],
+        key: Optional[Hashable] = None
+    ) -> None:
+        """
+        写入一页
+
+        Args:
+            width: 页面宽度
+            height: 页面高度
+            content: 页面内容流，图片依次命名为 /Im0、/Im1 ...
+            images: 图片对象列表 [(对象字典（以 >> 结尾）, 流数据), ...]
+            key: 页面键，指定后可通过 repeat_page 重复该页
+        """
+        image_refs = []
+        for index, (image_dict, image_data) in enumerate(images):
+            image_id = self._reserve_id()
+            self._write_object(image_id, image_dict, image_data)
+            image_refs.append(b"/Im%d %d 0 R" % (index, image_id))
+
+        content_id = self._reserve_id()
+        self._write_object(content_id, b"<< >>", content)
+
+        resources = b"<< /XObject << %s >> >>" % b" ".join(image_refs)
+        self._write_page_object(width, height, resources, content_id)
+        if key is not None and self._max_shared_pages > 0:
+            self._shared_pages[key] = (width, height, resources, content_id)
+            if len(self._shared_pages) > self._max_shared_pages:
+                self._shared_pages.popitem(last=False)
+
+    def _write_page_object(self, width: int, height: int, resources: bytes, content_id: int) -> None:
+        """写入页面对象并加入页面树"""
+        page_id = self._reserve_id()
+        self._write_object(
+            page_id,
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>"
+            % (self.PAGES_ID, width, height, resources, content_id)
+        )
+        self._page_ids.append(page_id)
+
+    def repeat_page(self, key: Hashable) -> bool:
+        """
+        重复之前以 key 写入的页面，新页面引用相同的内容流和图片对象
+
+        Args:
+            key: 页面键
+
+        Returns:
+            bool: 是否已写入，未找到该键时返回 False
+        """
+        shared = self._shared_pages.get(key)
+        if shared is None:
+            return False
+        self._shared_pages.move_to_end(key)
+        self._write_page_object(*shared)
+        return True
+
+    @staticmethod
+    def _image_object(image: Image.Image) -> Tuple[bytes, bytes]:
+        """
+        将PIL图片转换为图片对象
+
+        Args:
+            image: PIL图片对象
+
+        Returns:
+            Tuple[bytes, bytes]: (对象字典, 流数据)
+        """
+        if image.mode == "1":
+            color_space, bits = b"/DeviceGray", 1
+        elif image.mode == "L":
+            color_space, bits = b"/DeviceGray", 8
+        else:
+            image = image.convert("RGB")
+            color_space, bits = b"/DeviceRGB", 8
+
+        width, height = image.size
+        image_dict = (
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace %s /BitsPerComponent %d /Filter /FlateDecode >>"
+            % (width, height, color_space, bits)
+        )
+        return image_dict, zlib.compress(image.tobytes())
+
+    @staticmethod
+    def _image_content(width: int, height: int) -> bytes:
+        """铺满整页绘制 /Im0 的内容流，页面尺寸与图片像素尺寸一致（72 DPI）"""
+        return b"q %d 0 0 %d 0 0 cm /Im0 Do Q" % (width, height)
+
+    def add_image(self, image: Image.Image, key: Optional[Hashable] = None) -> None:
+        """
+        添加一页图片
+
+        Args:
+            image: PIL图片对象
+            key: 页面键，指定后可通过 repeat_page 重复该页
+        """
+        width, height = image.size
+        self._write_page(width, height, self._image_content(width, height), [self._image_object(image)], key)
+
+    def add_vector(
+        self,
+        size: int,
+        scale: float,
+        rects: List[Tuple[int, int, int, int]],
+        label_image: Optional[Image.Image] = None,
+        key: Optional[Hashable] = None
+    ) -> None:
+        """
+        添加一页矢量二维码
+
+        二维码模块以填充矩形绘制，标签（如有）以图片绘制在二维码下方
+
+        Args:
+            size: 二维码边长
+            scale: 每个模块的尺寸
+            rects: 深色模块矩形列表 [(x, y, 宽, 高), ...]，单位为模块
+            label_image: 标签区域图片（可选）
+            key: 页面键，指定后可通过 repeat_page 重复该页
+        """
+        label_height = label_image.height if label_image is not None else 0
+        height = size + label_height
+
+        # 翻转y轴，使矩形坐标与模块矩阵的行列一致
+        content = [
+            b"1 g 0 0 %d %d re f" % (size, height),
+            b"q %s 0 0 -%s 0 %d cm 0 g" % (b"%g" % scale, b"%g" % scale, height),
+        ]
+        content.extend(b"%d %d %d %d re" % rect for rect in rects)
+        content.append(b"f Q")
+
+        images = []
+        if label_image is not None:
+            content.append(b"q %d 0 0 %d 0 0 cm /Im0 Do Q" % (label_image.width, label_height))
+            images.append(self._image_object(label_image))
+
+        self._write_page(size, height, b"\n".join(content), images, key)
+
+    def add_png(self, png_data: bytes, key: Optional[Hashable] = None) -> None:
+        """
+        添加一页PNG图片
+
+        非隔行、无透明通道的PNG直接复用其压缩数据（PDF的FlateDecode支持PNG预测器），
+        无需解码和重新压缩；其他PNG解码后按 add_image 写入
+
+        Args:
+            png_data: PNG图片数据
+            key: 页面键，指定后可通过 repeat_page 重复该页
+        """
+        parsed = self._parse_png(png_data)
+        if parsed is None:
+            with Image.open(BytesIO(png_data)) as image:
+                self.add_image(image, key)
+            return
+
+        width, height, bit_depth, color_type, palette, idat = parsed
+        color_space, colors = PNG_COLOR_SPACES[color_type]
+        if color_type == 3:
+            color_space = "[/Indexed /DeviceRGB %d <%s>]" % (len(palette) // 3 - 1, palette.hex())
+
+        image_dict = (
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace %s /BitsPerComponent %d /Filter /FlateDecode "
+            b"/DecodeParms << /Predictor 15 /Colors %d /BitsPerComponent %d /Columns %d >> >>"
+            % (width, height, color_space.encode(), bit_depth, colors, bit_depth, width)
+        )
+        self._write_page(width, height, self._image_content(width, height), [(image_dict, idat)], key)
+
+    @staticmethod
+    def _parse_png(png_data: bytes) -> Optional[tuple]:
+        """
+        解析PNG数据块
+
+        Args:
+            png_data: PNG图片数据
+
+        Returns:
+            Optional[tuple]: (宽, 高, 位深, 颜色类型, 调色板, IDAT数据)，不支持直接复用时返回 None
+        """
+        if not png_data.startswith(PNG_SIGNATURE):
+            return None
+
+        pos = len(PNG_SIGNATURE)
+        header = None
+        palette = b""
+        idat = []
+        while pos + 8 <= len(png_data):
+            length, chunk_type = struct.unpack(">I4s", png_data[pos:pos + 8])
+            chunk = png_data[pos + 8:pos + 8 + length]
+            pos += 12 + length
+            if chunk_type == b"IHDR":
+                header = struct.unpack(">IIBBBBB", chunk)
+            elif chunk_type == b"PLTE":
+                palette = chunk
+            elif chunk_type == b"tRNS":
+                return None  # 含透明信息
+            elif chunk_type == b"IDAT":
+                idat.append(chunk)
+            elif chunk_type == b"IEND":
+                break
+
+        if header is None or not idat:
+            return None
+        width, height, bit_depth, color_type, _, _, interlace = header
+        if color_type not in PNG_COLOR_SPACES or interlace or bit_depth == 16:
+            return None
+        if color_type == 3 and not palette:
+            return None
+        return width, height, bit_depth, color_type, palette, b"".join(idat)
+
+    def close(self) -> None:
+        """写入页面树、文档目录和交叉引用表，结束PDF"""
+        if self._closed:
+            return
+        self._closed = True
+
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self._page_ids)
+        self._write_object(
+            self.PAGES_ID,
+            b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._page_ids))
+        )
+        self._write_object(self.CATALOG_ID, b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES_ID)
+
+        xref_offset = self._position
+        lines = [b"xref\n0 %d\n" % len(self._offsets), b"0000000000 65535 f \n"]
+        lines.extend(b"%010d 00000 n \n" % offset for offset in self._offsets[1:])
+        self._write(b"".join(lines))
+        self._write(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(self._offsets), self.CATALOG_ID, xref_offset)
+        )
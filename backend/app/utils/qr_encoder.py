@@ -0,0 +1,397 @@
+"""
+二维码矩阵编码模块
+
+在 qrcode 库生成数据码字（含纠错码）的基础上，以数组运算完成：
+- 功能图形（定位、校正、定时、格式和版本信息区域）的布置，每个版本只计算一次
+- 版本按数据段结构缓存，等长的同类内容（如序列号批次）只需选择一次版本
+- 数据码字的放置与8种掩码的同时计算
+- 4条罚分规则的评估与最佳掩码选择
+
+对相同的版本、纠错等级和掩码，生成的矩阵与 qrcode 库逐位一致
+"""
+from bisect import bisect_left
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+from qrcode import constants, exceptions, util
+
+# 罚分规则3的两种 1:1:3:1:1 图形（含两侧4个浅色模块）
+FINDER_LIKE_PATTERNS = (
+    np.array([1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0], dtype=bool),
+    np.array([0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1], dtype=bool),
+)
+
+
+class QRTemplate:
+    """单个版本的功能图形模板"""
+
+    def __init__(self, version: int) -> None:
+        """
+        构建模板
+
+        Args:
+            version: 二维码版本（1-40）
+        """
+        self.version = version
+        self.size = size = version * 4 + 17
+
+        # base: 功能图形取值（格式、版本信息区域为浅色，与计算掩码罚分时一致）
+        # reserved: 功能图形占用的位置
+        self.base = np.zeros((size, size), dtype=bool)
+        self.reserved = np.zeros((size, size), dtype=bool)
+
+        for row, col in ((0, 0), (size - 7, 0), (0, size - 7)):
+            self._place_finder(row, col)
+        self._place_alignment()
+        self._place_timing()
+        self.format_coords = self._format_coords()
+        self.reserved[self.format_coords[0]] = True
+        self.reserved[self.format_coords[1]] = True
+        self.reserved[size - 8, 8] = True  # 固定深色模块
+        self.version_coords = None
+        if version >= 7:
+            self.version_coords = self._version_coords()
+            self.reserved[self.version_coords[0]] = True
+            self.reserved[self.version_coords[1]] = True
+
+        self.data_rows, self.data_cols = self._data_coords()
+
+        # 各掩码在数据位置上的翻转位，形状 (8, 数据位置数)
+        rows, cols = self.data_rows, self.data_cols
+        self.masks = np.stack([self._mask(pattern, rows, cols) for pattern in range(8)])
+
+    def _place_finder(self, row: int, col: int) -> None:
+        """放置定位图形及其分隔符"""
+        finder = np.zeros((9, 9), dtype=bool)
+        finder[1:8, 1:8] = True
+        finder[2:7, 2:7] = False
+        finder[3:6, 3:6] = True
+
+        top, left = max(row - 1, 0), max(col - 1, 0)
+        bottom, right = min(row + 8, self.size), min(col + 8, self.size)
+        self.base[top:bottom, left:right] = finder[top - row + 1:bottom - row + 1, left - col + 1:right - col + 1]
+        self.reserved[top:bottom, left:right] = True
+
+    def _place_alignment(self) -> None:
+        """放置校正图形（中心已被占用的位置跳过）"""
+        pattern = np.ones((5, 5), dtype=bool)
+        pattern[1:4, 1:4] = False
+        pattern[2, 2] = True
+
+        positions = util.pattern_position(self.version)
+        for row in positions:
+            for col in positions:
+                if self.reserved[row, col]:
+                    continue
+                self.base[row - 2:row + 3, col - 2:col + 3] = pattern
+                self.reserved[row - 2:row + 3, col - 2:col + 3] = True
+
+    def _place_timing(self) -> None:
+        """放置定时图形"""
+        index = np.arange(8, self.size - 8)
+        for rows, cols in ((index, np.full_like(index, 6)), (np.full_like(index, 6), index)):
+            free = ~self.reserved[rows, cols]
+            self.base[rows[free], cols[free]] = index[free] % 2 == 0
+            self.reserved[rows[free], cols[free]] = True
+
+    def _format_coords(self) -> Tuple[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+        """格式信息第 0-14 位的纵向、横向坐标"""
+        size = self.size
+        vertical = [(i if i < 6 else i + 1 if i < 8 else size - 15 + i, 8) for i in range(15)]
+        horizontal = [(8, size - i - 1 if i < 8 else 15 - i if i < 9 else 15 - i - 1) for i in range(15)]
+        return (
+            (np.array([r for r, _ in vertical]), np.array([c for _, c in vertical])),
+            (np.array([r for r, _ in horizontal]), np.array([c for _, c in horizontal])),
+        )
+
+    def _version_coords(self) -> Tuple[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+        """版本信息第 0-17 位的两组坐标"""
+        index = np.arange(18)
+        offset = self.size - 11
+        return (index // 3, index % 3 + offset), (index % 3 + offset, index // 3)
+
+    def _data_coords(self) -> Tuple[np.ndarray, np.ndarray]:
+        """按之字形顺序列出所有数据位置"""
+        rows: List[int] = []
+        cols: List[int] = []
+        upward = True
+        col = self.size - 1
+        while col > 0:
+            if col == 6:
+                col -= 1
+            row_order = range(self.size - 1, -1, -1) if upward else range(self.size)
+            for row in row_order:
+                for c in (col, col - 1):
+                    if not self.reserved[row, c]:
+                        rows.append(row)
+                        cols.append(c)
+            upward = not upward
+            col -= 2
+        return np.array(rows), np.array(cols)
+
+    @staticmethod
+    def _mask(pattern: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """计算掩码图形在给定位置是否翻转"""
+        if pattern == 0:
+            return (i + j) % 2 == 0
+        if pattern == 1:
+            return i % 2 == 0
+        if pattern == 2:
+            return j % 3 == 0
+        if pattern == 3:
+            return (i + j) % 3 == 0
+        if pattern == 4:
+            return (i // 2 + j // 3) % 2 == 0
+        if pattern == 5:
+            return (i * j) % 2 + (i * j) % 3 == 0
+        if pattern == 6:
+            return ((i * j) % 2 + (i * j) % 3) % 2 == 0
+        return ((i * j) % 3 + (i + j) % 2) % 2 == 0
+
+    def place(self, data: List[int], patterns: Optional[List[int]] = None) -> np.ndarray:
+        """
+        放置数据码字并应用掩码
+
+        Args:
+            data: 数据码字（含纠错码）
+            patterns: 要计算的掩码列表，默认全部8种
+
+        Returns:
+            np.ndarray: 形状为 (掩码数, size, size) 的矩阵（格式、版本信息区域为浅色）
+        """
+        if patterns is None:
+            patterns = list(range(8))
+        count = len(self.data_rows)
+        bits = np.unpackbits(np.asarray(data, dtype=np.uint8))[:count]
+        if len(bits) < count:
+            bits = np.concatenate([bits, np.zeros(count - len(bits), dtype=np.uint8)])
+
+        matrices = np.repeat(self.base[None], len(patterns), axis=0)
+        matrices[:, self.data_rows, self.data_cols] = bits.astype(bool) ^ self.masks[patterns]
+        return matrices
+
+    def apply_type_info(self, matrix: np.ndarray, error_correction: int, mask_pattern: int) -> np.ndarray:
+        """
+        写入格式信息、版本信息和固定深色模块
+
+        Args:
+            matrix: 单个矩阵（会被原地修改）
+            error_correction: 纠错等级
+            mask_pattern: 掩码编号
+
+        Returns:
+            np.ndarray: 写入后的矩阵
+        """
+        bits = util.BCH_type_info((error_correction << 3) | mask_pattern)
+        format_bits = (bits >> np.arange(15)) & 1 == 1
+        matrix[self.format_coords[0]] = format_bits
+        matrix[self.format_coords[1]] = format_bits
+        matrix[self.size - 8, 8] = True
+
+        if self.version_coords is not None:
+            bits = util.BCH_type_number(self.version)
+            version_bits = (bits >> np.arange(18)) & 1 == 1
+            matrix[self.version_coords[0]] = version_bits
+            matrix[self.version_coords[1]] = version_bits
+        return matrix
+
+
+@lru_cache(maxsize=None)
+def get_template(version: int) -> QRTemplate:
+    """获取版本模板（每个版本只构建一次）"""
+    return QRTemplate(version)
+
+
+def _run_penalty(lines: np.ndarray) -> np.ndarray:
+    """
+    罚分规则1：同色连续模块 L >= 5 时罚 L - 2 分
+
+    Args:
+        lines: 形状为 (矩阵数, 行数, 长度) 的数组
+
+    Returns:
+        np.ndarray: 每个矩阵的罚分
+    """
+    count, rows, length = lines.shape
+    starts = np.ones(lines.shape, dtype=bool)
+    starts[:, :, 1:] = lines[:, :, 1:] != lines[:, :, :-1]
+    start_index = np.flatnonzero(starts)
+    run_lengths = np.diff(np.append(start_index, lines.size))
+    long_runs = run_lengths >= 5
+    return np.bincount(
+        start_index[long_runs] // (rows * length),
+        weights=run_lengths[long_runs] - 2,
+        minlength=count
+    ).astype(np.int64)
+
+
+def _finder_like_penalty(lines: np.ndarray) -> np.ndarray:
+    """
+    罚分规则3：出现 1:1:3:1:1 图形（一侧带4个浅色模块）时每处罚40分
+
+    Args:
+        lines: 形状为 (矩阵数, 行数, 长度) 的数组
+
+    Returns:
+        np.ndarray: 每个矩阵的罚分
+    """
+    width = lines.shape[2] - 10
+    total = np.zeros(lines.shape[0], dtype=np.int64)
+    if width <= 0:
+        return total
+    for pattern in FINDER_LIKE_PATTERNS:
+        match = np.ones((lines.shape[0], lines.shape[1], width), dtype=bool)
+        for offset, dark in enumerate(pattern):
+            window = lines[:, :, offset:offset + width]
+            match &= window if dark else ~window
+        total += match.sum(axis=(1, 2)) * 40
+    return total
+
+
+def lost_points(matrices: np.ndarray) -> np.ndarray:
+    """
+    计算矩阵的罚分（与 qrcode.util.lost_point 一致）
+
+    Args:
+        matrices: 形状为 (矩阵数, size, size) 的数组
+
+    Returns:
+        np.ndarray: 每个矩阵的罚分
+    """
+    size = matrices.shape[1]
+    columns = matrices.transpose(0, 2, 1)
+
+    # 规则1：行、列中的同色连续模块
+    points = _run_penalty(matrices) + _run_penalty(columns)
+
+    # 规则2：2x2同色块，每块罚3分
+    top_left = matrices[:, :-1, :-1]
+    blocks = (
+        (top_left == matrices[:, 1:, :-1])
+        & (top_left == matrices[:, :-1, 1:])
+        & (top_left == matrices[:, 1:, 1:])
+    )
+    points += blocks.sum(axis=(1, 2)) * 3
+
+    # 规则3：行、列中的类定位图形
+    points += _finder_like_penalty(matrices) + _finder_like_penalty(columns)
+
+    # 规则4：深色模块比例偏离50%，每5%罚10分
+    for index, dark_count in enumerate(matrices.sum(axis=(1, 2)).tolist()):
+        percent = float(dark_count) / (size ** 2)
+        points[index] += int(abs(percent * 100 - 50) / 5) * 10
+
+    return points
+
+
+def _data_bits(mode: int, length: int) -> int:
+    """计算一个数据段编码后的位数（与 util.QRData.write 一致）"""
+    if mode == util.MODE_NUMBER:
+        return length // 3 * 10 + (util.NUMBER_LENGTH[length % 3] if length % 3 else 0)
+    if mode == util.MODE_ALPHA_NUM:
+        return length // 2 * 11 + length % 2 * 6
+    return length * 8
+
+
+@lru_cache(maxsize=4096)
+def resolve_version(signature: Tuple[Tuple[int, int], ...], error_correction: int, start: int = 1) -> int:
+    """
+    按数据段结构选择最小版本（与 QRCode.best_fit 一致）
+
+    同一批次中结构相同的内容（如等长的编号）只需计算一次
+
+    Args:
+        signature: 数据段的 (模式, 长度) 元组
+        error_correction: 纠错等级
+        start: 起始版本
+
+    Returns:
+        int: 版本
+
+    Raises:
+        DataOverflowError: 内容超出最大容量时抛出
+    """
+    mode_sizes = util.mode_sizes_for_version(start)
+    needed_bits = sum(4 + mode_sizes[mode] + _data_bits(mode, length) for mode, length in signature)
+    version = bisect_left(util.BIT_LIMIT_TABLE[error_correction], needed_bits, start)
+    if version == 41:
+        raise exceptions.DataOverflowError()
+
+    # 版本跨越长度字段位数的分界时，按新版本重新计算
+    if mode_sizes is not util.mode_sizes_for_version(version):
+        return resolve_version(signature, error_correction, version)
+    return version
+
+
+def encode_data(
+    content: str,
+    error_correction: int = constants.ERROR_CORRECT_M,
+    version: Optional[int] = None
+) -> Tuple[int, List[int]]:
+    """
+    生成数据码字（由 qrcode 库完成分段和纠错编码）
+
+    Args:
+        content: 二维码内容
+        error_correction: 纠错等级
+        version: 指定版本，默认自动选择最小版本
+
+    Returns:
+        Tuple[int, List[int]]: (版本, 数据码字)
+    """
+    data_list = list(util.optimal_data_chunks(content, minimum=20))
+    if version is None:
+        version = resolve_version(tuple((data.mode, len(data)) for data in data_list), error_correction)
+    return version, util.create_data(version, error_correction, data_list)
+
+
+def build_matrix(
+    version: int,
+    data: List[int],
+    error_correction: int = constants.ERROR_CORRECT_M,
+    mask_pattern: Optional[int] = None
+) -> np.ndarray:
+    """
+    由数据码字生成模块矩阵（不含边框）
+
+    Args:
+        version: 二维码版本
+        data: 数据码字（含纠错码）
+        error_correction: 纠错等级
+        mask_pattern: 指定掩码，默认选择罚分最低的掩码
+
+    Returns:
+        np.ndarray: 模块矩阵，True 表示深色
+    """
+    template = get_template(version)
+    if mask_pattern is None:
+        candidates = template.place(data)
+        mask_pattern = int(np.argmin(lost_points(candidates)))
+        matrix = candidates[mask_pattern]
+    else:
+        matrix = template.place(data, [mask_pattern])[0]
+    return template.apply_type_info(matrix, error_correction, mask_pattern)
+
+
+def encode_matrix(
+    content: str,
+    error_correction: int = constants.ERROR_CORRECT_M,
+    mask_pattern: Optional[int] = None,
+    border: int = 4
+) -> np.ndarray:
+    """
+    生成二维码模块矩阵
+
+    Args:
+        content: 二维码内容
+        error_correction: 纠错等级
+        mask_pattern: 指定掩码，默认选择罚分最低的掩码
+        border: 边框宽度（模块数）
+
+    Returns:
+        np.ndarray: 含边框的模块矩阵，True 表示深色
+    """
+    version, data = encode_data(content, error_correction)
+    matrix = build_matrix(version, data, error_correction, mask_pattern)
+    return np.pad(matrix, border) if border else matrix
@@ -0,0 +1,32 @@
+"""
+二维码栅格化模块
+
+将模块矩阵直接按整数映射放大到目标尺寸，生成1位黑白图片，
+不经过逐模块绘制和缩放重采样，模块边界清晰
+"""
+from typing import Sequence
+
+import numpy as np
+from PIL import Image
+
+
+def rasterize_matrix(matrix: Sequence[Sequence[bool]], size: int) -> Image.Image:
+    """
+    将模块矩阵栅格化为指定尺寸的图片
+
+    第 i 个像素取第 i * n // size 个模块，每个模块占 size // n 或 size // n + 1 个像素，
+    按行、列各做一次 repeat 完成放大
+
+    Args:
+        matrix: 模块矩阵（True 表示深色，含边框）
+        size: 目标边长（像素）
+
+    Returns:
+        Image.Image: 1位（mode '1'）图片
+    """
+    modules = np.asarray(matrix, dtype=bool)
+    count = modules.shape[0]
+    repeats = np.bincount(np.arange(size) * count // size, minlength=count)
+    pixels = np.repeat(np.repeat(modules, repeats, axis=0), repeats, axis=1)
+    # mode '1' 中 True 为白色
+    return Image.fromarray(~pixels)
@@ -1,11 +1,17 @@
 """
 定时任务模块
 
-用于管理定时任务，如清理临时文件等
+用于管理定时任务，如清理临时文件等。
+每个服务进程都启动调度器，任务执行时先尝试选举，只有主进程实际执行
 """
+from functools import wraps
+from typing import Any, Callable, Coroutine
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from app.core.config import settings
 from app.services.file_service import FileService
+from app.utils.leader import leader
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -14,13 +20,32 @@ logger = get_logger(__name__)
 scheduler = AsyncIOScheduler()
 
 
+def leader_only(func: Callable[[], Coroutine[Any, Any, None]]) -> Callable[[], Coroutine[Any, Any, None]]:
+    """
+    包装定时任务，只在主进程中执行
+
+    每次执行前尝试获取选举锁，主进程退出后由下一个执行任务的进程接替
+
+    Args:
+        func: 定时任务
+
+    Returns:
+        Callable[[], Coroutine[Any, Any, None]]: 包装后的任务
+    """
+    @wraps(func)
+    async def wrapper() -> None:
+        if leader.try_acquire():
+            await func()
+    return wrapper
+
+
 def setup_scheduler() -> None:
     """设置并启动调度器"""
     try:
-        # 添加清理临时文件的任务，每小时执行一次
+        # 添加清理临时文件的任务，每 CLEANUP_INTERVAL 秒执行一次
         scheduler.add_job(
-            FileService.cleanup_expired_files,
-            trigger=IntervalTrigger(hours=1),
+            leader_only(FileService.cleanup_expired_files),
+            trigger=IntervalTrigger(seconds=settings.CLEANUP_INTERVAL),
             id='cleanup_temp_files',
             name='清理临时二维码文件',
             replace_existing=True
@@ -0,0 +1,142 @@
+"""
+矢量二维码模块
+
+将二维码模块矩阵转换为矢量图形：
+- 相邻的深色模块合并为矩形，减少路径数据量
+- 同一组矩形既用于输出SVG，也用于生成矢量PDF页
+"""
+import struct
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+# 矩形: (x, y, 宽, 高)，单位为模块
+Rect = Tuple[int, int, int, int]
+# 矢量页面: (每个模块的像素尺寸, 矩形列表)
+VectorPage = Tuple[float, List[Rect]]
+
+LABEL_FONT_FAMILY = "SimHei, 'Microsoft YaHei', 'WenQuanYi Zen Hei', 'PingFang SC', sans-serif"
+
+
+def merge_module_runs(matrix: Sequence[Sequence[bool]]) -> List[Rect]:
+    """
+    合并深色模块为矩形
+
+    先将每行连续的深色模块合并为横向线段，再将相邻行中位置和长度相同的线段合并为矩形
+
+    Args:
+        matrix: 二维码模块矩阵（True 表示深色）
+
+    Returns:
+        List[Rect]: 矩形列表
+    """
+    if hasattr(matrix, "tolist"):
+        matrix = matrix.tolist()  # numpy 数组逐元素访问较慢，先转换为列表
+    rects: List[Rect] = []
+    open_rects: Dict[Tuple[int, int], int] = {}  # (x, 宽) -> rects 中的下标
+
+    for y, row in enumerate(matrix):
+        row_runs = {}
+        x = 0
+        width = len(row)
+        while x < width:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < width and row[x]:
+                x += 1
+            run = (start, x - start)
+            index = open_rects.get(run)
+            if index is not None:
+                rx, ry, rw, rh = rects[index]
+                rects[index] = (rx, ry, rw, rh + 1)
+            else:
+                index = len(rects)
+                rects.append((start, y, x - start, 1))
+            row_runs[run] = index
+        open_rects = row_runs
+
+    return rects
+
+
+def vector_page(matrix: Sequence[Sequence[bool]], size: int) -> VectorPage:
+    """
+    计算矢量页面
+
+    Args:
+        matrix: 二维码模块矩阵（含边框）
+        size: 二维码边长（像素）
+
+    Returns:
+        VectorPage: (每个模块的像素尺寸, 矩形列表)
+    """
+    return size / len(matrix), merge_module_runs(matrix)
+
+
+def render_svg(
+    page: VectorPage,
+    size: int,
+    label: Optional[str] = None,
+    label_height: int = 0
+) -> bytes:
+    """
+    生成SVG二维码
+
+    Args:
+        page: vector_page 计算的矢量页面
+        size: 二维码边长（像素）
+        label: 标签文本
+        label_height: 标签区域高度（像素）
+
+    Returns:
+        bytes: SVG数据
+    """
+    height = size + (label_height if label else 0)
+    scale, rects = page
+    path = "".join(f"M{x} {y}h{w}v{h}h-{w}z" for x, y, w, h in rects)
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{height}" '
+        f'viewBox="0 0 {size} {height}">',
+        f'<rect width="{size}" height="{height}" fill="#fff"/>',
+        f'<path transform="scale({scale:g})" fill="#000" shape-rendering="crispEdges" d="{path}"/>',
+    ]
+    if label:
+        parts.append(
+            f'<text x="{size / 2:g}" y="{size + label_height / 2:g}" font-size="{label_height // 2}" '
+            f'text-anchor="middle" dominant-baseline="central" font-family="{escape(LABEL_FONT_FAMILY)}">'
+            f'{escape(label)}</text>'
+        )
+    parts.append('</svg>')
+    return "".join(parts).encode("utf-8")
+
+
+def pack_page(page: VectorPage) -> bytes:
+    """
+    将矢量页面序列化为字节（用于渲染缓存）
+
+    Args:
+        page: 矢量页面
+
+    Returns:
+        bytes: 模块尺寸（double）后接每个矩形的 x, y, 宽, 高（uint16）
+    """
+    scale, rects = page
+    return struct.pack("<d", scale) + array("H", [value for rect in rects for value in rect]).tobytes()
+
+
+def unpack_page(data: bytes) -> VectorPage:
+    """
+    从 pack_page 的结果还原矢量页面
+
+    Args:
+        data: 序列化的矢量页面
+
+    Returns:
+        VectorPage: (每个模块的像素尺寸, 矩形列表)
+    """
+    values = array("H")
+    values.frombytes(data[8:])
+    items = values.tolist()
+    return struct.unpack_from("<d", data)[0], list(zip(items[0::4], items[1::4], items[2::4], items[3::4]))
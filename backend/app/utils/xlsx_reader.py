@@ -0,0 +1,233 @@
+"""
+流式xlsx读取模块
+
+直接解析xlsx压缩包中的XML，逐行读取第一个工作表：
+- 只读取前几行时，共享字符串表只解析到用到的最大下标，耗时与文件总行数无关
+- 读取全部行时，先加载共享字符串表，再逐行解析工作表，已处理的XML元素随即释放
+"""
+import posixpath
+import zipfile
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Union
+from xml.etree.ElementTree import iterparse, parse
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+SHEET_DATA_TAG = f"{MAIN_NS}sheetData"
+ROW_TAG = f"{MAIN_NS}row"
+CELL_TAG = f"{MAIN_NS}c"
+VALUE_TAG = f"{MAIN_NS}v"
+TEXT_TAG = f"{MAIN_NS}t"
+INLINE_TAG = f"{MAIN_NS}is"
+RUN_TAG = f"{MAIN_NS}r"
+STRING_TABLE_TAG = f"{MAIN_NS}sst"
+STRING_ITEM_TAG = f"{MAIN_NS}si"
+
+
+class _SharedString(int):
+    """尚未解析的共享字符串下标"""
+
+
+class XLSXReader:
+    """流式xlsx读取器"""
+
+    def __init__(self, file: Union[str, BinaryIO]) -> None:
+        """
+        打开xlsx文件并读取工作簿结构
+
+        Args:
+            file: 文件路径或可随机访问的二进制文件对象
+        """
+        self._archive = zipfile.ZipFile(file)
+        names = set(self._archive.namelist())
+
+        workbook = parse(self._archive.open("xl/workbook.xml")).getroot()
+        relations = {}
+        if "xl/_rels/workbook.xml.rels" in names:
+            for relation in parse(self._archive.open("xl/_rels/workbook.xml.rels")).getroot():
+                target = relation.get("Target", "")
+                # Target 可能是相对 xl/ 的路径，也可能是以 / 开头的包内绝对路径
+                path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(f"xl/{target}")
+                relations[relation.get("Id")] = (relation.get("Type", ""), path)
+
+        sheet = workbook.find(f"{MAIN_NS}sheets/{MAIN_NS}sheet")
+        self._sheet_path = "xl/worksheets/sheet1.xml"
+        if sheet is not None and sheet.get(f"{REL_NS}id") in relations:
+            self._sheet_path = relations[sheet.get(f"{REL_NS}id")][1]
+
+        self._strings_path = next(
+            (path for rel_type, path in relations.values() if rel_type.endswith("/sharedStrings")),
+            "xl/sharedStrings.xml"
+        )
+        if self._strings_path not in names:
+            self._strings_path = None
+
+        properties = workbook.find(f"{MAIN_NS}workbookPr")
+        date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+        self._epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+        self._date_styles = self._read_date_styles() if "xl/styles.xml" in names else set()
+
+    def __enter__(self) -> "XLSXReader":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """关闭文件"""
+        self._archive.close()
+
+    def _read_date_styles(self) -> Set[int]:
+        """读取样式表，返回日期格式的单元格样式下标"""
+        styles = parse(self._archive.open("xl/styles.xml")).getroot()
+        formats: Dict[int, str] = dict(BUILTIN_FORMATS)
+        for num_fmt in styles.iterfind(f"{MAIN_NS}numFmts/{MAIN_NS}numFmt"):
+            formats[int(num_fmt.get("numFmtId"))] = num_fmt.get("formatCode", "")
+
+        date_styles = set()
+        for index, xf in enumerate(styles.iterfind(f"{MAIN_NS}cellXfs/{MAIN_NS}xf")):
+            fmt = formats.get(int(xf.get("numFmtId", 0)))
+            if fmt and is_date_format(fmt):
+                date_styles.add(index)
+        return date_styles
+
+    def _read_shared_strings(self, limit: Optional[int] = None) -> List[str]:
+        """
+        读取共享字符串表
+
+        Args:
+            limit: 只读取前 limit 个字符串，默认读取全部
+
+        Returns:
+            List[str]: 共享字符串列表
+        """
+        strings: List[str] = []
+        if self._strings_path is None or limit == 0:
+            return strings
+
+        with self._archive.open(self._strings_path) as source:
+            table = None
+            for event, element in iterparse(source, events=("start", "end")):
+                if event == "start":
+                    if element.tag == STRING_TABLE_TAG:
+                        table = element
+                    continue
+                if element.tag != STRING_ITEM_TAG:
+                    continue
+                # 富文本由多个 r 组成，忽略注音（rPh）中的文本
+                parts = [element.findtext(TEXT_TAG) or ""]
+                parts.extend(run.findtext(TEXT_TAG) or "" for run in element.iterfind(RUN_TAG))
+                strings.append("".join(parts))
+                if table is not None:
+                    table.clear()  # 释放已解析的元素
+                if limit is not None and len(strings) >= limit:
+                    break
+        return strings
+
+    def _cell_value(self, cell: Any) -> Any:
+        """
+        解析单元格的值
+
+        Args:
+            cell: 单元格XML元素
+
+        Returns:
+            Any: 单元格的值，共享字符串以 _SharedString 下标返回
+        """
+        data_type = cell.get("t", "n")
+        if data_type == "inlineStr":
+            inline = cell.find(INLINE_TAG)
+            if inline is None:
+                return None
+            return "".join(text.text or "" for text in inline.iter(TEXT_TAG))
+
+        value = cell.findtext(VALUE_TAG)
+        if value is None:
+            return None
+        if data_type == "s":
+            return _SharedString(value)
+        if data_type == "b":
+            return value == "1"
+        if data_type in ("str", "e"):
+            return value
+
+        if int(cell.get("s", 0)) in self._date_styles:
+            return from_excel(float(value), self._epoch)
+        if "." in value or "E" in value or "e" in value:
+            return float(value)
+        return int(value)
+
+    def _iter_raw_rows(self, max_rows: Optional[int] = None) -> Iterator[List[Any]]:
+        """
+        逐行解析工作表，缺失的行以空列表补齐
+
+        Args:
+            max_rows: 最多读取的行数，默认读取全部
+
+        Yields:
+            List[Any]: 行数据，共享字符串尚未解析
+        """
+        if max_rows == 0:
+            return
+        count = 0
+        with self._archive.open(self._sheet_path) as source:
+            sheet_data = None
+            for event, element in iterparse(source, events=("start", "end")):
+                if event == "start":
+                    if element.tag == SHEET_DATA_TAG:
+                        sheet_data = element
+                    continue
+                if element.tag != ROW_TAG:
+                    continue
+
+                row_number = int(element.get("r", count + 1))
+                while count < row_number - 1 and (max_rows is None or count < max_rows):
+                    count += 1
+                    yield []
+                if max_rows is not None and count >= max_rows:
+                    return
+
+                row: List[Any] = []
+                for cell in element.iterfind(CELL_TAG):
+                    reference = cell.get("r")
+                    if reference:
+                        column = column_index_from_string(reference.rstrip("0123456789")) - 1
+                        row.extend([None] * (column - len(row)))
+                    row.append(self._cell_value(cell))
+                if sheet_data is not None:
+                    sheet_data.clear()  # 释放已解析的行
+
+                count += 1
+                yield row
+                if max_rows is not None and count >= max_rows:
+                    return
+
+    def iter_rows(self, max_rows: Optional[int] = None) -> Iterator[List[Any]]:
+        """
+        逐行读取第一个工作表
+
+        Args:
+            max_rows: 最多读取的行数，默认读取全部；
+                指定时只解析用到的共享字符串，读取耗时与文件总行数无关
+
+        Yields:
+            List[Any]: 行数据（单元格值列表，空单元格为 None）
+        """
+        if max_rows is not None:
+            rows = list(self._iter_raw_rows(max_rows))
+            needed = [value for row in rows for value in row if isinstance(value, _SharedString)]
+            strings = self._read_shared_strings(max(needed) + 1 if needed else 0)
+        else:
+            rows = self._iter_raw_rows()
+            strings = self._read_shared_strings()
+
+        for row in rows:
+            yield [
+                (strings[value] if value < len(strings) else None)
+                if isinstance(value, _SharedString) else value
+                for value in row
+            ]
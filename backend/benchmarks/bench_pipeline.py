@@ -0,0 +1,389 @@
+"""
+二维码生成流程基准测试
+
+分别测量各阶段（编码+栅格化、添加标签、PNG编码、保存文件、base64编码、写入PDF）
+和端到端批量生成（generate_batch）的耗时，覆盖：
+- 批量大小 1 / 100 / 10000
+- 有标签 / 无标签
+- 短内容 / 接近最大容量的长内容
+
+输出吞吐量、延迟分位数和峰值内存（tracemalloc，只统计当前进程），
+结果可保存为JSON，并与保存的基准结果对比，吞吐量下降或P50延迟上升超过阈值时以非零状态退出。
+测试期间输出目录、过期索引、渲染缓存、监控指标、任务数据库和选举锁都指向临时目录，渲染缓存关闭。
+长内容单个编码约数十毫秒，包含10000的完整测试需要较长时间，日常对比可只测 1,100。
+
+用法（在 backend 目录下执行，也可以直接运行脚本）:
+    python -m benchmarks.bench_pipeline --output results.json
+    python benchmarks/bench_pipeline.py --sizes 1,100
+    python -m benchmarks.bench_pipeline --sizes 1,100 --baseline results.json --threshold 0.15
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# 直接运行脚本时模块搜索路径中只有 benchmarks 目录，加入 backend 目录以导入 app
+if not __package__:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# 所有运行时文件写入临时目录，不影响工作目录中的服务数据。
+# 配置在导入时读取环境变量并创建目录，监控指标的多进程目录也在导入时确定，因此需在导入 app 之前设置；
+# 渲染进程继承环境变量，使用同一临时目录
+if "QR_BENCH_DIR" not in os.environ:
+    os.environ["QR_BENCH_DIR"] = tempfile.mkdtemp(prefix="qr_bench_")
+WORK_DIR = Path(os.environ["QR_BENCH_DIR"])
+for name, relative in {
+    "OUTPUT_DIR": "outputs",
+    "ARTIFACT_DB_PATH": "artifacts.db",
+    "RENDER_CACHE_DIR": "cache",
+    "METRICS_DIR": "metrics",
+    "PROFILE_DIR": "profiles",
+    "JOB_DB_PATH": "jobs.db",
+    "LEADER_LOCK_PATH": "leader.lock",
+}.items():
+    os.environ[name] = str(WORK_DIR / relative)
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.environ["METRICS_DIR"]
+
+from app.core.config import settings  # noqa: E402
+from app.services.qrcode_service import QRCodeService  # noqa: E402
+from app.services.render_engine import RenderEngine  # noqa: E402
+from app.utils.pdf_writer import PDFStreamWriter  # noqa: E402
+
+STAGES = ["qr_image", "add_label", "encode_png", "save_image", "base64", "pdf", "generate_batch"]
+
+# 版本40、纠错等级M时字节模式最多2331字节
+NEAR_CAPACITY_LENGTH = 2300
+
+# 每种批量大小下端到端测试的重复次数，批量越小重复越多
+BATCH_REPEATS = {1: 20, 100: 5}
+
+
+def make_contents(kind: str, count: int) -> List[str]:
+    """
+    生成测试内容，同一批次内容等长且互不相同
+
+    Args:
+        kind: short 短编号 / long 接近最大容量的URL
+        count: 数量
+
+    Returns:
+        List[str]: 内容列表
+    """
+    if kind == "short":
+        return [f"ASSET-{i:06d}" for i in range(count)]
+    return [
+        f"https://example.com/{i:08d}/".ljust(NEAR_CAPACITY_LENGTH, "x")
+        for i in range(count)
+    ]
+
+
+def make_labels(labeled: bool, count: int) -> List[Optional[str]]:
+    """生成标签列表，无标签时全部为 None"""
+    return [f"库位-{i:06d}" if labeled else None for i in range(count)]
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """
+    计算分位数（最近秩法）
+
+    Args:
+        samples: 样本
+        fraction: 分位（0-1）
+
+    Returns:
+        float: 分位数
+    """
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def time_each(func: Callable[[Any], Any], inputs: Sequence[Any]) -> Tuple[List[Any], List[float]]:
+    """
+    逐项调用并记录每次耗时
+
+    Args:
+        func: 被测函数
+        inputs: 输入列表
+
+    Returns:
+        Tuple[List[Any], List[float]]: (输出列表, 每项耗时（秒）)
+    """
+    outputs = []
+    samples = []
+    for value in inputs:
+        start = time.perf_counter()
+        outputs.append(func(value))
+        samples.append(time.perf_counter() - start)
+    return outputs, samples
+
+
+def peak_memory(func: Callable[[], Any]) -> int:
+    """
+    测量调用期间的峰值内存
+
+    Args:
+        func: 被测函数
+
+    Returns:
+        int: 峰值内存（字节）
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(stage: str, case: Dict[str, Any], samples: List[float], items: int, peak: int) -> Dict[str, Any]:
+    """
+    汇总一个测试项的结果
+
+    Args:
+        stage: 阶段名称
+        case: 测试条件（size / labeled / content）
+        samples: 延迟样本（秒），阶段测试为每项耗时，端到端为每批耗时
+        items: 处理的二维码总数
+        peak: 峰值内存（字节）
+
+    Returns:
+        Dict[str, Any]: 结果记录
+    """
+    total = sum(samples)
+    return {
+        "stage": stage,
+        **case,
+        "items": items,
+        "total_s": round(total, 6),
+        "throughput": round(items / total, 2) if total else None,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 4),
+        "p90_ms": round(percentile(samples, 0.90) * 1000, 4),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 4),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def bench_stages(case: Dict[str, Any], contents: List[str], labels: List[Optional[str]]) -> List[Dict[str, Any]]:
+    """
+    逐阶段测量，每个阶段的输入为上一阶段的输出
+
+    Args:
+        case: 测试条件
+        contents: 内容列表
+        labels: 标签列表
+
+    Returns:
+        List[Dict[str, Any]]: 各阶段的结果记录
+    """
+    results = []
+    count = len(contents)
+    # 峰值内存与单项处理有关，只用前100项测量
+    sample = min(count, 100)
+
+    images, samples = time_each(QRCodeService._generate_qr_image, contents)
+    peak = peak_memory(lambda: [QRCodeService._generate_qr_image(c) for c in contents[:sample]])
+    results.append(summarize("qr_image", case, samples, count, peak))
+
+    if case["labeled"]:
+        pairs = list(zip(images, labels))
+        images, samples = time_each(lambda pair: QRCodeService._add_label(*pair), pairs)
+        peak = peak_memory(lambda: [QRCodeService._add_label(*pair) for pair in pairs[:sample]])
+        results.append(summarize("add_label", case, samples, count, peak))
+
+    encoded, samples = time_each(QRCodeService._encode_png, images)
+    peak = peak_memory(lambda: [QRCodeService._encode_png(image) for image in images[:sample]])
+    results.append(summarize("encode_png", case, samples, count, peak))
+
+    pairs = list(zip(encoded, labels))
+    paths, samples = time_each(lambda pair: QRCodeService._save_image(*pair), pairs)
+    peak = peak_memory(lambda: [QRCodeService._save_image(*pair) for pair in pairs[:sample]])
+    results.append(summarize("save_image", case, samples, count, peak))
+
+    _, samples = time_each(QRCodeService._image_to_base64, encoded)
+    peak = peak_memory(lambda: [QRCodeService._image_to_base64(data) for data in encoded[:sample]])
+    results.append(summarize("base64", case, samples, count, peak))
+
+    def write_pdf(entries: List[Tuple[Path, str, Optional[str], None]]) -> List[float]:
+        pdf_samples = []
+        with tempfile.TemporaryFile() as pdf_file:
+            writer = PDFStreamWriter(pdf_file)
+            for entry in entries:
+                start = time.perf_counter()
+                QRCodeService._append_pdf_pages(writer, [entry])
+                pdf_samples.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            writer.close()
+            pdf_samples[-1] += time.perf_counter() - start
+        return pdf_samples
+
+    entries = [(path, content, label, None) for path, content, label in zip(paths, contents, labels)]
+    samples = write_pdf(entries)
+    peak = peak_memory(lambda: write_pdf(entries))
+    results.append(summarize("pdf", case, samples, count, peak))
+    return results
+
+
+def bench_batch(case: Dict[str, Any], contents: List[str], labels: List[Optional[str]]) -> Dict[str, Any]:
+    """
+    测量端到端批量生成（渲染进程池 + 保存 + base64 + PDF）
+
+    Args:
+        case: 测试条件
+        contents: 内容列表
+        labels: 标签列表
+
+    Returns:
+        Dict[str, Any]: 结果记录，延迟样本为每批耗时
+    """
+    items = [(content, label, content) for content, label in zip(contents, labels)]
+
+    def run() -> None:
+        asyncio.run(QRCodeService.generate_batch(items, exports=("pdf",)))
+
+    repeats = BATCH_REPEATS.get(len(items), 1)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    peak = peak_memory(run)
+    return summarize("generate_batch", case, samples, len(items) * repeats, peak)
+
+
+def git_revision() -> Optional[str]:
+    """获取当前代码版本，不在git仓库中时返回 None"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float) -> int:
+    """
+    与基准结果对比并打印变化
+
+    Args:
+        results: 本次结果
+        baseline: 基准结果
+        threshold: 允许的退化比例
+
+    Returns:
+        int: 退化的测试项数量
+    """
+    def key(record: Dict[str, Any]) -> Tuple:
+        return record["stage"], record["size"], record["labeled"], record["content"]
+
+    previous = {key(record): record for record in baseline}
+    regressions = 0
+    print(f"\n{'阶段':<16}{'数量':>7}{'标签':>6}{'内容':>7}{'吞吐量变化':>12}{'P50变化':>10}")
+    for record in results:
+        old = previous.get(key(record))
+        if old is None or not old["throughput"] or not record["throughput"] or not old["p50_ms"]:
+            continue
+        throughput_change = record["throughput"] / old["throughput"] - 1
+        p50_change = record["p50_ms"] / old["p50_ms"] - 1
+        regressed = throughput_change < -threshold or p50_change > threshold
+        regressions += regressed
+        print(
+            f"{record['stage']:<16}{record['size']:>7}{'有' if record['labeled'] else '无':>6}"
+            f"{record['content']:>7}{throughput_change:>+12.1%}{p50_change:>+10.1%}"
+            f"{'  退化' if regressed else ''}"
+        )
+    return regressions
+
+
+def main() -> int:
+    """运行基准测试，返回退化的测试项数量"""
+    parser = argparse.ArgumentParser(description="二维码生成流程基准测试")
+    parser.add_argument("--sizes", default="1,100,10000", help="批量大小，逗号分隔")
+    parser.add_argument("--contents", default="short,long", help="内容类型 short / long，逗号分隔")
+    parser.add_argument("--stages", default=",".join(STAGES), help="要测量的阶段，逗号分隔")
+    parser.add_argument("--output", help="结果JSON文件路径")
+    parser.add_argument("--baseline", help="用于对比的基准结果JSON文件路径")
+    parser.add_argument("--threshold", type=float, default=0.15, help="允许的退化比例，默认15%%")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    kinds = args.contents.split(",")
+    stages = set(args.stages.split(","))
+
+    # 关闭磁盘配额和渲染缓存，避免重复运行时命中缓存
+    settings.OUTPUT_MAX_BYTES = 0
+    settings.RENDER_CACHE_ENABLED = False
+
+    results = []
+    try:
+        # 预热：加载字体、初始化编码器缓存并启动渲染进程池，不计入结果
+        for kind in kinds:
+            warmup_contents = make_contents(kind, 2)
+            bench_stages({"size": 2, "labeled": True, "content": kind}, warmup_contents, make_labels(True, 2))
+            if "generate_batch" in stages:
+                bench_batch({"size": 2, "labeled": True, "content": kind}, warmup_contents, make_labels(True, 2))
+
+        print(f"{'阶段':<16}{'数量':>7}{'标签':>6}{'内容':>7}{'吞吐量(/s)':>12}{'P50(ms)':>10}{'P90(ms)':>10}{'P99(ms)':>10}{'峰值(KB)':>10}")
+        for size in sizes:
+            for kind in kinds:
+                contents = make_contents(kind, size)
+                for labeled in (False, True):
+                    case = {"size": size, "labeled": labeled, "content": kind}
+                    labels = make_labels(labeled, size)
+                    records = []
+                    if stages - {"generate_batch"}:
+                        records.extend(
+                            record for record in bench_stages(case, contents, labels)
+                            if record["stage"] in stages
+                        )
+                    if "generate_batch" in stages:
+                        records.append(bench_batch(case, contents, labels))
+                    for record in records:
+                        print(
+                            f"{record['stage']:<16}{size:>7}{'有' if labeled else '无':>6}{kind:>7}"
+                            f"{record['throughput'] or 0:>12.1f}{record['p50_ms']:>10.3f}"
+                            f"{record['p90_ms']:>10.3f}{record['p99_ms']:>10.3f}{record['peak_kb']:>10.1f}"
+                        )
+                    results.extend(records)
+    finally:
+        RenderEngine.shutdown()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "render_workers": RenderEngine.get_worker_count(),
+            "qr_encoder": settings.QR_ENCODER,
+            "png_label_bits": settings.PNG_LABEL_BITS,
+            "png_compress_level": settings.PNG_COMPRESS_LEVEL,
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n结果已保存到 {args.output}")
+
+    regressions = 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline["results"], args.threshold)
+        print(f"\n与基准 {baseline['meta'].get('revision')} 对比, 退化 {regressions} 项（阈值 {args.threshold:.0%}）")
+    return regressions
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -0,0 +1,89 @@
+"""
+栅格化基准测试
+
+对比 qrcode.make + resize 与模块矩阵直接栅格化的单个二维码耗时。
+导入配置时创建的目录和监控指标文件都位于临时目录中，运行结束后删除
+
+用法（在 backend 目录下执行，也可以直接运行脚本）:
+    python -m benchmarks.bench_rasterizer --count 500
+    python benchmarks/bench_rasterizer.py --count 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import qrcode
+
+# 直接运行脚本时模块搜索路径中只有 benchmarks 目录，加入 backend 目录以导入 app
+if not __package__:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# 配置和监控指标在导入时创建目录，需在导入 app 之前指向临时目录
+WORK_DIR = tempfile.TemporaryDirectory(prefix="qr_bench_")
+for name, relative in {
+    "OUTPUT_DIR": "outputs",
+    "RENDER_CACHE_DIR": "cache",
+    "METRICS_DIR": "metrics",
+}.items():
+    os.environ[name] = os.path.join(WORK_DIR.name, relative)
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.environ["METRICS_DIR"]
+
+from app.core.config import settings  # noqa: E402
+from app.services.qrcode_service import QRCodeService  # noqa: E402
+from app.utils.raster import rasterize_matrix  # noqa: E402
+
+
+def legacy_image(content: str):
+    """原实现：逐模块绘制后缩放"""
+    qr_image = qrcode.make(content, box_size=settings.QR_BORDER)
+    return qr_image.resize((settings.QR_SIZE, settings.QR_SIZE))
+
+
+def measure(func, contents) -> float:
+    """返回每个二维码的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for content in contents:
+        func(content)
+    return (time.perf_counter() - start) / len(contents) * 1e6
+
+
+def main() -> None:
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(description="栅格化基准测试")
+    parser.add_argument("--count", type=int, default=500, help="每组测试的二维码数量")
+    args = parser.parse_args()
+
+    cases = {
+        "短内容": [f"ASSET-{i:06d}" for i in range(args.count)],
+        "长内容": [f"https://example.com/{'x' * 200}/{i}" for i in range(args.count)],
+    }
+    print(f"{'内容':<8}{'阶段':<10}{'原实现(us)':>12}{'新实现(us)':>12}{'加速比':>8}")
+    for name, contents in cases.items():
+        matrices = [QRCodeService._generate_qr_matrix(content) for content in contents]
+
+        # 仅栅格化阶段：同一矩阵上比较绘制+缩放与直接栅格化
+        def legacy_raster(index, _matrices=matrices):
+            qr = qrcode.QRCode(box_size=settings.QR_BORDER)
+            qr.modules = _matrices[index]
+            qr.modules_count = len(_matrices[index])
+            qr.border = 0
+            qr.data_cache = True
+            return qr.make_image().resize((settings.QR_SIZE, settings.QR_SIZE))
+
+        indices = list(range(len(contents)))
+        old = measure(legacy_raster, indices)
+        new = measure(lambda index: rasterize_matrix(matrices[index], settings.QR_SIZE), indices)
+        print(f"{name:<8}{'栅格化':<10}{old:>12.1f}{new:>12.1f}{old / new:>8.2f}")
+
+        # 端到端：编码 + 栅格化
+        old = measure(legacy_image, contents)
+        new = measure(QRCodeService._generate_qr_image, contents)
+        print(f"{name:<8}{'编码+栅格化':<10}{old:>12.1f}{new:>12.1f}{old / new:>8.2f}")
+
+
+if __name__ == "__main__":
+    with WORK_DIR:
+        main()
@@ -1,12 +1,16 @@
 """
-启动脚本
+开发环境启动脚本（单进程，代码修改后自动重启）
+
+生产环境使用 serve.py
 """
 import uvicorn
 
+from app.core.config import settings
+
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
+        host=settings.APP_HOST,
+        port=settings.APP_PORT,
         reload=True
     )
@@ -0,0 +1,46 @@
+"""
+生产环境启动脚本
+
+按 APP_WORKERS 启动多个服务进程：
+- 启动前清空多进程监控指标目录，避免上次运行的数据混入
+- 渲染进程数未配置时由所有服务进程平分 CPU 核心
+- 收到 SIGINT/SIGTERM 后停止接受新连接，等待进行中的请求（包括流式批量生成）和批量任务完成，
+  最长 SHUTDOWN_TIMEOUT 秒
+- 定时清理只在通过文件锁选出的主进程中执行
+"""
+import os
+from pathlib import Path
+
+import uvicorn
+
+from app.core.config import settings
+
+
+def clear_metrics_dir() -> None:
+    """清空多进程监控指标目录（此时还没有服务进程）"""
+    if not settings.METRICS_ENABLED:
+        return
+    directory = Path(os.environ.get("PROMETHEUS_MULTIPROC_DIR", settings.METRICS_DIR))
+    if directory.is_dir():
+        for path in directory.glob("*.db"):
+            path.unlink(missing_ok=True)
+
+
+def main() -> None:
+    """启动服务"""
+    workers = settings.APP_WORKERS or os.cpu_count() or 1
+    # 服务进程从环境变量读取配置，据此分配渲染进程数
+    os.environ["APP_WORKERS"] = str(workers)
+    clear_metrics_dir()
+
+    uvicorn.run(
+        "app.main:app",
+        host=settings.APP_HOST,
+        port=settings.APP_PORT,
+        workers=workers,
+        timeout_graceful_shutdown=settings.SHUTDOWN_TIMEOUT
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""准入控制测试"""
+import asyncio
+
+import pytest
+
+from app.core.exceptions import QRCodeException
+from app.services.admission import AdmissionController
+
+WINDOW = 200
+
+
+@pytest.fixture
+def controller(monkeypatch: pytest.MonkeyPatch) -> AdmissionController:
+    """默认配置的准入控制器：预算为两个渲染窗口，后台任务最多占用一半"""
+    monkeypatch.setattr(AdmissionController, "window_items", staticmethod(lambda: WINDOW))
+    return AdmissionController(budget=0, queue_size=4, queue_timeout=0.2, fast_lane_items=1)
+
+
+def test_jobs_do_not_starve_online_requests(controller: AdmissionController) -> None:
+    """两个批量任务和一个多项 /generate 同时运行时，在线请求无需排队"""
+
+    async def scenario() -> None:
+        jobs = [asyncio.ensure_future(controller.acquire(background=True)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        ticket = await controller.acquire(50)
+        assert ticket.weight == 50
+        stats = controller.stats()
+        assert stats["background_inflight_items"] == WINDOW
+        assert stats["background_queue_depth"] == 1
+        assert stats["queue_depth"] == 0
+
+        ticket.release()
+        jobs[0].result().release()
+        (await asyncio.wait_for(jobs[1], 1)).release()
+        assert controller.stats()["inflight_items"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_online_waiters_take_priority_over_jobs(controller: AdmissionController) -> None:
+    """有在线请求排队时，归还的预算先分给在线请求"""
+
+    async def scenario() -> None:
+        online = await controller.acquire(WINDOW)
+        job = await controller.acquire(background=True)
+        waiting_online = asyncio.ensure_future(controller.acquire(WINDOW))
+        await asyncio.sleep(0)
+        waiting_job = asyncio.ensure_future(controller.acquire(background=True))
+        await asyncio.sleep(0)
+
+        job.release()
+        assert (await asyncio.wait_for(waiting_online, 1)).weight == WINDOW
+        assert not waiting_job.done()
+
+        online.release()
+        (await asyncio.wait_for(waiting_job, 1)).release()
+        waiting_online.result().release()
+        assert controller.stats()["inflight_items"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_queued_jobs_do_not_fill_online_queue(controller: AdmissionController) -> None:
+    """排队的批量任务不占用在线请求的等待队列"""
+
+    async def scenario() -> None:
+        job = await controller.acquire(background=True)
+        jobs = [asyncio.ensure_future(controller.acquire(background=True)) for _ in range(10)]
+        await asyncio.sleep(0)
+
+        ticket = await controller.acquire(WINDOW)
+        ticket.release()
+
+        for waiting in jobs:
+            waiting.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+        job.release()
+        assert controller.stats()["background_queue_depth"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_online_queue_times_out(controller: AdmissionController) -> None:
+    """预算被在线请求占满时，排队超时返回429"""
+
+    async def scenario() -> None:
+        tickets = [await controller.acquire(WINDOW) for _ in range(2)]
+        with pytest.raises(QRCodeException) as exc_info:
+            await controller.acquire(10)
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.headers["Retry-After"]
+        for ticket in tickets:
+            ticket.release()
+
+    asyncio.run(scenario())
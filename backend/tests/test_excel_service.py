@@ -0,0 +1,37 @@
+"""Excel/CSV读取测试"""
+import asyncio
+import io
+
+from app.core.config import settings
+from app.services.excel_service import ExcelService
+
+
+def late_gbk_csv() -> bytes:
+    """英文表头和ASCII行超过编码检测范围，之后的行含GBK编码的中文标签"""
+    rows = [b"code,label"]
+    rows += [b"A%06d,asset" % i for i in range(settings.CSV_ENCODING_SAMPLE_BYTES // 10)]
+    rows += [b"B%06d," % i + "资产标签".encode("gbk") for i in range(5)]
+    return b"\n".join(rows) + b"\n"
+
+
+def test_iter_items_falls_back_to_gb18030_after_utf8_prefix() -> None:
+    """前缀是合法的UTF-8、后面出现GBK内容时重新按GB18030解析，不重复也不丢失行"""
+    data = late_gbk_csv()
+    items = list(ExcelService.iter_items(io.BytesIO(data), "assets.csv", "code", "label"))
+
+    assert len(items) == data.count(b"\n") - 1
+    assert items[0] == ("A000000", "asset", "A000000,asset")
+    assert items[-1] == ("B000004", "资产标签", "B000004,资产标签")
+    assert len({content for content, _, _ in items}) == len(items)
+
+
+def test_preview_falls_back_to_gb18030_after_utf8_prefix() -> None:
+    """预览行超出检测范围时同样按GB18030读取，并返回实际使用的编码"""
+    data = late_gbk_csv()
+    rows = data.count(b"\n")
+    columns, preview, encoding = asyncio.run(
+        ExcelService.read_preview(io.BytesIO(data), "assets.csv", sample_rows=rows)
+    )
+    assert columns == ["code", "label"]
+    assert preview[-1] == ["B000004", "资产标签"]
+    assert encoding == "gb18030"
@@ -0,0 +1,59 @@
+"""监控指标文件测试"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from prometheus_client.mmap_dict import MmapedDict
+
+from app.core import metrics
+
+KEY = json.dumps(["qrcode_output_bytes", "qrcode_output_bytes_total", {"kind": "image"}, "写出的文件字节数"])
+
+
+def dead_pid() -> int:
+    """获取一个已退出进程的进程号"""
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def write_counter(path: Path, value: float) -> None:
+    """写入一个计数器文件"""
+    values = MmapedDict(str(path))
+    values.write_value(KEY, value, 0.0)
+    values.close()
+
+
+@pytest.fixture
+def metrics_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """使用临时指标目录"""
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics.settings, "METRICS_ENABLED", True)
+    return tmp_path
+
+
+@pytest.mark.skipif(metrics.fcntl is None, reason="需要 POSIX 文件锁")
+def test_dead_process_files_are_archived(metrics_dir: Path) -> None:
+    """已退出进程的计数器累加到归档文件后删除，汇总值不变"""
+    for value in (3.0, 4.0):
+        pid = dead_pid()
+        write_counter(metrics_dir / f"counter_{pid}.db", value)
+        (metrics_dir / f"gauge_livesum_{pid}.db").touch()
+        metrics.mark_dead_processes()
+
+    assert sorted(path.name for path in metrics_dir.glob("*.db")) == ["counter_archive.db"]
+    archived = {key: value for key, value, _, _ in
+                MmapedDict.read_all_values_from_file(str(metrics_dir / "counter_archive.db"))}
+    assert archived == {KEY: 7.0}
+
+
+def test_single_process_startup_clears_other_files(metrics_dir: Path) -> None:
+    """单进程启动时删除其他进程留下的文件，保留当前进程的文件"""
+    own = metrics_dir / f"histogram_{metrics.os.getpid()}.db"
+    own.touch()
+    (metrics_dir / "counter_1.db").touch()
+    (metrics_dir / "counter_archive.db").touch()
+    metrics.clear_process_files()
+    assert list(metrics_dir.glob("*.db")) == [own]
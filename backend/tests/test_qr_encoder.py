@@ -0,0 +1,121 @@
+"""编码器差分测试：内置数组编码器与 qrcode 库生成的模块矩阵必须一致"""
+import random
+import string
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pytest
+import qrcode
+from qrcode import constants, util
+
+from app.utils.qr_encoder import encode_matrix
+
+SEED = 20240113
+CASES_PER_VERSION = 8
+
+ERROR_CORRECTIONS = {
+    "L": constants.ERROR_CORRECT_L,
+    "M": constants.ERROR_CORRECT_M,
+    "Q": constants.ERROR_CORRECT_Q,
+    "H": constants.ERROR_CORRECT_H,
+}
+
+ALPHABETS = [
+    string.digits,
+    string.digits + string.ascii_uppercase + " $%*+-./:",
+    string.printable,
+    "二维码生成器标签资产编号测试" + string.ascii_letters,
+]
+
+# 版本40各模式的最大字符数（GB/T 18284 表7）
+VERSION_40_CAPACITY = {
+    "numeric": ("0123456789", {"L": 7089, "M": 5596, "Q": 3993, "H": 3057}),
+    "alnum": ("ABCDEFGHIJ", {"L": 4296, "M": 3391, "Q": 2420, "H": 1852}),
+    "byte": ("abcdefghij", {"L": 2953, "M": 2331, "Q": 1663, "H": 1273}),
+}
+
+
+def byte_capacity(version: int, error_correction: int) -> int:
+    """指定版本和纠错等级下字节模式可容纳的字节数"""
+    if version == 0:
+        return 0
+    header_bits = 4 + (8 if version < 10 else 16)
+    return (util.BIT_LIMIT_TABLE[error_correction][version] - header_bits) // 8
+
+
+def build_cases() -> List[Tuple[str, str, Optional[int]]]:
+    """
+    生成固定种子的测试用例，每个版本（1-40）各若干个
+
+    一半用例为只含小写字母的内容（纯字节模式），长度恰好落在目标版本的容量范围内，保证覆盖所有版本；
+    其余用例使用数字、字母数字、混合和中文字符，覆盖模式切换
+    """
+    rng = random.Random(SEED)
+    cases = []
+    for version in range(1, 41):
+        for i in range(CASES_PER_VERSION):
+            name, error_correction = rng.choice(list(ERROR_CORRECTIONS.items()))
+            mask_pattern = rng.choice([None, None, rng.randrange(8)])
+            low = byte_capacity(version - 1, error_correction) + 1
+            high = byte_capacity(version, error_correction)
+            if i % 2 == 0:
+                content = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+            else:
+                alphabet = rng.choice(ALPHABETS)
+                length = rng.randint(1, high)
+                if not alphabet.isascii():
+                    length = max(1, length // 3)  # 中文字符的 UTF-8 编码为3字节
+                content = "".join(rng.choice(alphabet) for _ in range(length))
+            cases.append((content, name, mask_pattern))
+    return cases
+
+
+def reference_matrix(content: str, error_correction: int, mask_pattern: Optional[int]) -> np.ndarray:
+    """qrcode 库生成的模块矩阵"""
+    qr = qrcode.QRCode(error_correction=error_correction, mask_pattern=mask_pattern)
+    qr.add_data(content)
+    return np.array(qr.get_matrix(), dtype=bool)
+
+
+def assert_same_matrix(content: str, name: str, mask_pattern: Optional[int]) -> None:
+    """对比两个编码器的结果"""
+    error_correction = ERROR_CORRECTIONS[name]
+    expected = reference_matrix(content, error_correction, mask_pattern)
+    actual = encode_matrix(content, error_correction, mask_pattern)
+    assert actual.shape == expected.shape
+    assert np.array_equal(actual, expected)
+
+
+@pytest.mark.parametrize(
+    "content, name, mask_pattern",
+    build_cases(),
+    ids=lambda value: None if isinstance(value, str) and len(value) > 1 else str(value)
+)
+def test_matches_reference(content: str, name: str, mask_pattern: Optional[int]) -> None:
+    """随机内容覆盖版本1-40、全部纠错等级和自动/指定掩码"""
+    assert_same_matrix(content, name, mask_pattern)
+
+
+@pytest.mark.parametrize("name", list(ERROR_CORRECTIONS))
+@pytest.mark.parametrize("content", ["", "😀", "二维码😀 emoji 🚀🚀", "\u0000￿"], ids=["empty", "emoji", "mixed", "edge"])
+def test_special_contents(content: str, name: str) -> None:
+    """空字符串、emoji（4字节UTF-8）和边界字符"""
+    assert_same_matrix(content, name, None)
+
+
+@pytest.mark.parametrize("name", list(ERROR_CORRECTIONS))
+@pytest.mark.parametrize("mode", list(VERSION_40_CAPACITY))
+def test_capacity_limit(mode: str, name: str) -> None:
+    """版本40的容量上限：恰好填满时一致，多出一个字符时两个编码器都拒绝"""
+    error_correction = ERROR_CORRECTIONS[name]
+    alphabet, capacities = VERSION_40_CAPACITY[mode]
+    length = capacities[name]
+    content = (alphabet * length)[:length]
+    assert_same_matrix(content, name, None)
+    assert encode_matrix(content, error_correction).shape == (185, 185)
+
+    content += alphabet[0]
+    with pytest.raises((qrcode.exceptions.DataOverflowError, ValueError)):
+        reference_matrix(content, error_correction, None)
+    with pytest.raises(qrcode.exceptions.DataOverflowError):
+        encode_matrix(content, error_correction)
@@ -0,0 +1,43 @@
+"""渲染缓存测试"""
+from pathlib import Path
+
+import pytest
+
+from app.core.config import settings
+from app.services.render_cache import RenderCache
+
+
+def test_disk_budget_shared_between_instances(tmp_path: Path) -> None:
+    """多个进程（此处为多个实例）共用同一个磁盘容量和统计"""
+    caches = [RenderCache(1 << 20, tmp_path, 10_000) for _ in range(3)]
+    for i, cache in enumerate(caches):
+        for j in range(10):
+            cache.put(f"{i}-{j}", bytes(1000))
+
+    files = list(tmp_path.glob("*.bin"))
+    assert sum(f.stat().st_size for f in files) <= 10_000
+    stats = caches[0].stats()
+    assert stats["disk_items"] == len(files)
+    assert stats["disk_bytes"] == sum(f.stat().st_size for f in files)
+
+    # 其他实例写入的文件可以从磁盘读到
+    fresh = RenderCache(1 << 20, tmp_path, 10_000)
+    assert fresh.get(files[0].stem) == bytes(1000)
+    assert fresh.stats()["disk_hits"] == 1
+
+
+def test_key_depends_on_label_font(monkeypatch: pytest.MonkeyPatch) -> None:
+    """更换标签字体后带标签的PNG缓存失效，不带标签和SVG的缓存不受影响"""
+    before = [
+        RenderCache.make_key("a", "标签", "png"),
+        RenderCache.make_key("a", None, "png"),
+        RenderCache.make_key("a", "标签", "svg"),
+    ]
+    monkeypatch.setattr(settings, "LABEL_FONT_PATHS", ["other.ttf"])
+    after = [
+        RenderCache.make_key("a", "标签", "png"),
+        RenderCache.make_key("a", None, "png"),
+        RenderCache.make_key("a", "标签", "svg"),
+    ]
+    assert before[0] != after[0]
+    assert before[1:] == after[1:]
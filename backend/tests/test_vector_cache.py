@@ -0,0 +1,39 @@
+"""矢量页面缓存测试"""
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from app.services import qrcode_service
+from app.services.qrcode_service import QRCodeService
+from app.services.render_cache import RenderCache
+from app.utils.vector import pack_page, unpack_page, vector_page
+from app.utils.qr_encoder import encode_matrix
+
+
+def test_pack_page_round_trip() -> None:
+    """序列化后的矢量页面与原页面一致"""
+    page = vector_page(encode_matrix("https://example.com/矢量"), 300)
+    assert unpack_page(pack_page(page)) == page
+
+
+def test_cached_svg_pages_skip_encoder(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """重复的SVG+PDF批次命中缓存时，矢量页面从缓存读取，不再编码"""
+    monkeypatch.setattr(qrcode_service, "render_cache", RenderCache(1 << 20, tmp_path, 1 << 20))
+    calls = []
+    encode = QRCodeService._generate_qr_matrix
+
+    def counting_encode(content, mask_pattern=None):
+        calls.append(content)
+        return encode(content, mask_pattern)
+
+    monkeypatch.setattr(QRCodeService, "_generate_qr_matrix", staticmethod(counting_encode))
+    items = [(f"item-{i}", f"标签{i}") for i in range(5)]
+
+    first, first_pages = asyncio.run(QRCodeService._render_cached(items, "svg", with_pages=True))
+    assert len(calls) == len(items)
+
+    second, second_pages = asyncio.run(QRCodeService._render_cached(items, "svg", with_pages=True))
+    assert len(calls) == len(items)
+    assert second == first
+    assert second_pages == first_pages
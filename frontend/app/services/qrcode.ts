@@ -4,7 +4,20 @@ import { axiosInstance } from '@/app/lib/axios';
 export const qrcodeApi = {
   // 生成二维码
   generate: async (params: { contents: string[] }): Promise<ApiResponse<Record<string, QRCodeData>>> => {
-    const response = await axiosInstance.post<ApiResponse<Record<string, QRCodeData>>>('/qrcode/generate', params);
+    // 预览和下载直接使用内联的 base64 数据
+    const response = await axiosInstance.post<ApiResponse<Record<string, QRCodeData>>>('/qrcode/generate', {
+      ...params,
+      response_mode: 'inline',
+    });
+    const { data } = response.data;
+    if (data) {
+      // 重复的行引用首次出现的行，补全其 base64 数据
+      Object.values(data).forEach((qrCode) => {
+        if (qrCode.duplicate_of != null) {
+          qrCode.base64_image = data[String(qrCode.duplicate_of)].base64_image;
+        }
+      });
+    }
     return response.data;
   },
 
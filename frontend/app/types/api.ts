@@ -2,7 +2,10 @@ export interface QRCodeData {
   qrcode_text: string;
   file_path: string;
   base64_image: string;
+  url?: string;
   file_type: 'image' | 'pdf';
+  // 批次内重复的行只在首次出现的一项中携带 base64 数据，此处为该行的序号
+  duplicate_of?: number | null;
 }
 
 export interface ApiResponse<T = unknown> {